@@ -0,0 +1,210 @@
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import logging
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from metrics import registry
+
+logger = logging.getLogger("render-playwright-scraper")
+
+# Annunci letti dalle risposte XHR/GraphQL con cui la Ads Library carica i risultati, invece che
+# dal DOM renderizzato: ogni annuncio porta ad_archive_id, page_name e i link_url dello snapshot
+# (anche uno per card nei caroselli). Le risposte si possono registrare (ADS_CAPTURE_DIR) e
+# rianalizzare offline:  python adsnetwork.py capture.jsonl [...]
+
+# ---------------- CONFIG ----------------
+# network = risposte di rete, con fallback al DOM se non arrivano annunci; dom = solo DOM
+DISCOVERY_SOURCE = os.getenv("DISCOVERY_SOURCE", "network")
+ADS_RESPONSE_RE = re.compile(os.getenv("ADS_RESPONSE_PATTERN", r"/api/graphql/?(\?|$)|/ads/library/async/"))
+ADS_RESPONSE_MAX_BYTES = int(os.getenv("ADS_RESPONSE_MAX_BYTES", str(8 * 1024 * 1024)))
+ADS_RESPONSE_SETTLE = int(os.getenv("ADS_RESPONSE_SETTLE_MS", "1500"))   # attesa letture ancora in corso
+ADS_CAPTURE_DIR = os.getenv("ADS_CAPTURE_DIR", "")                       # registra le risposte in JSONL
+
+# Prefisso anti JSON-hijacking delle risposte Facebook
+JSON_PREFIX = "for (;;);"
+
+NETWORK_RESPONSES = registry.counter("leadgen_ads_network_responses_total",
+                                     "Risposte Ads Library analizzate per esito (ads/empty/unreadable/too_large)")
+NETWORK_ADS = registry.counter("leadgen_ads_network_ads_total", "Annunci distinti letti dalle risposte di rete")
+
+
+# ---------------- PARSING ----------------
+def iter_json_documents(body: str) -> Iterator[object]:
+    # Una risposta può contenere più documenti JSON di seguito (@defer/@stream di GraphQL),
+    # ognuno eventualmente preceduto dal prefisso: si decodificano finché il testo è JSON
+    decoder = json.JSONDecoder()
+    i, n = 0, len(body)
+    while i < n:
+        while i < n and body[i].isspace():
+            i += 1
+        if body.startswith(JSON_PREFIX, i):
+            i += len(JSON_PREFIX)
+            continue
+        if i >= n:
+            return
+        try:
+            doc, i = decoder.raw_decode(body, i)
+        except ValueError:
+            return
+        yield doc
+
+
+def _ad_links(ad: Dict) -> List[str]:
+    snapshot = ad.get("snapshot") or {}
+    links = [snapshot.get("link_url")]
+    links += [card.get("link_url") for card in snapshot.get("cards") or [] if isinstance(card, dict)]
+    return [link for link in dict.fromkeys(links) if isinstance(link, str) and link.startswith("http")]
+
+
+def iter_ads(doc: object) -> Iterator[Dict]:
+    # Visita iterativa: gli annunci stanno a profondità diverse a seconda della query GraphQL
+    # (edges -> node -> collated_results -> ...), si riconoscono da ad_archive_id
+    stack = [doc]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            ad_id = node.get("ad_archive_id") or node.get("adArchiveID")
+            if ad_id is not None and str(ad_id).isdigit():
+                yield node
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+def parse_ads(body: str, ad_url_base: str) -> List[Dict[str, Optional[str]]]:
+    # Stesso formato degli item del DOM (landing, ad_url) più ad_id e page_name
+    items = []
+    for doc in iter_json_documents(body):
+        for ad in iter_ads(doc):
+            ad_id = str(ad.get("ad_archive_id") or ad.get("adArchiveID"))
+            page_name = ad.get("page_name") or (ad.get("snapshot") or {}).get("page_name")
+            for link in _ad_links(ad):
+                items.append({"landing": link, "ad_url": f"{ad_url_base}?id={ad_id}",
+                              "ad_id": ad_id, "page_name": page_name})
+    return items
+
+
+# ---------------- RACCOLTA ----------------
+class AdsCollector:
+    # Annunci distinti da una sequenza di risposte: deduplica per (ad_id, link) e passa i nuovi a on_items
+    def __init__(self, ad_url_base: str,
+                 on_items: Optional[Callable[[List[Dict[str, Optional[str]]]], None]] = None):
+        self.ad_url_base = ad_url_base
+        self.on_items = on_items
+        self.items: List[Dict[str, Optional[str]]] = []
+        self.ads: Set[str] = set()
+        self.responses = 0
+        self._seen: Set[Tuple[str, str]] = set()
+
+    def feed(self, body: str) -> int:
+        self.responses += 1
+        new = []
+        for item in parse_ads(body, self.ad_url_base):
+            key = (item["ad_id"], item["landing"])
+            if key in self._seen:
+                continue
+            self._seen.add(key)
+            new.append(item)
+        ads_before = len(self.ads)
+        self.ads.update(item["ad_id"] for item in new)
+        NETWORK_ADS.inc(len(self.ads) - ads_before)
+        NETWORK_RESPONSES.inc(status="ads" if new else "empty")
+        if new:
+            self.items.extend(new)
+            if self.on_items is not None:
+                self.on_items(new)
+        return len(new)
+
+
+class AdResponseCapture(AdsCollector):
+    # Ascolta page.on("response") della pagina Ads Library: i corpi si leggono in task separati
+    # (l'handler non può attendere) e gli annunci arrivano al feed appena la risposta è completa
+    def __init__(self, page, ad_url_base: str,
+                 on_items: Optional[Callable[[List[Dict[str, Optional[str]]]], None]] = None,
+                 capture_dir: str = ADS_CAPTURE_DIR):
+        super().__init__(ad_url_base, on_items)
+        self.page = page
+        self.errors = 0
+        self._tasks: Set[asyncio.Task] = set()
+        self._record_path = None
+        if capture_dir:
+            os.makedirs(capture_dir, exist_ok=True)
+            self._record_path = os.path.join(capture_dir, f"ads-{time.strftime('%Y%m%d-%H%M%S')}-{id(self):x}.jsonl")
+        page.on("response", self._on_response)
+
+    def _on_response(self, response) -> None:
+        if response.request.resource_type not in ("xhr", "fetch") or not ADS_RESPONSE_RE.search(response.url):
+            return
+        task = asyncio.ensure_future(self._read(response))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _read(self, response) -> None:
+        try:
+            body = await response.text()
+        except Exception as e:
+            # Pagina chiusa o corpo non disponibile (redirect, risposta annullata)
+            self.errors += 1
+            NETWORK_RESPONSES.inc(status="unreadable")
+            logger.debug(f"Risposta Ads Library non leggibile {response.url[:80]}: {e}")
+            return
+        if len(body) > ADS_RESPONSE_MAX_BYTES:
+            NETWORK_RESPONSES.inc(status="too_large")
+            return
+        if self._record_path:
+            self._record(response.url, response.status, body)
+        try:
+            self.feed(body)
+        except Exception as e:
+            self.errors += 1
+            logger.debug(f"Risposta Ads Library non interpretabile {response.url[:80]}: {e}")
+
+    def _record(self, url: str, status: int, body: str) -> None:
+        try:
+            with open(self._record_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"url": url, "status": status, "body": body}, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning(f"⚠️ Registrazione risposte Ads Library fallita: {e}")
+            self._record_path = None
+
+    async def settle(self, timeout_ms: int = ADS_RESPONSE_SETTLE) -> None:
+        # Attende le letture già partite (es. l'ultimo scroll), senza aspettare risposte future
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout_ms / 1000)
+
+    def close(self) -> None:
+        self.page.remove_listener("response", self._on_response)
+        for task in list(self._tasks):
+            task.cancel()
+
+
+# ---------------- REPLAY ----------------
+def replay(paths: Iterable[str], ad_url_base: str = "https://www.facebook.com/ads/library/") -> AdsCollector:
+    # Rianalizza risposte registrate (una per riga: {"url", "status", "body"}) con lo stesso parser
+    collector = AdsCollector(ad_url_base)
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    collector.feed(json.loads(line)["body"])
+    return collector
+
+
+def main() -> int:
+    if len(sys.argv) < 2:
+        print("Uso: python adsnetwork.py capture.jsonl [...]", file=sys.stderr)
+        return 2
+    collector = replay(sys.argv[1:])
+    for item in collector.items:
+        print(json.dumps(item, ensure_ascii=False))
+    print(f"{collector.responses} risposte | {len(collector.ads)} annunci | {len(collector.items)} link",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,43 @@
 import os
 import re
 import asyncio
+import time
 import signal
+import ipaddress
 import logging
-from dataclasses import dataclass
-from typing import List, Dict, Set, Optional
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from typing import Awaitable, Callable, List, Dict, Set, Optional, Tuple
 from urllib.parse import urlparse, parse_qs, unquote, urlencode, quote_plus
 
 from playwright.async_api import async_playwright, Browser, BrowserContext, Page
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from cache import CACHE_ENABLED, CACHE_TTL_SUCCESS, CACHE_TTL_ERROR, landing_cache
+from fetcher import get_fetcher, close_fetcher
+# Regex e validatori vivono in extraction.py; restano importabili da qui come prima
+from extraction import (
+    EMAIL_RE, MAILTO_RE, TEL_RE, PHONE_PATTERNS, INVALID_EMAIL_SNIPPETS,
+    validate_email, validate_phone, extract_contacts, EMAIL_LOCAL_MAX
+)
+from scoring import score_copy
+from resolver import ShortlinkResolver, record_resolver_stats
+from scheduler import (get_scheduler, drop_scheduler, scheduler_stats, scheduler_gauges, process_rss_mb,
+                       SCHED_MAX_PAGES)
+from metrics import registry
+from leadstore import LEAD_STORE_ENABLED, AD_ID_RE, lead_store
+from blocking import (BLOCK_MODE, policy as block_policy, record_blocked, page_block_stats, open_page_stats,
+                      close_page_stats)
+from adsnetwork import DISCOVERY_SOURCE, AdResponseCapture
+
 
 # ---------------- CONFIG ----------------
 COUNTRY = os.getenv("COUNTRY", "IT")
+# Configurabile per puntare la pipeline al server finto dei benchmark (bench/standin.py)
+ADS_LIBRARY_URL = os.getenv("ADS_LIBRARY_URL", "https://www.facebook.com/ads/library/")
 EXCLUDE_DOMAINS = {
     "facebook.com", "fb.com", "fb.me", "fbcdn.net",
     "instagram.com", "instagr.am", "whatsapp.com", "tinyurl.com",
@@ -18,13 +45,69 @@ EXCLUDE_DOMAINS = {
 }
 
 # Performance tuning - RENDER OPTIMIZED (env-overridable)
-MAX_CONCURRENT_PAGES = int(os.getenv("MAX_CONCURRENT_PAGES", "2"))
+MAX_CONCURRENT_PAGES = int(os.getenv("MAX_CONCURRENT_PAGES", "2"))     # limite iniziale, poi adattivo (scheduler.py)
 SCROLL_COUNT = int(os.getenv("SCROLL_COUNT", "4"))
 SCROLL_WAIT = int(os.getenv("SCROLL_WAIT_MS", "2000"))
 PAGE_TIMEOUT = int(os.getenv("PAGE_TIMEOUT_MS", "25000"))
 INITIAL_WAIT = int(os.getenv("INITIAL_WAIT_MS", "5000"))
 MAX_RETRIES = int(os.getenv("MAX_RETRIES", "1"))
 
+# Scadenza end-to-end di una run (query o batch): allo scadere il lavoro in corso si annulla e
+# tornano le lead già raccolte con partial=True. 0 = nessuna scadenza
+RUN_DEADLINE = float(os.getenv("RUN_DEADLINE_S", "300"))
+DEADLINE_RESERVE = float(os.getenv("DEADLINE_RESERVE_S", "20"))    # coda finale solo per le landing (max 1/4 run)
+DEADLINE_MIN_GOTO = int(os.getenv("DEADLINE_MIN_GOTO_MS", "2000"))   # sotto questo residuo non si naviga
+
+# Scroll Ads Library: "adaptive" si ferma quando non arrivano nuovi annunci, "fixed" è il vecchio ciclo
+SCROLL_MODE = os.getenv("SCROLL_MODE", "adaptive")
+SCROLL_MAX_STEPS = int(os.getenv("SCROLL_MAX_STEPS", "40"))
+SCROLL_TARGET_ADS = int(os.getenv("SCROLL_TARGET_ADS", "0"))       # 0 = nessun limite
+SCROLL_IDLE = int(os.getenv("SCROLL_IDLE_MS", "1200"))             # DOM fermo = caricamento finito
+SCROLL_STALL_LIMIT = int(os.getenv("SCROLL_STALL_LIMIT", "2"))     # scroll consecutivi senza nuovi annunci
+SCROLL_DEADLINE = int(os.getenv("SCROLL_DEADLINE_MS", "45000"))
+ADS_EXTRACTOR = os.getenv("ADS_EXTRACTOR", "indexed")             # indexed | legacy
+
+# Pipeline discovery -> scraping: le landing passano ai worker appena risolte (coda limitata)
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "20"))
+BATCH_DISCOVERY_CONCURRENCY = int(os.getenv("BATCH_DISCOVERY_CONCURRENCY", "2"))   # Ads Library aperte insieme
+
+# Browser pool condiviso (vedi start_browser_pool)
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "1"))
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "300"))
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", "1500"))
+BROWSER_POOL_HEALTH_INTERVAL = int(os.getenv("BROWSER_POOL_HEALTH_INTERVAL_S", "30"))
+MAX_BACKGROUND_JOBS = int(os.getenv("MAX_BACKGROUND_JOBS", "2"))
+
+# Pool di pagine per landing e shortlink (vedi PagePool): pagine riusate, context ruotato
+PAGE_POOL_ENABLED = os.getenv("PAGE_POOL_ENABLED", "1") == "1"
+PAGE_POOL_SIZE = int(os.getenv("PAGE_POOL_SIZE", str(SCHED_MAX_PAGES)))           # pagine libere tenute
+PAGE_POOL_WARM = int(os.getenv("PAGE_POOL_WARM", str(MAX_CONCURRENT_PAGES)))      # pre-create all'avvio
+PAGE_POOL_MAX_NAVIGATIONS = int(os.getenv("PAGE_POOL_MAX_NAVIGATIONS", "100"))    # usi per context, 0 = mai
+PAGE_POOL_MAX_RSS_MB = int(os.getenv("PAGE_POOL_MAX_RSS_MB", "1000"))             # Chromium, 0 = nessun tetto
+PAGE_POOL_RSS_CHECK = int(os.getenv("PAGE_POOL_RSS_CHECK_S", "5"))
+PAGE_POOL_RESET_TIMEOUT = int(os.getenv("PAGE_POOL_RESET_TIMEOUT_MS", "3000"))
+
+# Tier HTTP: prova prima con un semplice GET, il browser solo se serve
+HTTP_TIER_ENABLED = os.getenv("HTTP_TIER_ENABLED", "1") == "1"
+
+# Prontezza landing: "dom" = DOM fermo per READY_IDLE_MS, "networkidle", "fixed" = vecchie attese fisse
+READY_MODE = os.getenv("READY_MODE", "dom")
+READY_IDLE = int(os.getenv("READY_IDLE_MS", "400"))
+READY_MAX = int(os.getenv("READY_MAX_MS", "2000"))                 # tetto (era l'attesa fissa)
+READY_SCROLL_MAX = int(os.getenv("READY_SCROLL_MAX_MS", "800"))    # tetto dopo lo scroll in fondo
+
+# Pagine contatti/chi siamo dello stesso dominio, visitate solo se manca email o telefono
+CONTACT_CRAWL_PAGES = int(os.getenv("CONTACT_CRAWL_PAGES", "2"))   # 0 = disattivato
+CONTACT_CRAWL_BUDGET = int(os.getenv("CONTACT_CRAWL_BUDGET_MS", "8000"))
+
+# Estrazione landing: snippets = la pagina filtra da sé e manda solo candidati (limiti in caratteri),
+# full = HTML, testo e link completi come in origine
+EXTRACT_MODE = os.getenv("EXTRACT_MODE", "snippets")
+SNIPPET_HTML_MAX = int(os.getenv("SNIPPET_HTML_MAX", "49152"))         # finestre attorno a @ e cifre nell'HTML
+SNIPPET_TEXT_MAX = int(os.getenv("SNIPPET_TEXT_MAX", "16384"))         # finestre nel testo oltre il campione
+SNIPPET_TEXT_SAMPLE = int(os.getenv("SNIPPET_TEXT_SAMPLE", "32768"))   # inizio del testo, per il copy
+SNIPPET_LINKS_MAX = int(os.getenv("SNIPPET_LINKS_MAX", "16384"))
+
 # Logging
 logging.basicConfig(
     level=os.getenv("LOG_LEVEL", "INFO"),
@@ -36,26 +119,6 @@ logger = logging.getLogger("render-playwright-scraper")
 _shutdown_event = asyncio.Event()
 
 
-# ---------------- REGEX PRECOMPILATI ----------------
-EMAIL_RE = re.compile(r'\b[a-zA-Z0-9][a-zA-Z0-9._%+-]{0,63}@[a-zA-Z0-9][a-zA-Z0-9.-]{0,253}\.[a-zA-Z]{2,}\b')
-MAILTO_RE = re.compile(r'mailto:([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})', re.IGNORECASE)
-TEL_RE = re.compile(r'tel:([+\d\s\-\(\)]+)', re.IGNORECASE)
-
-PHONE_PATTERNS = [
-    re.compile(r'\+39[\s\-]?\d{2,3}[\s\-]?\d{6,7}'),
-    re.compile(r'0\d{1,3}[\s\-]?\d{6,8}'),
-    re.compile(r'\+\d{1,3}[\s\-]?\(?\d{2,4}\)?[\s\-]?\d{6,10}'),
-    re.compile(r'\(\+39\)[\s\-]?\d{9,10}'),
-]
-
-INVALID_EMAIL_SNIPPETS = [
-    'example.com', 'test.com', 'dummy', 'placeholder',
-    'noreply', 'no-reply', 'youremail', 'your-email',
-    'email@', '@email', 'info@info', 'admin@admin',
-    'sample', 'fake', 'tempmail'
-]
-
-
 # ---------------- DATACLASS ----------------
 @dataclass
 class Lead:
@@ -65,14 +128,147 @@ class Lead:
     telefono: Optional[str]
     copy_valutazione: Optional[str]
     status: str
+    copy_score: Optional[float] = None
+    tier: str = "browser"       # http | browser: chi ha estratto i dati della lead
+    cached: bool = False
+    timings: Dict[str, int] = field(default_factory=dict)     # ms per fase (goto, ready, scroll, crawl...)
+    blocked: Dict[str, int] = field(default_factory=dict)     # richieste bloccate e stima dei byte risparmiati
+    transfer: Dict[str, int] = field(default_factory=dict)    # caratteri ricevuti dalla pagina / presenti in pagina
 
 
 # ---------------- SIGNAL HANDLERS ----------------
 def _handle_sigterm(signum, frame):
     logger.info("SIGTERM ricevuto: avvio shutdown graceful...")
-    _shutdown_event.set()
+    if _pool_loop is not None:
+        # L'evento appartiene al loop del pool: va settato dal suo thread
+        _pool_loop.call_soon_threadsafe(_shutdown_event.set)
+        asyncio.run_coroutine_threadsafe(_pool.drain(), _pool_loop)
+    else:
+        _shutdown_event.set()
+    # Catena con l'handler precedente (es. gunicorn) per non bloccare l'uscita del worker
+    if callable(_previous_sigterm):
+        _previous_sigterm(signum, frame)
+
+_previous_sigterm = signal.signal(signal.SIGTERM, _handle_sigterm)
+
+
+# ---------------- OPZIONI PER RUN ----------------
+# Callback per-run (job API): riceve eventi di progresso e lead man mano che arrivano
+EventSink = Callable[[str, Dict], None]
+
 
-signal.signal(signal.SIGTERM, _handle_sigterm)
+@dataclass(frozen=True)
+class RunOptions:
+    on_event: Optional[EventSink] = None
+    use_cache: bool = True
+    trace: bool = False                                         # eventi "span" per fase (job con trace)
+    started: float = field(default_factory=time.monotonic)     # origine degli offset degli span
+    incremental: bool = False                                   # salta annunci e landing già analizzati
+    deadline: Optional[float] = None                            # time.monotonic() di scadenza della run
+
+
+# Visibili a tutte le funzioni (e ai task figli) della run corrente senza passarle a mano
+_run_options: ContextVar[RunOptions] = ContextVar("run_options", default=RunOptions())
+
+
+def run_options(on_event: Optional[EventSink], use_cache: bool, trace: bool, incremental: bool,
+                deadline_s: Optional[float]) -> RunOptions:
+    # deadline_s None = RUN_DEADLINE_S, 0 = nessuna scadenza
+    started = time.monotonic()
+    deadline_s = RUN_DEADLINE if deadline_s is None else deadline_s
+    return RunOptions(on_event=on_event, use_cache=use_cache, trace=trace, started=started,
+                      incremental=incremental, deadline=started + deadline_s if deadline_s > 0 else None)
+
+
+def time_left() -> Optional[float]:
+    # Secondi alla scadenza della run corrente, None se la run non ne ha
+    deadline = _run_options.get().deadline
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def discovery_time_left() -> Optional[float]:
+    # Tempo per discovery e scroll: la scadenza meno la riserva per le landing in coda, riserva
+    # limitata a un quarto della run (una scadenza breve non dà timeout negativi in partenza)
+    options = _run_options.get()
+    if options.deadline is None:
+        return None
+    reserve = min(DEADLINE_RESERVE, (options.deadline - options.started) * 0.25)
+    return options.deadline - reserve - time.monotonic()
+
+
+def emit(event: str, **data) -> None:
+    sink = _run_options.get().on_event
+    if sink is None:
+        return
+    try:
+        sink(event, data)
+    except Exception as e:
+        logger.debug(f"Errore invio evento {event}: {e}")
+
+
+# ---------------- METRICHE ----------------
+# Esposte in formato Prometheus da /metrics; con RunOptions.trace ogni misura diventa anche
+# un evento "span" del job (nome, offset dall'inizio della run, durata, esito)
+STAGE_SECONDS = registry.histogram("leadgen_stage_seconds", "Durata delle fasi di scraping in secondi")
+STAGE_RESULTS = registry.counter("leadgen_stage_total", "Fasi concluse per esito (success/timeout/cancelled/error)")
+EVALUATE_SECONDS = registry.histogram("leadgen_evaluate_seconds", "Durata di page.evaluate per script")
+LANDING_STAGE_SECONDS = registry.histogram("leadgen_landing_stage_seconds",
+                                           "Durata delle fasi di analisi landing (goto, ready, extract, crawl...)")
+GOTO_RETRIES = registry.counter("leadgen_goto_retries_total", "Navigazioni ripetute dopo un errore")
+LEADS_TOTAL = registry.counter("leadgen_leads_total", "Lead analizzate per esito e tier")
+PAGES_OPEN = registry.gauge("leadgen_pages_open", "Pagine browser aperte in questo processo")
+# Caratteri (unità UTF-16 delle stringhe JS), non byte: il testo arriva a Python già decodificato
+PAGE_SNIPPET_CHARS = registry.histogram("leadgen_page_snippet_chars",
+                                        "Caratteri di estrazione trasferiti dalla pagina a Python per lettura",
+                                        buckets=(1e3, 4e3, 16e3, 64e3, 256e3, 1e6, 4e6, 16e6))
+
+
+def outcome(exc: Optional[BaseException]) -> str:
+    if exc is None:
+        return "success"
+    if isinstance(exc, asyncio.CancelledError):
+        return "cancelled"
+    if isinstance(exc, (asyncio.TimeoutError, PlaywrightTimeoutError)):
+        return "timeout"
+    return "error"
+
+
+def observe_stage(stage: str, started: float, status: str = "success", **attrs) -> float:
+    seconds = time.monotonic() - started
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    STAGE_RESULTS.inc(stage=stage, status=status)
+    options = _run_options.get()
+    if options.trace:
+        emit("span", name=stage, start_ms=round((started - options.started) * 1000),
+             ms=round(seconds * 1000), status=status, **attrs)
+    return seconds
+
+
+@contextmanager
+def timed(stage: str, **attrs):
+    # Misura il blocco anche se fallisce: l'esito arriva dall'eccezione
+    started = time.monotonic()
+    status = "success"
+    try:
+        yield
+    except BaseException as e:
+        status = outcome(e)
+        raise
+    finally:
+        observe_stage(stage, started, status, **attrs)
+
+
+async def evaluate(page: Page, script: str, expression: str, arg=None):
+    # page.evaluate con tempo per script (lo stesso JS gira più volte per run)
+    started = time.monotonic()
+    status = "success"
+    try:
+        return await page.evaluate(expression, arg)
+    except BaseException as e:
+        status = outcome(e)
+        raise
+    finally:
+        EVALUATE_SECONDS.observe(observe_stage("evaluate", started, status, script=script), script=script)
 
 
 # ---------------- UTILS ----------------
@@ -114,46 +310,34 @@ def should_exclude_url(url: str) -> bool:
     return any(d in host for d in EXCLUDE_DOMAINS)
 
 
-def validate_email(email: str) -> bool:
-    email = email.lower().strip()
-    if any(sn in email for sn in INVALID_EMAIL_SNIPPETS):
-        return False
-    if not EMAIL_RE.match(email):
-        return False
-    if re.search(r'[._%+-]{3,}', email):
-        return False
-    return True
-
-
-def validate_phone(phone: str) -> bool:
-    clean = re.sub(r'[\s\-\(\)\.]', '', phone)
-    if not re.match(r'^\+?\d{9,15}$', clean):
-        return False
-    if re.match(r'^(\d)\1+$', clean) or clean in ['123456789', '987654321', '1234567890']:
-        return False
-    if re.search(r'(\d{3,})\1', clean):
-        return False
-    return True
-
-
 async def goto_with_retries(page: Page, url: str, retries: int = MAX_RETRIES) -> None:
     last_err = None
-    for attempt in range(retries + 1):
-        if _shutdown_event.is_set():
-            raise asyncio.CancelledError()
-        try:
-            await page.goto(url, timeout=PAGE_TIMEOUT, wait_until="domcontentloaded")
-            return
-        except Exception as e:
-            last_err = e
-            await asyncio.sleep(0.8 * (attempt + 1))
-    raise last_err
+    with timed("goto"):
+        for attempt in range(retries + 1):
+            if _shutdown_event.is_set():
+                raise asyncio.CancelledError()
+            left = time_left()
+            if left is not None and left * 1000 < DEADLINE_MIN_GOTO:
+                raise last_err or asyncio.TimeoutError(f"Run scaduta prima di aprire {url}")
+            if attempt:
+                GOTO_RETRIES.inc()
+            try:
+                timeout = PAGE_TIMEOUT if left is None else min(PAGE_TIMEOUT, int(left * 1000))
+                await page.goto(url, timeout=timeout, wait_until="domcontentloaded")
+                return
+            except Exception as e:
+                last_err = e
+                backoff = 0.8 * (attempt + 1)
+                left = time_left()
+                # Niente retry se dopo la pausa non resterebbe tempo per navigare
+                if attempt == retries or (left is not None and (left - backoff) * 1000 < DEADLINE_MIN_GOTO):
+                    break
+                await asyncio.sleep(backoff)
+        raise last_err
 
 
 # ---------------- BROWSER/CONTEXT ----------------
-async def launch_browser_and_context():
-    pw = await async_playwright().start()
-
+async def launch_browser(pw) -> Browser:
     launch_kwargs = dict(
         headless=True,
         args=[
@@ -168,8 +352,11 @@ async def launch_browser_and_context():
     )
     # NESSUN proxy configurato (nessuna variabile né opzione passata)
 
-    browser: Browser = await pw.chromium.launch(**launch_kwargs)
+    with timed("browser_launch"):
+        return await pw.chromium.launch(**launch_kwargs)
 
+
+async def new_scraping_context(browser: Browser) -> BrowserContext:
     context: BrowserContext = await browser.new_context(
         user_agent=("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
                     "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -182,171 +369,1256 @@ async def launch_browser_and_context():
     )
     context.set_default_timeout(PAGE_TIMEOUT)
 
-    # Routing globale: blocca risorse pesanti (immagini, CSS, font, media)
-    async def route_blocker(route):
-        req = route.request
-        rtype = req.resource_type
-        if rtype in ("image", "media", "font", "stylesheet"):
-            return await route.abort()
-        url = req.url
-        if any(x in url for x in ("google-analytics.com", "doubleclick.net")):
-            return await route.abort()
-        return await route.continue_()
+    if _blocks_in_browser(context):
+        # Blocca Chromium stesso, ma solo sulle pagine aperte da new_page: popup (window.open) e
+        # iframe out-of-process non ricevono setBlockedURLs e passano dal route ristretto agli URL
+        # bloccabili, che serve anche i domini con eccezioni in allow-list
+        pattern = block_policy.route_pattern()
+        if pattern is not None:
+            await context.route(pattern, _route_blocker)
+    else:
+        # Applica il routing a tutto il context così vale per nuove pagine e popup
+        await context.route("**/*", _route_blocker)
 
-    # Applica il routing a tutto il context così vale per nuove pagine e popup
-    await context.route("**/*", route_blocker)
+    def _track_page(page: Page) -> None:
+        PAGES_OPEN.inc()
 
-    return pw, browser, context
+        def _closed(_page: Page) -> None:
+            PAGES_OPEN.dec()
+            close_page_stats(page)      # no-op se il pool l'ha già fatto al rilascio
+        page.on("close", _closed)
+    context.on("page", _track_page)
 
+    return context
 
-# ---------------- SCRAPING ----------------
-async def resolve_shortlink(context: BrowserContext, link: str) -> Optional[str]:
+
+# ---------------- BLOCCO RICHIESTE ----------------
+# Policy compilata in blocking.py (suffissi di dominio, allow-list widget, tipi di risorsa)
+BLOCK_PATTERNS = block_policy.browser_patterns()
+
+
+def _blocks_in_browser(context: BrowserContext) -> bool:
+    browser = context.browser
+    return BLOCK_MODE == "cdp" and browser is not None and browser.browser_type.name == "chromium"
+
+
+async def _route_blocker(route) -> None:
+    req = route.request
+    if block_policy.should_block(req.url, req.resource_type):
+        try:
+            page = req.frame.page
+        except Exception:
+            page = None     # richieste dei service worker: nessuna pagina
+        record_blocked(page, req.resource_type)
+        return await route.abort()
+    return await route.continue_()
+
+
+async def new_page(context: BrowserContext) -> Page:
+    # Pagina con la policy già attiva prima della prima navigazione. In modalità cdp il blocco
+    # avviene in Chromium (nessun round-trip verso Python per richiesta); i blocchi si contano
+    # dagli eventi loadingFailed, che arrivano in modo asincrono senza fermare la richiesta.
+    # Vale per il solo frame principale della pagina: popup e iframe OOPIF restano al route del context.
     page = await context.new_page()
+    if not _blocks_in_browser(context):
+        return page
     try:
-        await goto_with_retries(page, link, retries=MAX_RETRIES)
-        if page.response():
-            return page.response().url
-        return page.url
+        session = await context.new_cdp_session(page)
+
+        def _failed(params: Dict) -> None:
+            if params.get("blockedReason") == "inspector":
+                record_blocked(page, params.get("type", "other"))
+        session.on("Network.loadingFailed", _failed)
+        await session.send("Network.enable")
+        await session.send("Network.setBlockedURLs", {"urls": BLOCK_PATTERNS})
     except Exception as e:
-        logger.debug(f"Errore risoluzione shortlink {link}: {e}")
-        return None
-    finally:
-        await page.close()
+        logger.debug(f"Blocco CDP non disponibile, uso il route handler: {e}")
+        await page.route("**/*", _route_blocker)
+    return page
 
 
-async def get_real_landing_urls(context: BrowserContext, query: str) -> List[Dict[str, str]]:
-    page = await context.new_page()
-    landing_pages: List[Dict[str, str]] = []
+async def launch_browser_and_context():
+    pw = await async_playwright().start()
+    browser: Browser = await launch_browser(pw)
+    context: BrowserContext = await new_scraping_context(browser)
+    return pw, browser, context
+
+
+# ---------------- BROWSER POOL ----------------
+def _chromium_rss_mb() -> float:
+    # Somma RSS dei processi figli (Chromium) leggendo /proc: solo Linux, altrove 0
     try:
-        search_url = (
-            "https://www.facebook.com/ads/library/"
-            f"?active_status=all&ad_type=all&country={COUNTRY}&q={quote_plus(query)}"
-        )
-        logger.info(f"🔍 Query: {query}")
+        children: Dict[int, List[int]] = {}
+        rss_pages: Dict[int, int] = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            pid = int(entry)
+            children.setdefault(int(fields[1]), []).append(pid)
+            rss_pages[pid] = int(fields[21])
+        total = 0
+        stack = list(children.get(os.getpid(), []))
+        while stack:
+            pid = stack.pop()
+            total += rss_pages.get(pid, 0)
+            stack.extend(children.get(pid, []))
+        return total * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except Exception:
+        return 0.0
+
+
+def memory_mb() -> float:
+    # Segnale di memoria per lo scheduler: worker Python + Chromium
+    return process_rss_mb() + _chromium_rss_mb()
+
+
+class _BrowserSlot:
+    def __init__(self, browser: Browser):
+        self.browser = browser
+        self.pages = 0
+        self.active = 0
+        self.retiring = False
+        self.launched_at = time.monotonic()
+
+    def exhausted(self, max_pages: int) -> bool:
+        return self.retiring or self.pages >= max_pages or not self.browser.is_connected()
+
+
+class BrowserPool:
+    # Browser Chromium condivisi dal processo: ogni query riceve un context isolato,
+    # il browser viene riciclato dopo N pagine o se la memoria supera la soglia.
+    def __init__(self, size: int = BROWSER_POOL_SIZE,
+                 max_pages: int = BROWSER_MAX_PAGES,
+                 max_rss_mb: int = BROWSER_MAX_RSS_MB):
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self._pw = None
+        self._slots: List[_BrowserSlot] = []
+        self._lock: Optional[asyncio.Lock] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._draining = False
+        self.recycled = 0
+
+    async def start(self) -> None:
+        self._lock = asyncio.Lock()
+        self._pw = await async_playwright().start()
+        for _ in range(self.size):
+            self._slots.append(_BrowserSlot(await launch_browser(self._pw)))
+        self._health_task = asyncio.create_task(self._health_loop())
+        logger.info(f"🧩 Browser pool avviato ({self.size} browser)")
+
+    async def _pick_slot(self) -> _BrowserSlot:
+        async with self._lock:
+            usable = [s for s in self._slots if not s.exhausted(self.max_pages)]
+            if not usable:
+                slot = _BrowserSlot(await launch_browser(self._pw))
+                self._slots.append(slot)
+                return slot
+            return min(usable, key=lambda s: s.active)
+
+    async def _retire_idle(self) -> None:
+        async with self._lock:
+            for slot in list(self._slots):
+                if slot.active == 0 and slot.exhausted(self.max_pages):
+                    self._slots.remove(slot)
+                    self.recycled += 1
+                    logger.info(f"♻️ Browser riciclato dopo {slot.pages} pagine")
+                    try:
+                        await slot.browser.close()
+                    except Exception:
+                        pass
+            while not self._draining and len(self._slots) < self.size:
+                self._slots.append(_BrowserSlot(await launch_browser(self._pw)))
+
+    @asynccontextmanager
+    async def context(self):
+        if self._draining or _shutdown_event.is_set():
+            raise asyncio.CancelledError()
+        slot = await self._pick_slot()
+        slot.active += 1
+        context = None
 
-        await goto_with_retries(page, search_url, retries=MAX_RETRIES)
+        def _count_page(_page=None):
+            slot.pages += 1
+        try:
+            context = await new_scraping_context(slot.browser)
+            context.on("page", _count_page)
+            # Le pagine del pool landing si contano a ogni uso, non quando vengono create
+            async with landing_pages(context, lambda: new_scraping_context(slot.browser), _count_page):
+                yield context
+        finally:
+            slot.active -= 1
+            if context:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+            await self._retire_idle()
+
+    async def health_check(self) -> Dict:
+        rss = _chromium_rss_mb()
+        if self.max_rss_mb and rss > self.max_rss_mb and self._slots:
+            # Non sappiamo quale browser pesa di più: ritiriamo quello con più pagine servite
+            heaviest = max(self._slots, key=lambda s: s.pages)
+            heaviest.retiring = True
+            logger.warning(f"⚠️ Chromium RSS {rss:.0f} MB > {self.max_rss_mb} MB, riciclo browser")
+        if not self._draining:
+            await self._retire_idle()
+        return self.stats(rss)
+
+    async def _health_loop(self) -> None:
+        while not self._draining:
+            await asyncio.sleep(BROWSER_POOL_HEALTH_INTERVAL)
+            try:
+                await self.health_check()
+            except Exception as e:
+                logger.error(f"❌ Health check pool fallito: {e}")
+
+    def stats(self, rss_mb: Optional[float] = None) -> Dict:
+        return {
+            "browsers": len(self._slots),
+            "connected": sum(1 for s in self._slots if s.browser.is_connected()),
+            "active_contexts": sum(s.active for s in self._slots),
+            "pages": [s.pages for s in self._slots],
+            "recycled": self.recycled,
+            "chromium_rss_mb": round(_chromium_rss_mb() if rss_mb is None else rss_mb, 1),
+            "draining": self._draining,
+            "page_pools": page_pool_stats(),
+        }
+
+    async def drain(self, timeout: float = 30.0) -> None:
+        if self._draining:
+            return
+        self._draining = True
+        logger.info("🛑 Drain browser pool...")
+        if self._health_task:
+            self._health_task.cancel()
+        deadline = time.monotonic() + timeout
+        while any(s.active for s in self._slots) and time.monotonic() < deadline:
+            await asyncio.sleep(0.2)
+        for slot in self._slots:
+            try:
+                await slot.browser.close()
+            except Exception:
+                pass
+        self._slots.clear()
+        await close_fetcher()
+        if self._pw:
+            await self._pw.stop()
+            self._pw = None
+        logger.info("✓ Browser pool chiuso")
+
+
+# Event loop dedicato (thread separato) su cui vive il pool e girano gli scraping
+_pool: Optional[BrowserPool] = None
+_pool_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def start_browser_pool() -> BrowserPool:
+    global _pool, _pool_loop
+    if _pool is not None:
+        return _pool
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="browser-pool", daemon=True).start()
+    pool = BrowserPool()
+    try:
+        asyncio.run_coroutine_threadsafe(pool.start(), loop).result()
+    except Exception:
+        asyncio.run_coroutine_threadsafe(pool.drain(0), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        raise
+    _pool, _pool_loop = pool, loop
+    return pool
+
+
+def stop_browser_pool(timeout: float = 30.0) -> None:
+    global _pool, _pool_loop
+    if _pool is None:
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_pool.drain(timeout), _pool_loop).result(timeout + 5)
+    finally:
+        _pool_loop.call_soon_threadsafe(_pool_loop.stop)
+        _pool, _pool_loop = None, None
+
+
+def run_in_pool(coro, timeout: Optional[float] = None):
+    # Senza pool si torna al vecchio comportamento (event loop per chiamata)
+    if _pool_loop is None:
+        return asyncio.run(coro)
+    return asyncio.run_coroutine_threadsafe(coro, _pool_loop).result(timeout)
+
+
+_fallback_executor: Optional[ThreadPoolExecutor] = None
+
+
+def submit_to_pool(coro) -> Future:
+    # Come run_in_pool ma senza bloccare il chiamante (usato dai job in background)
+    global _fallback_executor
+    if _pool_loop is not None:
+        return asyncio.run_coroutine_threadsafe(coro, _pool_loop)
+    if _fallback_executor is None:
+        _fallback_executor = ThreadPoolExecutor(max_workers=MAX_BACKGROUND_JOBS, thread_name_prefix="job")
+    return _fallback_executor.submit(asyncio.run, coro)
+
+
+def pool_health() -> Dict:
+    if _pool is None:
+        return {"pool": "disabled"}
+    return asyncio.run_coroutine_threadsafe(_pool.health_check(), _pool_loop).result(30)
+
+
+def scheduler_health() -> Optional[Dict]:
+    # Limiti correnti dello scheduler, letti sul loop del pool
+    if _pool_loop is None:
+        return None
+
+    async def snapshot():
+        return scheduler_stats(_pool_loop)
+    return asyncio.run_coroutine_threadsafe(snapshot(), _pool_loop).result(5)
+
+
+def _scheduler_gauge(key: str) -> Callable[[], Optional[int]]:
+    # Letti dal thread dello scrape: un loop del pool occupato non deve bloccare /metrics
+    def read() -> Optional[int]:
+        gauges = scheduler_gauges(_pool_loop)
+        return gauges[key] if gauges else None
+    return read
 
-        logger.info("⏳ Attesa caricamento iniziale...")
-        await page.wait_for_timeout(INITIAL_WAIT)
 
+registry.gauge("leadgen_pages_in_flight", "Landing in analisi (slot dello scheduler occupati)",
+               _scheduler_gauge("in_flight"))
+registry.gauge("leadgen_pages_waiting", "Landing in attesa di uno slot dello scheduler", _scheduler_gauge("waiting"))
+registry.gauge("leadgen_pages_limit", "Limite adattivo di pagine in volo", _scheduler_gauge("limit"))
+
+
+@asynccontextmanager
+async def scraping_context():
+    # Usa il pool se siamo sul suo loop, altrimenti lancia un browser dedicato
+    if _pool is not None and asyncio.get_running_loop() is _pool_loop:
+        async with _pool.context() as context:
+            yield context
+    else:
+        pw = browser = context = None
+        try:
+            pw, browser, context = await launch_browser_and_context()
+            async with landing_pages(context, lambda: new_scraping_context(browser)):
+                yield context
+        finally:
+            try:
+                await close_fetcher()
+                drop_scheduler()
+                if context:
+                    await context.close()
+                if browser:
+                    await browser.close()
+            finally:
+                if pw:
+                    await pw.stop()
+
+
+# ---------------- PAGE POOL ----------------
+PAGE_POOL_LEASES = registry.counter("leadgen_page_pool_leases_total",
+                                    "Pagine consegnate dal pool landing (source=new/reused)")
+PAGE_POOL_DISCARDED = registry.counter("leadgen_page_pool_discarded_total",
+                                       "Pagine chiuse invece di tornare nel pool, per motivo")
+PAGE_POOL_ROTATIONS = registry.counter("leadgen_page_pool_rotations_total",
+                                       "Context landing sostituiti (navigations/memory)")
+
+# Storage dell'origine appena visitata, svuotato prima di rimettere la pagina nel pool
+CLEAR_ORIGIN_STORAGE_JS = """() => {
+    try { localStorage.clear(); } catch (e) {}
+    try { sessionStorage.clear(); } catch (e) {}
+}"""
+
+# Secondi livelli che senza Public Suffix List si trattano come suffissi pubblici (co.uk, com.br, ...)
+PUBLIC_SECOND_LEVELS = frozenset(("co", "com", "net", "org", "gov", "edu", "ac", "or", "ne", "go", "gob", "nic"))
+
+
+def cookie_domains(host: str) -> List[str]:
+    # L'host visitato e i domini padre su cui può aver scritto cookie, fermandosi prima di un suffisso
+    # pubblico: www.shop.co.uk -> www.shop.co.uk, shop.co.uk (mai co.uk). Un IP vale solo per sé.
+    host = host.lower().rstrip(".")
+    try:
+        ipaddress.ip_address(host)
+        return [host]
+    except ValueError:
+        pass
+    labels = host.split(".")
+    # Suffisso pubblico: il TLD, o due etichette sotto un ccTLD con secondo livello generico o di 2 lettere
+    suffix = 1
+    if len(labels) >= 3 and len(labels[-1]) == 2 and (labels[-2] in PUBLIC_SECOND_LEVELS or len(labels[-2]) == 2):
+        suffix = 2
+    return [".".join(labels[i:]) for i in range(max(1, len(labels) - suffix))]
+
+
+class PagePool:
+    # Pagine riusate per landing e shortlink di una run: a fine uso si svuotano cookie e storage
+    # dell'origine visitata e tornano su about:blank (DOM e heap JS liberati), pronte; il context
+    # che le ospita, dove restano cache HTTP e IndexedDB, si sostituisce dopo max_navigations usi
+    # o se Chromium supera max_rss_mb. Le pagine ancora in uso finiscono sul vecchio context,
+    # chiuso all'ultima.
+    def __init__(self, new_context: Callable[[], Awaitable[BrowserContext]],
+                 on_lease: Optional[Callable[[], None]] = None, size: int = PAGE_POOL_SIZE,
+                 max_navigations: int = PAGE_POOL_MAX_NAVIGATIONS, max_rss_mb: int = PAGE_POOL_MAX_RSS_MB):
+        self.new_context = new_context
+        self.on_lease = on_lease
+        self.size = max(1, size)
+        self.max_navigations = max_navigations
+        self.max_rss_mb = max_rss_mb
+        self._context: Optional[BrowserContext] = None
+        self._uses = 0                                  # navigazioni servite dal context corrente
+        self._idle: List[Page] = []
+        self._leased: Dict[Page, BrowserContext] = {}
+        self._active: Dict[BrowserContext, int] = {}    # pagine in uso (o in creazione) per context
+        self._retired: Set[BrowserContext] = set()
+        self._lock = asyncio.Lock()
+        self._rss_checked = time.monotonic()
+        self._closed = False
+        self.created = self.reused = self.discarded = self.rotations = 0
+
+    async def start(self, warm: int = PAGE_POOL_WARM) -> None:
+        self._context = await self.new_context()
+        self._active[self._context] = 0
+        warm = min(warm, self.size)
+        if warm > 0:
+            pages = await asyncio.gather(*[new_page(self._context) for _ in range(warm)], return_exceptions=True)
+            self._idle = [p for p in pages if not isinstance(p, BaseException)]
+            self.created += len(self._idle)
+
+    def _rotation_reason(self) -> Optional[str]:
+        if self.max_navigations and self._uses >= self.max_navigations:
+            return "navigations"
+        now = time.monotonic()
+        if self.max_rss_mb and self._uses and now - self._rss_checked >= PAGE_POOL_RSS_CHECK:
+            self._rss_checked = now
+            if _chromium_rss_mb() > self.max_rss_mb:
+                return "memory"
+        return None
+
+    async def _rotate(self, reason: str) -> None:
+        context = await self.new_context()
+        old, idle = self._context, self._idle
+        self._context, self._idle, self._uses = context, [], 0
+        self._active[context] = 0
+        self.rotations += 1
+        PAGE_POOL_ROTATIONS.inc(reason=reason)
+        logger.info(f"♻️ Context landing ruotato ({reason}): {len(idle)} pagine libere chiuse, "
+                    f"{self._active.get(old, 0)} ancora in uso")
+        self.discarded += len(idle)
+        PAGE_POOL_DISCARDED.inc(len(idle), reason="rotated")
+        if self._active.get(old):
+            self._retired.add(old)
+        else:
+            await self._close_context(old)
+
+    async def _close_context(self, context: Optional[BrowserContext]) -> None:
+        if context is None:
+            return
+        self._active.pop(context, None)
+        self._retired.discard(context)
         try:
-            await page.wait_for_selector('div[role="main"]', timeout=10000)
-            logger.info("✓ Pagina caricata")
+            await context.close()
         except Exception:
-            logger.warning("⚠️ Timeout pagina principale, continuo...")
+            pass
 
-        logger.info("📜 Inizio scroll...")
-        for i in range(SCROLL_COUNT):
-            if _shutdown_event.is_set():
-                break
-            await page.evaluate("window.scrollBy(0, window.innerHeight)")
-            await page.wait_for_timeout(SCROLL_WAIT)
-            logger.info(f"  Scroll {i+1}/{SCROLL_COUNT}")
-
-        await page.evaluate("window.scrollTo(0, 0)")
-        await page.wait_for_timeout(1200)
-
-        stats = await page.evaluate("""
-            () => ({
-                totalLinks: document.querySelectorAll('a[href]').length,
-                fbLinks: document.querySelectorAll('a[href*="l.facebook.com"], a[href*="fb.me"]').length,
-                adIdLinks: document.querySelectorAll('a[href*="ads/library/?id="]').length,
-                bodyLength: document.body.innerHTML.length
-            })
-        """)
-        logger.info(f"📊 Links: {stats['totalLinks']} | FB: {stats['fbLinks']} | AdID: {stats['adIdLinks']} | HTML: {stats['bodyLength']} chars")
-
-        ads_data = await page.evaluate("""
-            () => {
-                const results = [];
-                const seen = new Set();
-
-                // METODO 1: da link dettaglio annuncio
-                const detailLinks = document.querySelectorAll('a[href*="ads/library/?id="]');
-                detailLinks.forEach(detailLink => {
-                    const adIdMatch = detailLink.href.match(/id=(\\d+)/);
-                    if (!adIdMatch) return;
-                    const adUrl = `https://www.facebook.com/ads/library/?id=${adIdMatch[1]}`;
-
-                    let container = detailLink.closest('div[class*="x1"]') || detailLink.closest('[role="article"]');
-                    if (!container) {
-                        container = detailLink.parentElement;
-                        for (let i = 0; i < 15 && container; i++) {
-                            const landingLinks = container.querySelectorAll('a[href*="l.facebook.com"], a[href*="fb.me"]');
-                            if (landingLinks.length > 0) break;
-                            container = container.parentElement;
-                        }
-                    }
+    async def acquire(self) -> Page:
+        if self._closed:
+            raise asyncio.CancelledError()
+        async with self._lock:
+            reason = self._rotation_reason()
+            if reason:
+                await self._rotate(reason)
+            context = self._context
+            self._uses += 1
+            self._active[context] += 1
+            page = self._idle.pop() if self._idle else None
+        try:
+            if page is None or page.is_closed():
+                page = await new_page(context)
+                self.created += 1
+                PAGE_POOL_LEASES.inc(source="new")
+            else:
+                open_page_stats(page)
+                self.reused += 1
+                PAGE_POOL_LEASES.inc(source="reused")
+        except BaseException:
+            await self._done(context)
+            raise
+        self._leased[page] = context
+        if self.on_lease:
+            self.on_lease()
+        return page
+
+    async def release(self, page: Page, reusable: bool = True) -> None:
+        # Pagina fallita (eccezione durante l'uso) o in eccesso: si chiude invece di resettarla
+        context = self._leased.pop(page)
+        reason = "failed" if not reusable else "overflow"
+        try:
+            if reusable and self._keeps(page, context):
+                try:
+                    await self._clear_origin(page, context)
+                    await page.goto("about:blank", timeout=PAGE_POOL_RESET_TIMEOUT)
+                    # I blocchi si contano per uso: chiusi qui, l'handler di chiusura non li riosserva
+                    close_page_stats(page)
+                    if self._keeps(page, context):
+                        self._idle.append(page)
+                        return
+                    reason = "rotated"
+                except Exception:
+                    reason = "reset_failed"
+            self.discarded += 1
+            PAGE_POOL_DISCARDED.inc(reason=reason)
+            try:
+                await page.close()
+            except Exception:
+                pass
+        finally:
+            await self._done(context)
+
+    async def _clear_origin(self, page: Page, context: BrowserContext) -> None:
+        host = urlparse(page.url).hostname
+        if not host:
+            return
+        await asyncio.wait_for(page.evaluate(CLEAR_ORIGIN_STORAGE_JS), PAGE_POOL_RESET_TIMEOUT / 1000)
+        # Solo i cookie dell'host e dei suoi domini padre (es. .esempio.it per www.esempio.it): il
+        # context è condiviso con le altre pagine in uso, i loro siti restano intatti
+        domains = "|".join(re.escape(d) for d in cookie_domains(host))
+        await context.clear_cookies(domain=re.compile(rf"^\.?({domains})$"))
+
+    def _keeps(self, page: Page, context: BrowserContext) -> bool:
+        return (not self._closed and context is self._context and len(self._idle) < self.size
+                and not page.is_closed())
+
+    async def _done(self, context: BrowserContext) -> None:
+        if context not in self._active:
+            return      # context già chiuso (pool chiuso durante l'uso)
+        self._active[context] -= 1
+        if context in self._retired and not self._active[context]:
+            await self._close_context(context)
+
+    async def close(self) -> None:
+        self._closed = True
+        self._idle.clear()
+        for context in [self._context, *self._retired]:
+            await self._close_context(context)
+        self._context = None
+
+    def stats(self) -> Dict:
+        return {"idle": len(self._idle), "leased": len(self._leased), "contexts": 1 + len(self._retired),
+                "navigations": self._uses, "created": self.created, "reused": self.reused,
+                "discarded": self.discarded, "rotations": self.rotations}
+
+
+# Pool landing attivi, per context della run (scraping_context); senza pool una pagina per URL
+_page_pools: Dict[BrowserContext, PagePool] = {}
+
+
+@asynccontextmanager
+async def landing_pages(context: BrowserContext, new_context: Callable[[], Awaitable[BrowserContext]],
+                        on_lease: Optional[Callable[[], None]] = None):
+    if not PAGE_POOL_ENABLED:
+        yield None
+        return
+    pool = PagePool(new_context, on_lease)
+    try:
+        await pool.start()
+    except Exception as e:
+        # Senza pool si torna a una pagina per URL sul context della run
+        logger.warning(f"⚠️ Pool pagine landing non disponibile: {e}")
+        await pool.close()
+        yield None
+        return
+    _page_pools[context] = pool
+    try:
+        yield pool
+    finally:
+        _page_pools.pop(context, None)
+        stats = pool.stats()
+        logger.info(f"🧩 Pool pagine: {stats['created']} create, {stats['reused']} riusate, "
+                    f"{stats['rotations']} context ruotati")
+        await pool.close()
+
+
+@asynccontextmanager
+async def landing_page(context: BrowserContext):
+    # Pagina per landing o shortlink: dal pool della run se c'è, altrimenti nuova e chiusa a fine uso
+    pool = _page_pools.get(context)
+    if pool is None:
+        page = await new_page(context)
+        try:
+            yield page
+        finally:
+            await page.close()
+        return
+    page = await pool.acquire()
+    ok = False
+    try:
+        yield page
+        ok = True
+    finally:
+        await pool.release(page, reusable=ok)
+
+
+def page_pool_stats() -> Dict:
+    pools = [pool.stats() for pool in list(_page_pools.values())]
+    totals = {key: sum(p[key] for p in pools) for key in ("idle", "leased", "contexts", "created", "reused",
+                                                           "discarded", "rotations")}
+    return {"pools": len(pools), **totals}
+
+
+def _page_pool_pages() -> Dict:
+    stats = page_pool_stats()
+    return {("state", "idle"): stats["idle"], ("state", "leased"): stats["leased"]}
+
+
+registry.gauge("leadgen_page_pool_pages", "Pagine dei pool landing per stato (idle/leased)", _page_pool_pages)
+
+
+# ---------------- SCRAPING ----------------
+async def resolve_shortlink(context: BrowserContext, link: str) -> Optional[str]:
+    try:
+        async with landing_page(context) as page:
+            await goto_with_retries(page, link, retries=MAX_RETRIES)
+            if page.response():
+                return page.response().url
+            return page.url
+    except Exception as e:
+        logger.debug(f"Errore risoluzione shortlink {link}: {e}")
+        return None
+
+
+# ---------------- SCROLL ----------------
+@dataclass
+class ScrollStats:
+    mode: str
+    scrolls: int = 0
+    ads: int = 0
+    seconds: float = 0.0
+    stop_reason: str = ""
+    source: str = "dom"         # da dove arrivano gli annunci: network (XHR/GraphQL) o dom
+
+    @property
+    def ads_per_second(self) -> float:
+        return round(self.ads / self.seconds, 2) if self.seconds else 0.0
+
+
+# Totali cumulati per il tuning di SCROLL_* (esposti in /healthz)
+DISCOVERY_STATS: Dict[str, object] = {"runs": 0, "scrolls": 0, "ads": 0, "seconds": 0.0, "last": None}
+
+
+def _record_discovery(stats: ScrollStats) -> None:
+    DISCOVERY_STATS["runs"] += 1
+    DISCOVERY_STATS["scrolls"] += stats.scrolls
+    DISCOVERY_STATS["ads"] += stats.ads
+    DISCOVERY_STATS["seconds"] += stats.seconds
+    DISCOVERY_STATS["last"] = {**asdict(stats), "ads_per_second": stats.ads_per_second}
+    sources = DISCOVERY_STATS.setdefault("sources", {})
+    sources[stats.source] = sources.get(stats.source, 0) + 1
+    logger.info(f"📜 Scroll {stats.mode}: {stats.scrolls} scroll, {stats.ads} annunci ({stats.source}) in "
+                f"{stats.seconds:.1f}s ({stats.ads_per_second} annunci/s, stop: {stats.stop_reason})")
+    emit("discovery", **DISCOVERY_STATS["last"])
+
+
+# Osserva il DOM: timestamp dell'ultima mutazione e dell'ultimo scroll
+SCROLL_OBSERVER_JS = """
+    () => {
+        if (window.__lgScroll) return;
+        const state = window.__lgScroll = { lastMutation: performance.now(), scrolledAt: 0 };
+        new MutationObserver(() => { state.lastMutation = performance.now(); })
+            .observe(document.body, { childList: true, subtree: true });
+    }
+"""
+
+# Annunci distinti visibili: Ad ID da link di dettaglio o dal testo "ID libreria: N"
+COUNT_ADS_JS = """
+    () => {
+        const ids = new Set();
+        document.querySelectorAll('a[href*="ads/library/?id="]').forEach(a => {
+            const m = a.href.match(/id=(\\d+)/);
+            if (m) ids.add(m[1]);
+        });
+        const text = document.body.textContent || '';
+        for (const m of text.matchAll(/(?:ID libreria|Library ID|Ad ID)[\\s:]+(\\d+)/gi)) ids.add(m[1]);
+        return ids.size;
+    }
+"""
+
+# Vero quando il DOM è fermo da `idle` ms dopo l'ultimo scroll (caricamento finito o niente da caricare)
+DOM_QUIET_JS = """
+    (idle) => {
+        const s = window.__lgScroll;
+        return performance.now() - Math.max(s.lastMutation, s.scrolledAt) > idle;
+    }
+"""
+
+
+# Estrazione originale (risalita fino a 25 antenati con innerHTML/innerText per ogni link):
+# quadratica sulle pagine grandi, resta disponibile con ADS_EXTRACTOR=legacy e per i confronti
+LEGACY_ADS_JS = """
+    () => {
+        const results = [];
+        const seen = new Set();
+
+        // METODO 1: da link dettaglio annuncio
+        const detailLinks = document.querySelectorAll('a[href*="ads/library/?id="]');
+        detailLinks.forEach(detailLink => {
+            const adIdMatch = detailLink.href.match(/id=(\\d+)/);
+            if (!adIdMatch) return;
+            const adUrl = `https://www.facebook.com/ads/library/?id=${adIdMatch[1]}`;
+
+            let container = detailLink.closest('div[class*="x1"]') || detailLink.closest('[role="article"]');
+            if (!container) {
+                container = detailLink.parentElement;
+                for (let i = 0; i < 15 && container; i++) {
+                    const landingLinks = container.querySelectorAll('a[href*="l.facebook.com"], a[href*="fb.me"]');
+                    if (landingLinks.length > 0) break;
+                    container = container.parentElement;
+                }
+            }
 
-                    if (container) {
-                        const landingLinks = container.querySelectorAll('a[href*="l.facebook.com"], a[href*="fb.me"]');
-                        landingLinks.forEach(link => {
-                            if (!seen.has(link.href)) {
-                                seen.add(link.href);
-                                results.push({ landing: link.href, ad_url: adUrl });
-                            }
-                        });
+            if (container) {
+                const landingLinks = container.querySelectorAll('a[href*="l.facebook.com"], a[href*="fb.me"]');
+                landingLinks.forEach(link => {
+                    if (!seen.has(link.href)) {
+                        seen.add(link.href);
+                        results.push({ landing: link.href, ad_url: adUrl });
                     }
                 });
-
-                // METODO 2: per ciascun landing link risali all'Ad ID
-                const allLandings = document.querySelectorAll('a[href*="l.facebook.com"], a[href*="fb.me"]');
-                allLandings.forEach(link => {
-                    if (seen.has(link.href)) return;
-
-                    let adUrl = null;
-                    let parent = link.parentElement;
-                    for (let level = 0; level < 25 && parent; level++) {
-                        const adLink = parent.querySelector('a[href*="ads/library/?id="]');
-                        if (adLink) {
-                            const match = adLink.href.match(/id=(\\d+)/);
-                            if (match) {
-                                adUrl = `https://www.facebook.com/ads/library/?id=${match[1]}`;
-                                break;
-                            }
-                        }
-
-                        const html = parent.innerHTML;
-                        const htmlMatch = html.match(/ads\\/library\\/\\?id=(\\d+)/);
-                        if (htmlMatch) {
-                            adUrl = `https://www.facebook.com/ads/library/?id=${htmlMatch[1]}`;
-                            break;
-                        }
-
-                        const text = parent.innerText || parent.textContent || '';
-                        const textMatch = text.match(/(?:ID libreria|Library ID|Ad ID)[\\s:]+(\\d+)/i);
-                        if (textMatch) {
-                            adUrl = `https://www.facebook.com/ads/library/?id=${textMatch[1]}`;
-                            break;
-                        }
-
-                        parent = parent.parentElement;
+            }
+        });
+
+        // METODO 2: per ciascun landing link risali all'Ad ID
+        const allLandings = document.querySelectorAll('a[href*="l.facebook.com"], a[href*="fb.me"]');
+        allLandings.forEach(link => {
+            if (seen.has(link.href)) return;
+
+            let adUrl = null;
+            let parent = link.parentElement;
+            for (let level = 0; level < 25 && parent; level++) {
+                const adLink = parent.querySelector('a[href*="ads/library/?id="]');
+                if (adLink) {
+                    const match = adLink.href.match(/id=(\\d+)/);
+                    if (match) {
+                        adUrl = `https://www.facebook.com/ads/library/?id=${match[1]}`;
+                        break;
                     }
+                }
 
-                    seen.add(link.href);
-                    results.push({ landing: link.href, ad_url: adUrl });
-                });
+                const html = parent.innerHTML;
+                const htmlMatch = html.match(/ads\\/library\\/\\?id=(\\d+)/);
+                if (htmlMatch) {
+                    adUrl = `https://www.facebook.com/ads/library/?id=${htmlMatch[1]}`;
+                    break;
+                }
 
-                // METODO 3: fallback globale
-                if (results.every(r => !r.ad_url)) {
-                    const bodyHtml = document.body.innerHTML;
-                    const allAdIds = [...bodyHtml.matchAll(/ads\\/library\\/\\?id=(\\d+)/g)];
-                    if (allAdIds.length > 0) {
-                        const firstAdId = allAdIds[0][1];
-                        const fallbackUrl = `https://www.facebook.com/ads/library/?id=${firstAdId}`;
-                        results.forEach(r => {
-                            if (!r.ad_url) r.ad_url = fallbackUrl;
-                        });
-                    }
+                const text = parent.innerText || parent.textContent || '';
+                const textMatch = text.match(/(?:ID libreria|Library ID|Ad ID)[\\s:]+(\\d+)/i);
+                if (textMatch) {
+                    adUrl = `https://www.facebook.com/ads/library/?id=${textMatch[1]}`;
+                    break;
                 }
 
-                return results;
+                parent = parent.parentElement;
             }
-        """)
 
-        logger.info(f"✅ Estratti {len(ads_data)} link")
-        with_ad = sum(1 for x in ads_data if x['ad_url'])
-        logger.info(f"   📎 Con Ad ID: {with_ad} | ⚠️ Senza: {len(ads_data) - with_ad}")
+            seen.add(link.href);
+            results.push({ landing: link.href, ad_url: adUrl });
+        });
+
+        // METODO 3: fallback globale
+        if (results.every(r => !r.ad_url)) {
+            const bodyHtml = document.body.innerHTML;
+            const allAdIds = [...bodyHtml.matchAll(/ads\\/library\\/\\?id=(\\d+)/g)];
+            if (allAdIds.length > 0) {
+                const firstAdId = allAdIds[0][1];
+                const fallbackUrl = `https://www.facebook.com/ads/library/?id=${firstAdId}`;
+                results.forEach(r => {
+                    if (!r.ad_url) r.ad_url = fallbackUrl;
+                });
+            }
+        }
+
+        return results;
+    }
+"""
+
+# Indicizzatore lineare: una sola visita del DOM in ordine di documento raccoglie gli Ad ID
+# (link di dettaglio o testo "ID libreria: N") e i link alle landing. L'antenato più vicino
+# di un link che contiene un Ad ID è il più profondo tra gli LCA col precedente e col
+# successivo Ad ID in ordine di documento: stessa assegnazione della risalita, senza
+# serializzare innerHTML a ogni livello. È incrementale: dopo ogni scroll restituisce solo i
+# link nuovi; quelli in coda alla pagina aspettano il passaggio finale (o l'Ad ID successivo).
+INDEX_ADS_JS = """
+    (final) => {
+        const st = window.__lgIndex || (window.__lgIndex = { emitted: new Set(), ids: new Set(), firstAdId: null });
+        const MAX_CLIMB = 25;
+        const AD_HREF = /ads\\/library\\/\\?id=(\\d+)/;
+        const AD_TEXT = /(?:ID libreria|Library ID|Ad ID)[\\s:]+(\\d+)/i;
+        const AD_LABEL = /(?:ID libreria|Library ID|Ad ID)[\\s:]*$/i;
+        const LEADING_ID = /^[\\s:]*(\\d+)/;
+
+        const events = [];
+        let pendingLabel = false;
+        const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_ELEMENT | NodeFilter.SHOW_TEXT);
+        for (let node = walker.currentNode; node; node = walker.nextNode()) {
+            if (node.nodeType === Node.TEXT_NODE) {
+                const value = node.nodeValue;
+                if (pendingLabel) {
+                    // "ID libreria:" e il numero in due nodi di testo separati
+                    const m = value.match(LEADING_ID);
+                    if (m) events.push({ id: m[1], node: node.parentNode, anchor: false });
+                    if (value.trim()) pendingLabel = false;
+                }
+                if (value.length > 5) {
+                    const m = value.match(AD_TEXT);
+                    if (m) events.push({ id: m[1], node: node.parentNode, anchor: false });
+                    else if (AD_LABEL.test(value)) pendingLabel = true;
+                }
+            } else if (node.tagName === 'A') {
+                const href = node.href || '';
+                const m = href.match(AD_HREF);
+                if (m) {
+                    events.push({ id: m[1], node, anchor: true });
+                    if (!st.firstAdId) st.firstAdId = m[1];
+                } else if (href.includes('l.facebook.com') || href.includes('fb.me')) {
+                    events.push({ link: href, node });
+                }
+            }
+        }
+
+        const depthOf = (n) => { let d = 0; for (; n; n = n.parentNode) d++; return d; };
+        const lcaDepth = (a, b) => {
+            let da = depthOf(a), db = depthOf(b);
+            for (; da > db; da--) a = a.parentNode;
+            for (; db > da; db--) b = b.parentNode;
+            for (; a !== b; da--) { a = a.parentNode; b = b.parentNode; }
+            return da;
+        };
+
+        const nextId = new Array(events.length);
+        for (let i = events.length - 1, next = null; i >= 0; i--) {
+            nextId[i] = next;
+            if (events[i].id) next = events[i];
+        }
+
+        const items = [];
+        const newIds = [];
+        let prev = null;
+        events.forEach((ev, i) => {
+            if (ev.id) {
+                prev = ev;
+                if (!st.ids.has(ev.id)) { st.ids.add(ev.id); newIds.push(ev.id); }
+                return;
+            }
+            if (st.emitted.has(ev.link)) return;
+            const next = nextId[i];
+            if (!final && !next) return;
+
+            let best = null, bestDepth = -1;
+            for (const cand of [prev, next]) {
+                if (!cand) continue;
+                const d = lcaDepth(ev.node, cand.node);
+                if (d > bestDepth || (d === bestDepth && cand.anchor && !best.anchor)) {
+                    best = cand;
+                    bestDepth = d;
+                }
+            }
+            const inReach = best && depthOf(ev.node) - bestDepth <= MAX_CLIMB;
+            st.emitted.add(ev.link);
+            items.push({
+                landing: ev.link,
+                ad_url: inReach ? `https://www.facebook.com/ads/library/?id=${best.id}` : null
+            });
+        });
+
+        return { items, ads: st.ids.size, newIds, firstAdId: st.firstAdId };
+    }
+"""
+
+
+class AdIndexer:
+    # Accumula lato Python i risultati di INDEX_ADS_JS passaggio dopo passaggio
+    def __init__(self, page: Page, on_items: Optional[Callable[[List[Dict[str, Optional[str]]]], None]] = None):
+        self.page = page
+        self.on_items = on_items
+        self.items: List[Dict[str, Optional[str]]] = []
+        self.ads = 0
+        self.ids: Set[str] = set()          # Ad ID visti nel DOM (unione con quelli dalla rete)
+        self.first_ad_id: Optional[str] = None
+        self._held: List[Dict[str, Optional[str]]] = []
+
+    async def update(self, final: bool = False) -> int:
+        result = await evaluate(self.page, "index_ads", INDEX_ADS_JS, final)
+        self.items.extend(result["items"])
+        self.ads = result["ads"]
+        self.ids.update(result["newIds"])
+        self.first_ad_id = result["firstAdId"]
+        if self.on_items is not None:
+            # I link senza Ad ID aspettano finish(): il fallback METODO 3 può ancora assegnarlo
+            ready = [x for x in result["items"] if x["ad_url"]]
+            self._held.extend(x for x in result["items"] if not x["ad_url"])
+            if ready:
+                self.on_items(ready)
+        return self.ads
+
+    async def finish(self) -> List[Dict[str, Optional[str]]]:
+        await self.update(final=True)
+        # METODO 3: fallback globale, come nell'estrazione originale
+        if self.items and self.first_ad_id and all(not x["ad_url"] for x in self.items):
+            fallback_url = f"https://www.facebook.com/ads/library/?id={self.first_ad_id}"
+            for item in self.items:
+                item["ad_url"] = fallback_url
+        if self.on_items is not None and self._held:
+            self.on_items(self._held)
+            self._held = []
+        return self.items
+
+
+async def scroll_fixed(page: Page, count_ads: Callable[[], Awaitable[int]],
+                       stop: Optional[Callable[[], bool]] = None) -> ScrollStats:
+    stats = ScrollStats(mode="fixed")
+    started = time.monotonic()
+
+    def out_of_time() -> bool:
+        left = discovery_time_left()
+        return left is not None and left <= 0
+
+    logger.info("⏳ Attesa caricamento iniziale...")
+    left = discovery_time_left()
+    await page.wait_for_timeout(INITIAL_WAIT if left is None else max(0, min(INITIAL_WAIT, int(left * 1000))))
+
+    try:
+        await page.wait_for_selector('div[role="main"]', timeout=10000)
+        logger.info("✓ Pagina caricata")
+    except Exception:
+        logger.warning("⚠️ Timeout pagina principale, continuo...")
+
+    logger.info("📜 Inizio scroll...")
+    stats.stop_reason = "max_scrolls"
+    for i in range(SCROLL_COUNT):
+        if _shutdown_event.is_set():
+            stats.stop_reason = "shutdown"
+            break
+        if out_of_time():
+            stats.stop_reason = "deadline"
+            break
+        await evaluate(page, "scroll_step", "window.scrollBy(0, window.innerHeight)")
+        await page.wait_for_timeout(SCROLL_WAIT)
+        stats.scrolls += 1
+        await count_ads()
+        logger.info(f"  Scroll {i+1}/{SCROLL_COUNT}")
+        emit("scroll", step=i + 1, total=SCROLL_COUNT)
+        if stop is not None and stop():
+            stats.stop_reason = "known_ads"
+            break
+
+    await evaluate(page, "scroll_top", "window.scrollTo(0, 0)")
+    await page.wait_for_timeout(1200)
+
+    stats.ads = await count_ads()
+    stats.seconds = time.monotonic() - started
+    return stats
+
+
+async def scroll_adaptive(page: Page, count_ads: Callable[[], Awaitable[int]],
+                          stop: Optional[Callable[[], bool]] = None) -> ScrollStats:
+    # Scrolla finché compaiono nuovi annunci: si ferma dopo SCROLL_STALL_LIMIT scroll a vuoto,
+    # al raggiungimento di SCROLL_TARGET_ADS, alla scadenza di SCROLL_DEADLINE_MS (o prima, se la
+    # run scade: resta la riserva per le landing, vedi discovery_time_left) o quando `stop` lo chiede
+    # (modalità incrementale: solo annunci già visti)
+    stats = ScrollStats(mode="adaptive")
+    started = time.monotonic()
+    deadline = started + SCROLL_DEADLINE / 1000
+    left = discovery_time_left()
+    if left is not None:
+        deadline = min(deadline, started + left)
+
+    def remaining_ms() -> int:
+        return max(0, int((deadline - time.monotonic()) * 1000))
+
+    await evaluate(page, "scroll_observer", SCROLL_OBSERVER_JS)
+
+    # Attesa iniziale: primo annuncio in pagina oppure DOM fermo, al massimo INITIAL_WAIT
+    try:
+        await page.wait_for_function(
+            f"(idle) => ({COUNT_ADS_JS})() > 0 || ({DOM_QUIET_JS})(idle)",
+            arg=SCROLL_IDLE, polling=250, timeout=min(INITIAL_WAIT, remaining_ms()) or 1
+        )
+    except Exception:
+        logger.warning("⚠️ Nessun annuncio entro l'attesa iniziale, continuo...")
+
+    ads = await count_ads()
+    stalls = 0
+    stats.stop_reason = "max_scrolls"
+    for i in range(SCROLL_MAX_STEPS):
+        if _shutdown_event.is_set():
+            stats.stop_reason = "shutdown"
+            break
+        if SCROLL_TARGET_ADS and ads >= SCROLL_TARGET_ADS:
+            stats.stop_reason = "target"
+            break
+        if remaining_ms() <= 0:
+            stats.stop_reason = "deadline"
+            break
+        if stop is not None and stop():
+            stats.stop_reason = "known_ads"
+            break
+
+        await evaluate(page, "scroll_step", """() => {
+            window.__lgScroll.scrolledAt = performance.now();
+            window.scrollTo(0, document.body.scrollHeight);
+        }""")
+        stats.scrolls += 1
+        try:
+            await page.wait_for_function(DOM_QUIET_JS, arg=SCROLL_IDLE, polling=100,
+                                         timeout=min(SCROLL_WAIT * 3, remaining_ms()) or 1)
+        except Exception:
+            pass  # il DOM continua a cambiare: si misura comunque
+
+        new_ads = await count_ads()
+        stalls = 0 if new_ads > ads else stalls + 1
+        ads = new_ads
+        logger.info(f"  Scroll {i+1}: {ads} annunci")
+        emit("scroll", step=i + 1, total=SCROLL_MAX_STEPS, ads=ads)
+        if stalls >= SCROLL_STALL_LIMIT:
+            stats.stop_reason = "no_new_ads"
+            break
+
+    stats.ads = ads
+    stats.seconds = time.monotonic() - started
+    return stats
+
+
+# ---------------- LANDING FEED ----------------
+LandingSink = Callable[[Dict], Awaitable[None]]
+
+
+class LandingFeed:
+    # Trasforma i link indicizzati in landing pronte man mano che lo scroll li trova:
+    # l.php si decodifica subito, gli shortlink si risolvono in parallelo, i duplicati
+    # si scartano e ogni landing nuova va al sink (di solito la coda dei worker).
+    # add() non blocca mai lo scroll: la backpressure della coda frena solo il feed.
+    # Con `known_ads`/`known_urls` (modalità incrementale) gli annunci e le landing già
+    # analizzati si contano come invariati e non proseguono.
+    def __init__(self, context: BrowserContext, sink: LandingSink,
+                 known_ads: Optional[Set[str]] = None, known_urls: Optional[Set[str]] = None):
+        self.sink = sink
+        self.known_ads = known_ads or set()
+        self.known_urls = known_urls or set()
+        self.unchanged = 0
+        self._step_new = 0
+        self._step_known = 0
+        self.resolver = ShortlinkResolver(
+            browser_fallback=lambda link: resolve_shortlink(context, link),
+            use_cache=CACHE_ENABLED and _run_options.get().use_cache
+        )
+        self.links = 0
+        self.with_ad = 0
+        self.landings = 0
+        self._links_seen: Set[str] = set()
+        self._urls_seen: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._started = time.monotonic()
+        self._resolve_started: Optional[float] = None
+
+    def add(self, items: List[Dict[str, Optional[str]]]) -> None:
+        for item in items:
+            landing_link = item['landing']
+            if landing_link in self._links_seen:
+                continue
+            self._links_seen.add(landing_link)
+            self.links += 1
+            self.with_ad += bool(item['ad_url'])
+            if _shutdown_event.is_set():
+                continue
+            ad_id = AD_ID_RE.search(item['ad_url'] or "")
+            if ad_id and ad_id.group(1) in self.known_ads:
+                self.unchanged += 1
+                self._step_known += 1
+                continue
+            self._step_new += 1
+
+            if "l.facebook.com/l.php?u=" in landing_link:
+                coro = self._publish(extract_real_url(landing_link), item['ad_url'])
+            elif should_exclude_url(landing_link) or "fb.me/" in landing_link:
+                # fb.me, bit.ly e simili (anche gli shortlink dello stand-in dei benchmark): serve il redirect
+                coro = self._resolve(landing_link, item['ad_url'])
+            else:
+                # Landing diretta (annunci dalle risposte di rete)
+                coro = self._publish(landing_link, item['ad_url'])
+            task = asyncio.ensure_future(coro)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, link: str, ad_url: Optional[str]) -> None:
+        if self._resolve_started is None:
+            self._resolve_started = time.monotonic()
+        self.resolver.stats.links += 1
+        with timed("shortlink", link=link):
+            real_url = await self.resolver.resolve(link)
+        # Il redirect può finire su l.php: si decodifica come gli altri
+        if real_url and "l.facebook.com/l.php?u=" in real_url:
+            real_url = extract_real_url(real_url)
+        emit("shortlink", link=link, resolved=real_url)
+        await self._publish(real_url, ad_url)
+
+    async def _publish(self, real_url: Optional[str], ad_url: Optional[str]) -> None:
+        if not real_url or _shutdown_event.is_set():
+            return
+        norm_url = normalize_url(real_url)
+        if should_exclude_url(norm_url) or norm_url in self._urls_seen:
+            return
+        self._urls_seen.add(norm_url)
+        if norm_url in self.known_urls:
+            # Annuncio nuovo ma landing già analizzata per questa ricerca
+            self.unchanged += 1
+            return
+        # order = posizione nel flusso di discovery: i lead finali tornano in quest'ordine
+        landing = {
+            'url': norm_url,
+            'ad_link': ad_url or 'Non disponibile',
+            'order': self.landings,
+            'discovered_s': round(time.monotonic() - self._started, 2)
+        }
+        self.landings += 1
+        await self.sink(landing)
+
+    async def drain(self) -> None:
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        st = self.resolver.stats
+        if st.links:
+            st.seconds = time.monotonic() - self._resolve_started
+            record_resolver_stats(st)
+            logger.info(f"🔗 Shortlink: {st.links} in {st.seconds:.1f}s | cache {st.cache_hits} | "
+                        f"http {st.http} | browser {st.browser} | falliti {st.failed}")
+            emit("shortlinks", **asdict(st))
+
+    def only_known(self) -> bool:
+        # True se dall'ultima chiamata sono arrivati solo annunci già visti: lo scroll può fermarsi
+        result = self._step_known > 0 and self._step_new == 0
+        self._step_known = self._step_new = 0
+        return result
+
+    def cancel(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+
+
+def merge_ad_items(network: List[Dict[str, Optional[str]]],
+                   dom: List[Dict[str, Optional[str]]]) -> List[Dict[str, Optional[str]]]:
+    # Annunci dalla rete + quelli visti solo nel DOM, deduplicati per landing (l.php decodificato)
+    def key(link: str) -> str:
+        real = extract_real_url(link) if "l.facebook.com/l.php?u=" in link else link
+        return normalize_url(real) if real else link
+
+    merged = list(network)
+    seen = {key(item['landing']) for item in network}
+    for item in dom:
+        k = key(item['landing'])
+        if k not in seen:
+            seen.add(k)
+            merged.append(item)
+    return merged
+
+
+async def discover_landings(context: BrowserContext, query: str, sink: LandingSink,
+                            country: str = COUNTRY) -> int:
+    # Produttore della pipeline: ogni landing nuova va a `sink` appena pronta, senza
+    # aspettare la fine dello scroll. Ritorna il numero di landing inviate.
+    incremental = _run_options.get().incremental
+    if incremental:
+        known_ads, known_urls = lead_store.seen(query, country)
+        feed = LandingFeed(context, sink, known_ads, known_urls)
+        logger.info(f"🔁 Incrementale: {len(known_ads)} annunci e {len(known_urls)} landing già visti")
+    else:
+        feed = LandingFeed(context, sink)
+    stop = feed.only_known if incremental and feed.known_ads else None
+    capture: Optional[AdResponseCapture] = None
+    try:
+        page = await new_page(context)
+        try:
+            if ADS_EXTRACTOR != "legacy" and DISCOVERY_SOURCE == "network":
+                # In ascolto prima della navigazione: anche il primo blocco di risultati arriva via XHR
+                capture = AdResponseCapture(page, ADS_LIBRARY_URL, feed.add)
+            search_url = (
+                f"{ADS_LIBRARY_URL}"
+                f"?active_status=all&ad_type=all&country={country}&q={quote_plus(query)}"
+            )
+            logger.info(f"🔍 Query: {query} [{country}]")
+
+            await goto_with_retries(page, search_url, retries=MAX_RETRIES)
+
+            # L'indicizzatore gira dopo ogni scroll: i link nuovi partono subito verso il feed
+            if ADS_EXTRACTOR == "legacy":
+                indexer = AdIndexer(page)
+
+                async def count_ads() -> int:
+                    return await evaluate(page, "count_ads", COUNT_ADS_JS)
+            else:
+                indexer = AdIndexer(page, on_items=feed.add)
+
+                async def count_ads() -> int:
+                    # Il DOM si indicizza sempre: la prima pagina può essere già nel documento
+                    # (nessuna risposta XHR); con la rete si contano gli annunci distinti delle due fonti
+                    ads = await indexer.update()
+                    if capture is None:
+                        return ads
+                    await capture.settle()
+                    return len(indexer.ids | capture.ads)
+
+            with timed("scroll", query=query, country=country):
+                if SCROLL_MODE == "adaptive":
+                    scroll_stats = await scroll_adaptive(page, count_ads, stop)
+                else:
+                    scroll_stats = await scroll_fixed(page, count_ads, stop)
+            if capture is not None and capture.ads:
+                scroll_stats.source = "network"
+            _record_discovery(scroll_stats)
+
+            stats = await evaluate(page, "link_stats", """
+                () => ({
+                    totalLinks: document.querySelectorAll('a[href]').length,
+                    fbLinks: document.querySelectorAll('a[href*="l.facebook.com"], a[href*="fb.me"]').length,
+                    adIdLinks: document.querySelectorAll('a[href*="ads/library/?id="]').length,
+                    nodes: document.getElementsByTagName('*').length
+                })
+            """)
+            logger.info(f"📊 Links: {stats['totalLinks']} | FB: {stats['fbLinks']} | AdID: {stats['adIdLinks']} "
+                        f"| DOM: {stats['nodes']} nodi | "
+                        f"Bloccate: {page_block_stats(page)['requests']}")
+
+            with timed("extraction", query=query, country=country):
+                if ADS_EXTRACTOR == "legacy":
+                    ads_data = await evaluate(page, "legacy_ads", LEGACY_ADS_JS)
+                    feed.add(ads_data)
+                else:
+                    ads_data = await indexer.finish()
+                    if capture is not None and capture.ads:
+                        await capture.settle()
+                        dom_only = len(indexer.ids - capture.ads)
+                        ads_data = merge_ad_items(capture.items, ads_data)
+                        logger.info(f"📡 Rete: {len(capture.ads)} annunci da {capture.responses} risposte "
+                                    f"| solo DOM: {dom_only}")
+                    elif capture is not None:
+                        logger.warning("⚠️ Nessun annuncio dalle risposte di rete, estrazione dal DOM")
+        finally:
+            # La pagina della libreria serve solo allo scroll: si chiude prima di attendere gli shortlink
+            if capture is not None:
+                capture.close()
+            await page.close()
+
+        logger.info(f"✅ Estratti {feed.links} link")
+        logger.info(f"   📎 Con Ad ID: {feed.with_ad} | ⚠️ Senza: {feed.links - feed.with_ad}")
+        emit("extraction", links=feed.links, with_ad=feed.with_ad,
+             source="network" if capture is not None and capture.ads else "dom")
 
         for i, item in enumerate(ads_data[:2]):
             ad_status = "✓" if item['ad_url'] else "✗"
@@ -354,36 +1626,366 @@ async def get_real_landing_urls(context: BrowserContext, query: str) -> List[Dic
             if item['ad_url']:
                 logger.info(f"   Ad: {item['ad_url'][:70]}...")
 
-        seen_urls: Set[str] = set()
-        for item in ads_data:
-            if _shutdown_event.is_set():
-                break
+        await feed.drain()
 
-            landing_link = item['landing']
-            ad_url = item['ad_url']
+        logger.info(f"🎯 Landing finali: {feed.landings}")
+        emit("landings", count=feed.landings)
+        if incremental:
+            logger.info(f"🔁 {query} [{country}]: {feed.landings} nuove | {feed.unchanged} invariate")
+            emit("incremental", query=query, country=country, new=feed.landings, unchanged=feed.unchanged)
+        return feed.landings
+
+    except Exception as e:
+        # Le landing già inviate restano in coda: run_pipeline segna il risultato come parziale
+        logger.error(f"❌ Errore scraping: {e}")
+        raise
+    finally:
+        feed.cancel()
+
+
+async def get_real_landing_urls(context: BrowserContext, query: str,
+                                country: str = COUNTRY) -> List[Dict[str, str]]:
+    # Variante a barriera: raccoglie tutte le landing prima di restituirle
+    landing_pages: List[Dict[str, str]] = []
+
+    async def collect(landing: Dict) -> None:
+        landing_pages.append(landing)
+
+    try:
+        await discover_landings(context, query, collect, country=country)
+    except Exception:
+        pass    # già loggato: si restituisce quanto raccolto
+    return landing_pages
+
+
+# Quante lead (e quanto tempo) servite da ciascun tier: misura il tempo browser risparmiato
+TIER_STATS: Dict[str, Dict[str, float]] = {
+    tier: {"leads": 0, "seconds": 0.0} for tier in ("cache", "http", "http_fallback", "browser")
+}
+
+
+def _record_tier(tier: str, started: float) -> None:
+    TIER_STATS[tier]["leads"] += 1
+    TIER_STATS[tier]["seconds"] += time.monotonic() - started
+
+
+# Tempi per fase (ms nella lead, totali cumulati qui) e contatori di readiness/crawl, esposti in /healthz
+STAGE_STATS: Dict[str, Dict[str, float]] = {}
+LANDING_STATS: Dict[str, int] = {"ready_capped": 0, "early_exit": 0, "crawl_pages": 0, "crawl_hits": 0}
+
+
+def _record_stage(lead: Lead, stage: str, started: float) -> None:
+    seconds = time.monotonic() - started
+    lead.timings[stage] = lead.timings.get(stage, 0) + round(seconds * 1000)
+    stats = STAGE_STATS.setdefault(stage, {"count": 0, "seconds": 0.0})
+    stats["count"] += 1
+    stats["seconds"] += seconds
+    LANDING_STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+def _extract_contacts(html: str, text: str, links: str) -> Tuple[Optional[str], Optional[str]]:
+    with timed("contacts"):
+        return extract_contacts(html, text, links)
+
+
+# Pronta = documento caricato e nessuna mutazione del DOM da `idle` ms
+READY_JS = """
+    (idle) => {
+        if (!window.__lgReady) {
+            window.__lgReady = { last: performance.now() };
+            new MutationObserver(() => { window.__lgReady.last = performance.now(); })
+                .observe(document.documentElement, { childList: true, subtree: true, characterData: true });
+        }
+        return document.readyState !== 'loading' && performance.now() - window.__lgReady.last > idle;
+    }
+"""
+
+SCROLL_BOTTOM_JS = """
+    () => {
+        window.scrollTo(0, document.body.scrollHeight);
+        if (window.__lgReady) window.__lgReady.last = performance.now();
+    }
+"""
+
+PAGE_DATA_JS = """
+    () => ({
+        text: document.documentElement.innerText || document.body.innerText,
+        html: document.documentElement.innerHTML,
+        links: Array.from(document.querySelectorAll('a[href]')).map(a => a.href).join(' ')
+    })
+"""
+
+# Solo i candidati: finestre attorno a '@' (email) e a sequenze di 8-16 cifre (telefoni), in ordine
+# di posizione e separate da " |" (nessun pattern Python lo attraversa), link mailto/tel/con cifre e
+# link di contatto dello stesso sito, più l'inizio del testo per il copy. Ogni campo ha un tetto.
+PAGE_SNIPPETS_JS = """
+    (o) => {
+        const SEP = ' |\\n';
+        const ALNUM = /[A-Za-z0-9]/;
+        const DIGITS = /[+(]?\\d[\\d\\s\\-().]{6,}\\d/g;
+        const snippets = (src, from, cap) => {
+            const spans = [];
+            for (let i = src.indexOf('@', from); i !== -1; i = src.indexOf('@', i + 1)) {
+                // '@media', '@import' e simili non hanno un carattere alfanumerico prima
+                if (ALNUM.test(src[i - 1] || '') && ALNUM.test(src[i + 1] || '')) {
+                    spans.push([i - o.emailLocal, i + o.emailDomain]);
+                }
+            }
+            DIGITS.lastIndex = from;
+            for (let m; (m = DIGITS.exec(src));) {
+                const n = m[0].replace(/\\D/g, '').length;
+                if (n >= 8 && n <= 16) spans.push([m.index - o.pad, m.index + m[0].length + o.pad]);
+            }
+            spans.sort((a, b) => a[0] - b[0]);
+            let out = '', last = null;
+            const flush = () => {
+                if (!last) return true;
+                const piece = src.slice(last[0], last[1]);
+                if (out.length + piece.length + SEP.length > cap) return false;
+                out += piece + SEP;
+                return true;
+            };
+            for (const [s, e] of spans) {
+                const start = Math.max(from, s), end = Math.min(src.length, e);
+                if (last && start <= last[1]) { last[1] = Math.max(last[1], end); continue; }
+                if (!flush()) return out;
+                last = [start, end];
+            }
+            flush();
+            return out;
+        };
+
+        const html = document.documentElement.innerHTML;
+        const text = document.documentElement.innerText || document.body.innerText || '';
+        const contactPath = new RegExp(o.contactPath, 'i');
+        const host = (h) => h.toLowerCase().replace(/^www\\./, '');
+        const here = host(location.hostname);
+        let links = '', linkChars = 0;
+        for (const a of document.querySelectorAll('a[href]')) {
+            const href = a.href;
+            linkChars += href.length + 1;
+            const keep = /^(mailto|tel):/i.test(href) || href.includes('@') || /\\d{8,}/.test(href) ||
+                (host(a.hostname || '') === here && contactPath.test(a.pathname));
+            if (keep && links.length + href.length + 1 <= o.linksMax) links += href + ' ';
+        }
+        const sample = text.slice(0, o.textSample);
+        const result = {
+            html: snippets(html, 0, o.htmlMax),
+            text: sample + SEP + snippets(text, sample.length, o.textMax),
+            links,
+        };
+        result.chars = result.html.length + result.text.length + result.links.length;
+        result.pageChars = html.length + text.length + linkChars;
+        return result;
+    }
+"""
+
+CONTACT_PATH_RE = re.compile(r'contatt|contact|kontakt|chi-siamo|chisiamo|about|dove-siamo|azienda|impressum',
+                             re.IGNORECASE)
+SNIPPET_OPTIONS = {
+    "emailLocal": EMAIL_LOCAL_MAX, "emailDomain": 256, "pad": 16, "contactPath": CONTACT_PATH_RE.pattern,
+    "htmlMax": SNIPPET_HTML_MAX, "textMax": SNIPPET_TEXT_MAX, "textSample": SNIPPET_TEXT_SAMPLE,
+    "linksMax": SNIPPET_LINKS_MAX,
+}
+
+
+async def read_page(page: Page, lead: Optional[Lead] = None) -> Dict:
+    # html/text/links per extract_contacts e score_copy; in modalità snippets solo i candidati
+    if EXTRACT_MODE == "full":
+        data = await evaluate(page, "page_data", PAGE_DATA_JS)
+        data["chars"] = data["pageChars"] = len(data["html"]) + len(data["text"]) + len(data["links"])
+    else:
+        data = await evaluate(page, "page_snippets", PAGE_SNIPPETS_JS, SNIPPET_OPTIONS)
+    PAGE_SNIPPET_CHARS.observe(data["chars"], mode=EXTRACT_MODE)
+    if lead is not None:
+        lead.transfer["chars"] = lead.transfer.get("chars", 0) + data["chars"]
+        lead.transfer["page_chars"] = lead.transfer.get("page_chars", 0) + data["pageChars"]
+    return data
+
+
+async def wait_ready(page: Page, cap_ms: int) -> bool:
+    # Attesa guidata da eventi con tetto: False se il tetto è scattato prima
+    if READY_MODE == "fixed":
+        await page.wait_for_timeout(cap_ms)
+        return True
+    try:
+        if READY_MODE == "networkidle":
+            await page.wait_for_load_state("networkidle", timeout=cap_ms)
+        else:
+            await page.wait_for_function(READY_JS, arg=READY_IDLE, polling=100, timeout=cap_ms)
+        return True
+    except Exception:
+        LANDING_STATS["ready_capped"] += 1
+        return False
 
-            if "l.facebook.com/l.php?u=" in landing_link:
-                real_url = extract_real_url(landing_link)
-            else:
-                real_url = await resolve_shortlink(context, landing_link)
 
-            if real_url:
-                norm_url = normalize_url(real_url)
-                if not should_exclude_url(norm_url) and norm_url not in seen_urls:
-                    landing_pages.append({
-                        'url': norm_url,
-                        'ad_link': ad_url or 'Non disponibile'
-                    })
-                    seen_urls.add(norm_url)
+def contact_links(base_url: str, links: str) -> List[str]:
+    # Link dello stesso dominio verso contatti (prima) o chi siamo, senza duplicati
+    def host(netloc: str) -> str:
+        netloc = netloc.lower()
+        return netloc[4:] if netloc.startswith("www.") else netloc
+
+    base_host = host(urlparse(base_url).netloc)
+    base_norm = normalize_url(base_url)
+    ranked: Dict[str, int] = {}
+    for href in links.split():
+        parsed = urlparse(href)
+        if parsed.scheme not in ("http", "https") or host(parsed.netloc) != base_host:
+            continue
+        m = CONTACT_PATH_RE.search(parsed.path)
+        if not m:
+            continue
+        target = parsed._replace(fragment="").geturl()
+        if normalize_url(target) == base_norm:
+            continue
+        ranked.setdefault(target, 0 if m.group().lower().startswith(("contatt", "contact", "kontakt")) else 1)
+    return sorted(ranked, key=ranked.get)[:CONTACT_CRAWL_PAGES]
+
+
+async def _fetch_contact_page(lead: Lead, url: str, page: Optional[Page],
+                              remaining: float) -> Optional[Dict[str, str]]:
+    if HTTP_TIER_ENABLED:
+        try:
+            result = await get_fetcher().fetch(url)
+        except Exception:
+            result = None
+        if result is not None and not result.looks_js_rendered:
+            return {"html": result.html, "text": result.text, "links": result.links}
+    # Senza pagina (tier HTTP) non si apre il browser solo per una sottopagina
+    if page is None:
+        return None
+    await page.goto(url, timeout=min(PAGE_TIMEOUT, remaining * 1000), wait_until="domcontentloaded")
+    await wait_ready(page, READY_MAX)
+    return await read_page(page, lead)
+
+
+async def _crawl_contacts(lead: Lead, url: str, links: str, page: Optional[Page] = None) -> None:
+    # Crawl limitato: al massimo CONTACT_CRAWL_PAGES pagine entro CONTACT_CRAWL_BUDGET ms
+    targets = contact_links(url, links)
+    if not targets:
+        return
+    # Lavoro facoltativo: senza tempo per l'intero budget si tiene quanto già trovato
+    left = time_left()
+    if left is not None and left < CONTACT_CRAWL_BUDGET / 1000:
+        return
+    started = time.monotonic()
+    deadline = started + CONTACT_CRAWL_BUDGET / 1000
+    try:
+        for target in targets:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or _shutdown_event.is_set():
+                break
+            data = await asyncio.wait_for(_fetch_contact_page(lead, target, page, remaining), remaining)
+            LANDING_STATS["crawl_pages"] += 1
+            if data is None:
+                continue
+            email, telefono = _extract_contacts(data['html'], data['text'], data['links'])
+            if (email and not lead.email) or (telefono and not lead.telefono):
+                LANDING_STATS["crawl_hits"] += 1
+            lead.email = lead.email or email
+            lead.telefono = lead.telefono or telefono
+            if lead.email and lead.telefono:
+                break
+    except Exception as e:
+        logger.debug(f"Crawl contatti interrotto {url}: {e}")
+    finally:
+        _record_stage(lead, "crawl", started)
 
-        logger.info(f"🎯 Landing finali: {len(landing_pages)}")
-        return landing_pages
 
+async def _scrape_http(lead: Lead, url: str) -> bool:
+    # Tier leggero: HTML statico via HTTP. False = serve il browser (SPA o nessun contatto)
+    started = time.monotonic()
+    try:
+        result = await get_fetcher().fetch(url)
     except Exception as e:
-        logger.error(f"❌ Errore scraping: {e}")
-        return []
+        logger.debug(f"HTTP tier fallito {url}: {e}")
+        return False
     finally:
-        await page.close()
+        _record_stage(lead, "http", started)
+    if result is None or result.looks_js_rendered:
+        return False
+
+    email, telefono = _extract_contacts(result.html, result.text, result.links)
+    if not (email or telefono):
+        return False
+
+    lead.email, lead.telefono = email, telefono
+    copy = score_copy(result.text)
+    lead.copy_valutazione, lead.copy_score = copy.label, copy.score
+    lead.status = "success"
+    lead.tier = "http"
+    if CONTACT_CRAWL_PAGES and not (lead.email and lead.telefono):
+        await _crawl_contacts(lead, result.url, result.links)
+    logger.info(f"✓ {url[:40]}... | E:{bool(lead.email)} T:{bool(lead.telefono)} (http)")
+    return True
+
+
+async def _page_contacts(lead: Lead, page: Page) -> Dict[str, str]:
+    started = time.monotonic()
+    data = await read_page(page, lead)
+    lead.email, lead.telefono = _extract_contacts(data['html'], data['text'], data['links'])
+    _record_stage(lead, "extract", started)
+    return data
+
+
+async def _scrape_browser(context: BrowserContext, lead: Lead, url: str) -> None:
+    lead.tier = "browser"
+    try:
+        # Un errore chiude la pagina invece di restituirla al pool
+        async with landing_page(context) as page:
+            try:
+                started = time.monotonic()
+                await goto_with_retries(page, url, retries=MAX_RETRIES)
+                _record_stage(lead, "goto", started)
+
+                started = time.monotonic()
+                await wait_ready(page, READY_MAX)
+                _record_stage(lead, "ready", started)
+
+                data = await _page_contacts(lead, page)
+                if lead.email and lead.telefono:
+                    # Già tutto: niente scroll né attese aggiuntive
+                    LANDING_STATS["early_exit"] += 1
+                else:
+                    # Footer e contenuti lazy: scroll in fondo e breve attesa di stabilità
+                    started = time.monotonic()
+                    await evaluate(page, "scroll_bottom", SCROLL_BOTTOM_JS)
+                    await wait_ready(page, READY_SCROLL_MAX)
+                    _record_stage(lead, "scroll", started)
+                    data = await _page_contacts(lead, page)
+
+                copy = score_copy(data['text'])
+                lead.copy_valutazione, lead.copy_score = copy.label, copy.score
+                lead.status = "success"
+
+                if CONTACT_CRAWL_PAGES and not (lead.email and lead.telefono):
+                    await _crawl_contacts(lead, page.url, data['links'], page)
+            finally:
+                lead.blocked = page_block_stats(page)
+
+        status = "✓" if (lead.email or lead.telefono) else "○"
+        logger.info(f"{status} {url[:40]}... | E:{bool(lead.email)} T:{bool(lead.telefono)}")
+
+    except Exception:
+        logger.warning(f"✗ {url[:40]}... (timeout/error)")
+        lead.status = "timeout"
+
+
+async def _cache_get(key: str) -> Optional[Dict]:
+    # La cache è un'ottimizzazione: un errore SQLite (lock, disco pieno, file corrotto) vale come
+    # miss e non deve far perdere la lead. L'I/O su disco gira in un thread, fuori dal loop
+    try:
+        return await asyncio.to_thread(landing_cache.get, key)
+    except Exception as e:
+        logger.warning(f"⚠️ Cache landing non leggibile, proseguo senza: {e}")
+        return None
+
+
+async def _cache_put(key: str, value: Dict, ttl: int) -> None:
+    try:
+        await asyncio.to_thread(landing_cache.put, key, value, ttl)
+    except Exception as e:
+        logger.warning(f"⚠️ Scrittura cache landing saltata: {e}")
 
 
 async def scrape_single_lead(context: BrowserContext, url: str, ad_link: str) -> Dict:
@@ -396,132 +1998,283 @@ async def scrape_single_lead(context: BrowserContext, url: str, ad_link: str) ->
         status="error"
     )
 
-    page: Optional[Page] = None
-    try:
-        page = await context.new_page()
-
-        await goto_with_retries(page, url, retries=MAX_RETRIES)
-        await page.wait_for_timeout(2000)
-        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-        await page.wait_for_timeout(800)
-
-        data = await page.evaluate("""
-            () => ({
-                text: document.documentElement.innerText || document.body.innerText,
-                html: document.documentElement.innerHTML,
-                links: Array.from(document.querySelectorAll('a[href]')).map(a => a.href).join(' ')
-            })
-        """)
-
-        full_content = data['html'] + ' ' + data['text'] + ' ' + data['links']
-        text_lower = data['text'].lower()
-
-        # EMAIL
-        found_emails = list(dict.fromkeys(EMAIL_RE.findall(full_content)))
-        valid_emails = [e for e in found_emails if validate_email(e)]
-        if valid_emails:
-            lead.email = valid_emails[0]
-
-        # PHONE
-        found_phones = []
-        for pattern in PHONE_PATTERNS:
-            found_phones.extend(pattern.findall(full_content))
-        found_phones = list(dict.fromkeys(found_phones))
-        valid_phones = [p for p in found_phones if validate_phone(p)]
-        if valid_phones:
-            lead.telefono = valid_phones[0].strip()
-
-        # MAILTO/TEL fallback
-        if not lead.email:
-            mailto = MAILTO_RE.findall(full_content)
-            valid_mailto = [e for e in mailto if validate_email(e)]
-            if valid_mailto:
-                lead.email = valid_mailto[0]
-
-        if not lead.telefono:
-            tel = TEL_RE.findall(full_content)
-            valid_tel = [t for t in tel if validate_phone(t)]
-            if valid_tel:
-                lead.telefono = valid_tel[0].strip()
-
-        # COPY scoring
-        keywords_strong = ["gratis", "gratuito", "free", "sconto", "offerta", "promo", "risparmia", "omaggio"]
-        keywords_medium = ["lezione", "webinar", "corso", "training", "consulenza", "demo", "prova"]
-        keywords_weak = ["scopri", "impara", "migliora", "garantito"]
-
-        strong_count = sum(1 for w in keywords_strong if w in text_lower)
-        medium_count = sum(1 for w in keywords_medium if w in text_lower)
-        weak_count = sum(1 for w in keywords_weak if w in text_lower)
-
-        if strong_count >= 3:
-            lead.copy_valutazione = "Copy molto interessante (alto incentivo)"
-        elif strong_count >= 2 or (strong_count >= 1 and medium_count >= 2):
-            lead.copy_valutazione = "Copy molto interessante"
-        elif strong_count >= 1 or medium_count >= 2:
-            lead.copy_valutazione = "Copy interessante"
-        elif medium_count >= 1 or weak_count >= 2:
-            lead.copy_valutazione = "Copy discreto"
+    use_cache = CACHE_ENABLED and _run_options.get().use_cache
+    cache_key = normalize_url(url)
+    if use_cache:
+        cached = await _cache_get(cache_key)
+        if cached is not None:
+            lead.email = cached["email"]
+            lead.telefono = cached["telefono"]
+            lead.copy_valutazione = cached["copy_valutazione"]
+            lead.copy_score = cached.get("copy_score")
+            lead.status = cached["status"]
+            lead.tier = cached.get("tier", "browser")
+            lead.cached = True
+            TIER_STATS["cache"]["leads"] += 1
+            logger.info(f"⚡ {url[:40]}... (cache)")
+            return asdict(lead)
+
+    # Lo scheduler dosa le pagine in volo (AIMD) e i limiti per host; la cache ne resta fuori
+    async with get_scheduler(MAX_CONCURRENT_PAGES, memory_mb).slot(url) as slot:
+        slot_started = started = time.monotonic()
+        if HTTP_TIER_ENABLED and await _scrape_http(lead, url):
+            _record_tier("http", started)
         else:
-            lead.copy_valutazione = "Copy standard"
+            if HTTP_TIER_ENABLED:
+                _record_tier("http_fallback", started)
+                started = time.monotonic()
+            await _scrape_browser(context, lead, url)
+            _record_tier("browser", started)
+        lead.timings["total"] = round((time.monotonic() - slot_started) * 1000)
+        slot.timed_out = lead.status == "timeout"
+        slot.measured = not _shutdown_event.is_set()
+
+    # Gli esiti negativi scadono prima; un timeout dovuto allo shutdown non è un esito
+    if use_cache and not _shutdown_event.is_set():
+        ttl = CACHE_TTL_SUCCESS if lead.status == "success" else CACHE_TTL_ERROR
+        await _cache_put(cache_key, {
+            "email": lead.email,
+            "telefono": lead.telefono,
+            "copy_valutazione": lead.copy_valutazione,
+            "copy_score": lead.copy_score,
+            "status": lead.status,
+            "tier": lead.tier
+        }, ttl)
+
+    return asdict(lead)
+
+
+def _unscraped_lead(data: Dict) -> Dict:
+    # Landing non analizzata (shutdown o scadenza della run): resta nei risultati come "cancelled"
+    LEADS_TOTAL.inc(status="cancelled", tier="none")
+    return asdict(Lead(
+        landing_page=data['url'],
+        ad_link=data['ad_link'],
+        email=None,
+        telefono=None,
+        copy_valutazione=None,
+        status="cancelled"
+    ))
+
+
+async def run_pipeline(context: BrowserContext, discover: Callable[[LandingSink], Awaitable[int]]) -> List[Dict]:
+    # Pipeline: la discovery riempie una coda limitata e i worker analizzano le landing
+    # mentre lo scroll prosegue; il tempo totale tende a max(discovery, scraping).
+    # Con una scadenza (RunOptions.deadline) la discovery si chiude prima (discovery_time_left),
+    # le landing ancora in corso alla scadenza si annullano e l'evento "summary" riporta
+    # partial e il conto per fase.
+    started = time.monotonic()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    results: List[Tuple[int, Dict]] = []
+    # scraping.seconds = coda dopo la chiusura della discovery (le due fasi si sovrappongono)
+    stages = {
+        "discovery": {"status": "complete", "seconds": 0.0, "landings": 0},
+        "scraping": {"status": "complete", "seconds": 0.0, "done": 0, "cut": 0, "skipped": 0},
+    }
+    scraping = stages["scraping"]
+
+    async def scrape_worker():
+        while True:
+            data = await queue.get()
+            if data is None:
+                return
+            left = time_left()
+            if _shutdown_event.is_set() or (left is not None and left <= 0):
+                lead = _unscraped_lead(data)
+                scraping["skipped"] += 1
+            else:
+                started = time.monotonic()
+                try:
+                    lead = await asyncio.wait_for(scrape_single_lead(context, data['url'], data['ad_link']), left)
+                except asyncio.TimeoutError:
+                    # Scadenza della run a metà analisi: la landing si annulla
+                    observe_stage("landing", started, "cancelled", url=data['url'], tier="none")
+                    lead = _unscraped_lead(data)
+                    scraping["cut"] += 1
+                else:
+                    tier = "cache" if lead["cached"] else lead["tier"]
+                    observe_stage("landing", started, lead["status"], url=data['url'], tier=tier)
+                    LEADS_TOTAL.inc(status=lead["status"], tier=tier)
+                    scraping["done"] += 1
+                    emit("lead", lead=lead)
+            results.append((data['order'], lead))
+
+    async def sink(landing: Dict) -> None:
+        stages["discovery"]["landings"] += 1
+        await queue.put(landing)
+
+    # Un worker per il massimo consentito: quanti lavorano davvero lo decide lo scheduler
+    emit("stage", stage="discovery")
+    scheduler = get_scheduler(MAX_CONCURRENT_PAGES, memory_mb)
+    workers = [asyncio.create_task(scrape_worker()) for _ in range(scheduler.max_pages)]
+    error: Optional[str] = None
+    try:
+        try:
+            total = await asyncio.wait_for(discover(sink), discovery_time_left())
+        except asyncio.TimeoutError:
+            total = stages["discovery"]["landings"]
+            stages["discovery"]["status"] = "deadline"
+            logger.warning(f"⏰ Scadenza vicina: discovery interrotta dopo {time.monotonic() - started:.1f}s, "
+                           f"{total} landing in coda")
+        except Exception as e:
+            # Le landing già in coda si analizzano comunque
+            total = stages["discovery"]["landings"]
+            stages["discovery"]["status"] = "error"
+            error = str(e)
+            logger.error(f"❌ Discovery fallita: {e}")
+        discovery_s = stages["discovery"]["seconds"] = round(time.monotonic() - started, 3)
+        if total:
+            logger.info(f"🚀 Discovery chiusa in {discovery_s:.1f}s: {total} landing "
+                        f"({len(results)} già analizzate)")
+            emit("stage", stage="scraping", total=total, done=len(results))
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for worker in workers:
+            worker.cancel()
+
+    elapsed = time.monotonic() - started
+    scraping["seconds"] = round(elapsed - discovery_s, 3)
+    if scraping["cut"] or scraping["skipped"]:
+        scraping["status"] = "shutdown" if _shutdown_event.is_set() else "deadline"
+    partial = any(stage["status"] != "complete" for stage in stages.values())
+    deadline = _run_options.get().deadline
+    summary = {"partial": partial, "seconds": round(elapsed, 3), "stages": stages,
+               "deadline_s": round(deadline - _run_options.get().started, 3) if deadline is not None else None}
+    if error:
+        summary["error"] = error
+    emit("summary", **summary)
+    if partial:
+        logger.warning(f"⏰ Risultato parziale: discovery {stages['discovery']['status']} | "
+                       f"{scraping['done']} analizzate | {scraping['cut']} interrotte | "
+                       f"{scraping['skipped']} non iniziate")
+
+    if not results:
+        logger.warning("❌ Nessuna landing trovata")
+        return []
 
-        lead.status = "success"
-        status = "✓" if (lead.email or lead.telefono) else "○"
-        logger.info(f"{status} {url[:40]}... | E:{bool(lead.email)} T:{bool(lead.telefono)}")
+    leads = [lead for _, lead in sorted(results, key=lambda r: r[0])]
+    ok = sum(1 for l in leads if l["status"] == "success")
+    timeout = sum(1 for l in leads if l["status"] == "timeout")
+    logger.info(f"✅ {ok} OK | ⏱️ {timeout} timeout | 📊 {len(leads)} totali | "
+                f"⏳ {elapsed:.1f}s (discovery {discovery_s:.1f}s)")
+    return leads
 
-    except Exception:
-        logger.warning(f"✗ {url[:40]}... (timeout/error)")
-        lead.status = "timeout"
-    finally:
-        if page:
-            await page.close()
 
-    return {
-        "landing_page": lead.landing_page,
-        "ad_link": lead.ad_link,
-        "email": lead.email,
-        "telefono": lead.telefono,
-        "copy_valutazione": lead.copy_valutazione,
-        "status": lead.status
-    }
+def store_leads(leads: List[Dict], match: Optional[Dict[str, str]] = None) -> None:
+    # Archivio persistente (leadstore.py): un errore di scrittura non fa perdere la risposta
+    if not leads:
+        return
+    try:
+        if LEAD_STORE_ENABLED:
+            saved = lead_store.upsert_many(leads, match)
+            logger.info(f"💾 {saved} lead salvate nell'archivio")
+        if _run_options.get().incremental:
+            # Visti per ricerca: le lead del batch valgono per ogni query/paese che le ha trovate
+            searches: Dict[Tuple[str, str], List[Dict]] = {}
+            for lead in leads:
+                for m in lead.get("matches") or ([match] if match else []):
+                    searches.setdefault((m["query"], m["country"]), []).append(lead)
+            for (query, country), group in searches.items():
+                lead_store.mark_seen(query, country, group)
+    except Exception as e:
+        logger.error(f"❌ Salvataggio lead fallito: {e}")
 
 
-async def get_real_leads(query: str) -> List[Dict]:
+async def get_real_leads(query: str, on_event: Optional[EventSink] = None, use_cache: bool = True,
+                         trace: bool = False, incremental: bool = False,
+                         deadline_s: Optional[float] = None) -> List[Dict]:
+    # incremental=True: solo le lead nuove rispetto alle run precedenti della stessa ricerca
+    # (il conteggio degli annunci invariati arriva con l'evento "incremental").
+    # deadline_s: scadenza end-to-end (default RUN_DEADLINE_S); l'evento "summary" dice se
+    # il risultato è parziale
     if _shutdown_event.is_set():
         return []
 
-    pw = browser = context = None
+    options_token = _run_options.set(run_options(on_event, use_cache, trace, incremental, deadline_s))
     try:
-        pw, browser, context = await launch_browser_and_context()
-
-        landing_data = await get_real_landing_urls(context, query)
-        if not landing_data:
-            logger.warning("❌ Nessuna landing trovata")
-            return []
-
-        logger.info(f"🚀 Scraping {len(landing_data)} landing pages...")
-
-        semaphore = asyncio.Semaphore(MAX_CONCURRENT_PAGES)
-
-        async def scrape_with_limit(data):
-            async with semaphore:
-                if _shutdown_event.is_set():
-                    return {
-                        "landing_page": data['url'],
-                        "ad_link": data['ad_link'],
-                        "email": None,
-                        "telefono": None,
-                        "copy_valutazione": None,
-                        "status": "cancelled"
-                    }
-                return await scrape_single_lead(context, data['url'], data['ad_link'])
+        async with scraping_context() as context:
+            leads = await run_pipeline(context, lambda sink: discover_landings(context, query, sink))
+            store_leads(leads, {"query": query, "country": COUNTRY})
+            return leads
+
+    except asyncio.CancelledError:
+        logger.warning("Operazione annullata per shutdown.")
+        return []
+    except Exception as e:
+        logger.error(f"❌ Errore critico: {e}")
+        return []
+    finally:
+        _run_options.reset(options_token)
 
-        leads = await asyncio.gather(*[scrape_with_limit(d) for d in landing_data])
 
-        ok = sum(1 for l in leads if l["status"] == "success")
-        timeout = sum(1 for l in leads if l["status"] == "timeout")
-        logger.info(f"✅ {ok} OK | ⏱️ {timeout} timeout | 📊 {len(leads)} totali")
+# ---------------- BATCH ----------------
+def batch_targets(queries: List[str], countries: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+    # Coppie (query, paese) uniche, nell'ordine dato
+    countries = [c.strip().upper() for c in (countries or [COUNTRY]) if c.strip()] or [COUNTRY]
+    return list(dict.fromkeys((q.strip(), c) for q in queries if q.strip() for c in countries))
 
-        return leads
+
+async def get_real_leads_batch(queries: List[str], countries: Optional[List[str]] = None,
+                               on_event: Optional[EventSink] = None, use_cache: bool = True,
+                               trace: bool = False, incremental: bool = False,
+                               deadline_s: Optional[float] = None) -> List[Dict]:
+    # Più query (e paesi) in un solo browser: discovery in parallelo entro BATCH_DISCOVERY_CONCURRENCY,
+    # landing deduplicate a livello globale e analizzate una volta sola. Ogni lead riporta in
+    # `matches` tutte le coppie query/paese che l'hanno trovata. La scadenza vale per tutto il batch.
+    if _shutdown_event.is_set():
+        return []
+
+    targets = batch_targets(queries, countries)
+    if not targets:
+        return []
+
+    options_token = _run_options.set(run_options(on_event, use_cache, trace, incremental, deadline_s))
+    try:
+        async with scraping_context() as context:
+            matches: Dict[str, List[Dict[str, str]]] = {}
+            semaphore = asyncio.Semaphore(BATCH_DISCOVERY_CONCURRENCY)
+            failed: List[str] = []
+
+            async def discover_one(sink: LandingSink, query: str, country: str) -> None:
+                async def route(landing: Dict) -> None:
+                    match = {"query": query, "country": country}
+                    hits = matches.get(landing['url'])
+                    if hits is not None:
+                        # Già in coda per un'altra query: si aggiunge solo l'attribuzione
+                        hits.append(match)
+                        emit("match", url=landing['url'], **match)
+                        return
+                    matches[landing['url']] = [match]
+                    await sink(dict(landing, order=len(matches) - 1))
+
+                async with semaphore:
+                    if _shutdown_event.is_set():
+                        return
+                    try:
+                        found = await discover_landings(context, query, route, country=country)
+                    except Exception as e:
+                        # Una ricerca fallita non ferma le altre: il batch risulterà parziale
+                        failed.append(f"{query} [{country}]")
+                        emit("query", query=query, country=country, landings=0, error=str(e))
+                        return
+                    emit("query", query=query, country=country, landings=found)
+
+            async def discover_all(sink: LandingSink) -> int:
+                logger.info(f"📦 Batch: {len(targets)} ricerche, discovery x{BATCH_DISCOVERY_CONCURRENCY}")
+                await asyncio.gather(*[discover_one(sink, q, c) for q, c in targets])
+                if failed:
+                    raise RuntimeError(f"discovery fallita per {', '.join(failed)}")
+                return len(matches)
+
+            leads = await run_pipeline(context, discover_all)
+            for lead in leads:
+                lead["matches"] = matches.get(lead["landing_page"], [])
+            store_leads(leads)
+            shared = sum(1 for hits in matches.values() if len(hits) > 1)
+            logger.info(f"📦 Batch: {len(matches)} landing uniche | {shared} condivise tra più ricerche")
+            return leads
 
     except asyncio.CancelledError:
         logger.warning("Operazione annullata per shutdown.")
@@ -530,14 +2283,7 @@ async def get_real_leads(query: str) -> List[Dict]:
         logger.error(f"❌ Errore critico: {e}")
         return []
     finally:
-        try:
-            if context:
-                await context.close()
-            if browser:
-                await browser.close()
-        finally:
-            if pw:
-                await pw.stop()
+        _run_options.reset(options_token)
 
 
 # Esempio di esecuzione:
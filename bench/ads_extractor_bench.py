@@ -0,0 +1,72 @@
+import os
+import sys
+import glob
+import time
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from playwright.async_api import async_playwright  # noqa: E402
+
+from aut import LEGACY_ADS_JS, AdIndexer  # noqa: E402
+from fixtures import ads_library_html  # noqa: E402
+
+# Confronta l'estrazione originale (LEGACY_ADS_JS) con l'indicizzatore lineare su pagine
+# salvate della Ads Library (File > Salva pagina, .html) o su fixture sintetiche.
+# Uso:  python bench/ads_extractor_bench.py [cartella_con_html]
+
+
+def load_pages(path: Optional[str]) -> List[Tuple[str, str]]:
+    if path:
+        pages = []
+        for file in sorted(glob.glob(os.path.join(path, "*.html"))):
+            with open(file, encoding="utf-8", errors="replace") as f:
+                pages.append((os.path.basename(file), f.read()))
+        return pages
+    return [(f"synthetic-{n}-ads", ads_library_html(n, shortlink_every=5)[0]) for n in (20, 200, 800)]
+
+
+async def run_page(browser, html: str) -> Tuple[Dict, Dict, float, float]:
+    page = await browser.new_page()
+    try:
+        # set_content non ha un URL facebook: i link relativi restano relativi in entrambi i metodi
+        await page.set_content(html, wait_until="domcontentloaded")
+
+        started = time.perf_counter()
+        legacy = await page.evaluate(LEGACY_ADS_JS)
+        legacy_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        indexed = await AdIndexer(page).finish()
+        indexed_s = time.perf_counter() - started
+    finally:
+        await page.close()
+    return ({x["landing"]: x["ad_url"] for x in legacy},
+            {x["landing"]: x["ad_url"] for x in indexed}, legacy_s, indexed_s)
+
+
+async def main() -> int:
+    pages = load_pages(sys.argv[1] if len(sys.argv) > 1 else None)
+    failures = 0
+    async with async_playwright() as pw:
+        browser = await pw.chromium.launch(headless=True, args=["--no-sandbox"])
+        print(f"{'pagina':<28}{'link':>6}{'legacy ms':>11}{'indexed ms':>12}{'speedup':>9}  esito")
+        for name, html in pages:
+            legacy, indexed, legacy_s, indexed_s = await run_page(browser, html)
+            same = legacy == indexed
+            failures += not same
+            speedup = legacy_s / indexed_s if indexed_s else 0
+            print(f"{name[:27]:<28}{len(legacy):>6}{legacy_s * 1000:>11.1f}{indexed_s * 1000:>12.1f}"
+                  f"{speedup:>8.1f}x  {'identico' if same else 'DIVERSO'}")
+            if not same:
+                for landing in sorted(set(legacy) | set(indexed)):
+                    if legacy.get(landing) != indexed.get(landing):
+                        print(f"    {landing[:70]}  legacy={legacy.get(landing)}  indexed={indexed.get(landing)}")
+        await browser.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
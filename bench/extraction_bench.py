@@ -0,0 +1,167 @@
+import os
+import re
+import sys
+import glob
+import random
+import time
+from typing import List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extraction import (  # noqa: E402
+    EMAIL_RE, MAILTO_RE, TEL_RE, PHONE_PATTERNS, INVALID_EMAIL_SNIPPETS, extract_contacts
+)
+
+# Uso:  python bench/extraction_bench.py [cartella_con_html] [ripetizioni]
+# Senza cartella genera un corpus sintetico di pagine "page builder" di dimensioni reali.
+
+
+# ---------------- PERCORSO PRECEDENTE ----------------
+def legacy_validate_email(email: str) -> bool:
+    email = email.lower().strip()
+    if any(sn in email for sn in INVALID_EMAIL_SNIPPETS):
+        return False
+    if not EMAIL_RE.match(email):
+        return False
+    if re.search(r'[._%+-]{3,}', email):
+        return False
+    return True
+
+
+def legacy_validate_phone(phone: str) -> bool:
+    clean = re.sub(r'[\s\-\(\)\.]', '', phone)
+    if not re.match(r'^\+?\d{9,15}$', clean):
+        return False
+    if re.match(r'^(\d)\1+$', clean) or clean in ['123456789', '987654321', '1234567890']:
+        return False
+    if re.search(r'(\d{3,})\1', clean):
+        return False
+    return True
+
+
+def legacy_extract(html: str, text: str, links: str) -> Tuple[Optional[str], Optional[str]]:
+    email = telefono = None
+    full_content = html + ' ' + text + ' ' + links
+
+    found_emails = list(dict.fromkeys(EMAIL_RE.findall(full_content)))
+    valid_emails = [e for e in found_emails if legacy_validate_email(e)]
+    if valid_emails:
+        email = valid_emails[0]
+
+    found_phones = []
+    for pattern in PHONE_PATTERNS:
+        found_phones.extend(pattern.findall(full_content))
+    found_phones = list(dict.fromkeys(found_phones))
+    valid_phones = [p for p in found_phones if legacy_validate_phone(p)]
+    if valid_phones:
+        telefono = valid_phones[0].strip()
+
+    if not email:
+        valid_mailto = [e for e in MAILTO_RE.findall(full_content) if legacy_validate_email(e)]
+        if valid_mailto:
+            email = valid_mailto[0]
+    if not telefono:
+        valid_tel = [t for t in TEL_RE.findall(full_content) if legacy_validate_phone(t)]
+        if valid_tel:
+            telefono = valid_tel[0].strip()
+    return email, telefono
+
+
+# ---------------- CORPUS ----------------
+WORDS = ("offerta corso gratis consulenza scopri prezzo spedizione servizi chi siamo contatti "
+         "lorem ipsum dolor sit amet elementor widget container section column").split()
+
+
+def synthetic_page(rng: random.Random, target_bytes: int, contacts: bool = True) -> Tuple[str, str, str]:
+    blocks: List[str] = []
+    texts: List[str] = []
+    links: List[str] = []
+    size = 0
+    i = 0
+    while size < target_bytes:
+        i += 1
+        words = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 40)))
+        price = f"{rng.randint(10, 999)},{rng.randint(0, 99):02d} €"
+        block = (
+            f'<div class="elementor-element elementor-element-{rng.getrandbits(32):x} e-con-full" '
+            f'data-id="{rng.getrandbits(28):x}" data-settings=\'{{"background_background":"classic",'
+            f'"_ts":{rng.randint(1600000000, 1700000000)}}}\' style="--width:{rng.randint(10, 100)}%">'
+            f'<p class="elementor-heading-title">{words} {price} cod. {rng.randint(100000, 999999999)}</p>'
+            f'<a href="/prodotto-{i}?ref={rng.randint(1, 10**9)}">vedi</a></div>\n'
+        )
+        if i % 400 == 0:
+            block += f'<script type="application/json">{{"items":[{",".join(str(rng.randint(0, 10**12)) for _ in range(60))}]}}</script>\n'
+        blocks.append(block)
+        texts.append(f"{words} {price}")
+        links.append(f"https://www.sito-esempio.it/prodotto-{i}")
+        size += len(block)
+
+    if not contacts:
+        return ''.join(blocks), ' '.join(texts), ' '.join(links)
+
+    # Contatti in fondo alla pagina, come nei footer reali (prima quelli da scartare)
+    footer = ('<footer>noreply@wordpress.org <a href="mailto:info@studio-rossi.it">Scrivici</a> '
+              'fax 0211111111 <a href="tel:+390212345678">Chiamaci</a> Tel. 02 8765 4321 '
+              'P.IVA 01234567890</footer>')
+    blocks.append(footer)
+    texts.append("noreply@wordpress.org Scrivici fax 0211111111 Chiamaci Tel. 02 8765 4321 P.IVA 01234567890")
+    links.extend(["mailto:info@studio-rossi.it", "tel:+390212345678"])
+    return ''.join(blocks), ' '.join(texts), ' '.join(links)
+
+
+def load_corpus(path: Optional[str]) -> List[Tuple[str, str, str, str]]:
+    corpus = []
+    if path:
+        from fetcher import html_to_text, html_links
+        for file in sorted(glob.glob(os.path.join(path, "*.html"))):
+            with open(file, encoding="utf-8", errors="replace") as f:
+                html = f.read()
+            corpus.append((os.path.basename(file), html, html_to_text(html), html_links(html, "https://example.org/")))
+        return corpus
+
+    rng = random.Random(42)
+    for kb in (80, 400, 1500, 4000):
+        html, text, links = synthetic_page(rng, kb * 1024)
+        corpus.append((f"synthetic-{kb}KB", html, text, links))
+    # Caso peggiore: nessun contatto, tutte le sorgenti vanno scansionate per intero
+    for kb in (400, 4000):
+        html, text, links = synthetic_page(rng, kb * 1024, contacts=False)
+        corpus.append((f"no-contacts-{kb}KB", html, text, links))
+    return corpus
+
+
+def timeit(fn, args, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    corpus = load_corpus(path)
+
+    print(f"{'pagina':<24}{'MB':>7}{'prima ms':>11}{'dopo ms':>10}{'speedup':>9}  esito")
+    total_old = total_new = 0.0
+    same = 0
+    for name, html, text, links in corpus:
+        mb = (len(html) + len(text) + len(links)) / 1024 / 1024
+        old = timeit(legacy_extract, (html, text, links), repeat)
+        new = timeit(extract_contacts, (html, text, links), repeat)
+        old_res = legacy_extract(html, text, links)
+        new_res = extract_contacts(html, text, links)
+        same += old_res == new_res
+        total_old += old
+        total_new += new
+        verdict = "uguale" if old_res == new_res else f"diverso {old_res} -> {new_res}"
+        print(f"{name[:23]:<24}{mb:>7.2f}{old * 1000:>11.1f}{new * 1000:>10.1f}{old / new:>8.1f}x  {verdict}")
+
+    print(f"\nTotale: {total_old * 1000:.1f} ms -> {total_new * 1000:.1f} ms "
+          f"({total_old / total_new:.1f}x) | risultati identici {same}/{len(corpus)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import json
+import random
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+from extraction import validate_phone
+
+# Pagine sintetiche che imitano la struttura della Ads Library (div annidati con classi x1…,
+# "ID libreria: N", CTA verso l.facebook.com/l.php?u=… o fb.me/…) e landing di prova.
+
+
+def ad_card(rng: random.Random, ad_id: int, landing: str, depth: int = 14,
+            shortlink: Optional[str] = None, detail_link: bool = False, split_id: bool = False) -> str:
+    open_divs = ''.join(f'<div class="x1{rng.getrandbits(24):x} x{rng.getrandbits(20):x}">' for _ in range(depth))
+    close_divs = '</div>' * depth
+    if split_id:
+        id_html = f'<span>ID libreria:</span> <span>{ad_id}</span>'
+    else:
+        id_html = f'<span>ID libreria: {ad_id}</span>'
+    detail = f'<a href="/ads/library/?id={ad_id}">Vedi i dettagli dell\'inserzione</a>' if detail_link else ''
+    href = shortlink or f"https://l.facebook.com/l.php?u={quote(landing, safe='')}&h=AT{rng.getrandbits(40):x}"
+    copy = ' '.join(rng.choice(("Scopri", "offerta", "corso", "gratis", "consulenza", "oggi", "subito"))
+                    for _ in range(rng.randint(10, 40)))
+    return (
+        f'<div role="article">{open_divs}'
+        f'<div class="x1head">{id_html}<span>In esecuzione dal 1 gen 2024</span>{detail}</div>'
+        f'<div class="x1body"><div class="x1copy">{copy}</div>'
+        f'<div class="x1cta"><div class="x1wrap"><a href="{href}" target="_blank">Scopri di più</a></div></div>'
+        f'</div>{close_divs}</div>\n'
+    )
+
+
+def ads_library_html(n_ads: int, seed: int = 7, landing_base: str = "https://www.landing-{n}.it/",
+                     shortlink_every: int = 0, shortlink_base: str = "https://fb.me/") -> Tuple[str, List[Tuple[int, str]]]:
+    rng = random.Random(seed)
+    cards = []
+    expected = []
+    for n in range(n_ads):
+        ad_id = 10**15 + rng.getrandbits(40)
+        landing = landing_base.format(n=n)
+        shortlink = f"{shortlink_base}s{n:05d}" if shortlink_every and n % shortlink_every == 0 else None
+        cards.append(ad_card(rng, ad_id, landing, depth=rng.randint(8, 18), shortlink=shortlink,
+                             detail_link=n % 3 == 0, split_id=n % 4 == 1))
+        expected.append((ad_id, shortlink or landing))
+    html = (
+        '<!DOCTYPE html><html><head><title>Libreria inserzioni</title></head><body>'
+        '<div role="main"><div class="x1results">' + ''.join(cards) + '</div></div></body></html>'
+    )
+    return html, expected
+
+
+# Script della pagina risultati: allo scroll in fondo carica il blocco successivo, come la Ads Library
+INFINITE_SCROLL_JS = """
+<script>
+(() => {
+    let page = 1, loading = false, done = false;
+    const results = document.querySelector('.x1results');
+    window.addEventListener('scroll', async () => {
+        if (loading || done) return;
+        if (window.innerHeight + window.scrollY < document.body.scrollHeight - 400) return;
+        loading = true;
+        try {
+            const r = await fetch(`${MORE_URL}&page=${page}`);
+            const html = await r.text();
+            if (html.trim()) { results.insertAdjacentHTML('beforeend', html); page++; } else { done = true; }
+        } finally {
+            loading = false;
+        }
+    });
+})();
+</script>
+"""
+
+
+def ads_library_page(cards_html: str, more_url: str) -> str:
+    return (
+        '<!DOCTYPE html><html><head><title>Libreria inserzioni</title></head><body>'
+        f'<div role="main"><div class="x1results">{cards_html}</div></div>'
+        f'<script>const MORE_URL = {more_url!r};</script>{INFINITE_SCROLL_JS}</body></html>'
+    )
+
+
+# Variante GraphQL: la prima pagina è già nel documento (renderizzata dal server, nessuna
+# risposta XHR), i blocchi successivi arrivano via fetch POST con prefisso "for (;;);" e
+# annunci strutturati come la Ads Library (edges -> node -> collated_results). Il campo
+# "markup" (solo stand-in) porta le card da inserire, così il fallback DOM resta verificabile.
+GRAPHQL_SCROLL_JS = """
+<script>
+(() => {
+    let page = 1, loading = false, done = !HAS_NEXT;
+    const results = document.querySelector('.x1results');
+    const load = async () => {
+        if (loading || done) return;
+        loading = true;
+        try {
+            const r = await fetch(API_URL, { method: 'POST', body: new URLSearchParams({ q: QUERY, page }) });
+            const data = JSON.parse((await r.text()).replace(/^for \\(;;\\);/, ''));
+            if (data.markup) results.insertAdjacentHTML('beforeend', data.markup);
+            page++;
+            done = !data.data.ad_library_main.search_results_connection.page_info.has_next_page;
+        } finally {
+            loading = false;
+        }
+    };
+    window.addEventListener('scroll', () => {
+        if (window.innerHeight + window.scrollY >= document.body.scrollHeight - 400) load();
+    });
+})();
+</script>
+"""
+
+
+def ads_library_graphql_page(api_url: str, query: str, cards_html: str, has_next: bool) -> str:
+    return (
+        '<!DOCTYPE html><html><head><title>Libreria inserzioni</title></head><body>'
+        f'<div role="main"><div class="x1results">{cards_html}</div></div>'
+        f'<script>const API_URL = {json.dumps(api_url)}; const QUERY = {json.dumps(query)}; '
+        f'const HAS_NEXT = {json.dumps(has_next)};</script>'
+        f'{GRAPHQL_SCROLL_JS}</body></html>'
+    )
+
+
+def ads_graphql_response(ads: List[Tuple[int, str, str]], cards_html: str, has_next: bool) -> str:
+    # ads: (ad_id, link_url, page_name)
+    edges = [{"node": {"collated_results": [{
+        "ad_archive_id": str(ad_id),
+        "page_name": page_name,
+        "snapshot": {"page_name": page_name, "link_url": link, "cards": []},
+    }]}} for ad_id, link, page_name in ads]
+    payload = {"data": {"ad_library_main": {"search_results_connection": {
+        "edges": edges, "page_info": {"has_next_page": has_next}}}}, "markup": cards_html}
+    return "for (;;);" + json.dumps(payload)
+
+
+# Tipi di landing, scelti da n: coprono tier HTTP, tier browser e crawl delle pagine contatti
+LANDING_KINDS = ("spa", "subpage", "email_only", "static", "static")
+
+
+def landing_kind(n: int) -> str:
+    return LANDING_KINDS[n % len(LANDING_KINDS)]
+
+
+def landing_contacts(n: int) -> Tuple[str, str]:
+    # Numeri casuali ma validi per validate_phone (niente sequenze o ripetizioni)
+    rng = random.Random(n)
+    while True:
+        phone = f"+39 3{rng.randint(20, 99)} {rng.randint(1000000, 9999999)}"
+        if validate_phone(phone):
+            return f"info{n}@azienda-{n}.it", phone
+
+
+def landing_html(n: int, seed: int = 7, subpage: bool = False) -> str:
+    # Pagina "page builder" di dimensioni realistiche con contatti nel footer (o altrove, a seconda del tipo)
+    rng = random.Random(seed * 100003 + n)
+    kind = landing_kind(n)
+    email, phone = landing_contacts(n)
+    words = ("Scopri", "la", "nostra", "offerta", "corso", "consulenza", "gratis", "servizio", "clienti",
+             "qualità", "oggi", "risultati", "professionisti", "azienda", "prova", "webinar")
+    sections = ''.join(
+        f'<section class="elementor-section"><div class="elementor-container"><h2>Sezione {i}</h2>'
+        f'<p>{" ".join(rng.choice(words) for _ in range(rng.randint(40, 120)))}</p></div></section>'
+        for i in range(rng.randint(6, 14))
+    )
+    nav = (f'<nav><a href="/landing/{n}">Home</a> <a href="/landing/{n}/chi-siamo">Chi siamo</a> '
+           f'<a href="/landing/{n}/contatti">Contatti</a></nav>')
+
+    if subpage:
+        footer = f'<p>Telefono: <a href="tel:{phone}">{phone}</a> - Email: <a href="mailto:{email}">{email}</a></p>'
+    elif kind == "subpage":
+        footer = '<p>Tutti i contatti nella pagina dedicata.</p>'
+    elif kind == "email_only":
+        footer = f'<p>Scrivici: <a href="mailto:{email}">{email}</a></p>'
+    else:
+        footer = f'<p>Tel. <a href="tel:{phone}">{phone}</a> | <a href="mailto:{email}">{email}</a></p>'
+
+    if kind == "spa" and not subpage:
+        # Contenuto generato via JS: il tier HTTP vede solo il contenitore vuoto
+        payload = (nav + sections + f'<footer>{footer}</footer>').replace('`', '').replace('${', '')
+        return ('<!DOCTYPE html><html><head><title>App</title></head><body><div id="root"></div>'
+                f'<script>setTimeout(() => {{ document.getElementById("root").innerHTML = `{payload}`; }}, 150);'
+                '</script></body></html>')
+    return (f'<!DOCTYPE html><html><head><title>Azienda {n}</title></head><body>{nav}{sections}'
+            f'<footer>{footer}</footer></body></html>')
@@ -0,0 +1,215 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from standin import StandinConfig, StandinServer  # noqa: E402
+
+# Benchmark end-to-end offline: Ads Library, shortlink e landing serviti da bench/standin.py,
+# pipeline reale (browser, tier HTTP, scheduler). Misura query/min, lead/min, p50/p95 per
+# fase e picco di memoria; le baseline si salvano in bench/baselines/<nome>.json.
+# Uso:  python bench/pipeline_bench.py [--queries 4] [--ads 60] [--batch]
+#       python bench/pipeline_bench.py --save-baseline main
+#       python bench/pipeline_bench.py --compare main [--tolerance 0.15]
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+QUERIES = ["consulenza fiscale", "corso inglese", "dentista milano", "palestra roma", "avvocato divorzi",
+           "webinar marketing", "agenzia immobiliare", "fotografo matrimonio", "commercialista online",
+           "scuola di danza"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+class MemorySampler:
+    # Picco di RSS (Python + Chromium) campionato in background
+    def __init__(self, probe, interval: float = 0.25):
+        self.probe = probe
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.probe())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "MemorySampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.probe())
+
+
+async def run_bench(aut, queries: List[str], batch: bool) -> Dict:
+    samples: Dict[str, List[float]] = {}
+
+    def add(stage: str, seconds: float) -> None:
+        samples.setdefault(stage, []).append(seconds)
+
+    def on_event(event: str, data: Dict) -> None:
+        if event == "discovery":
+            add("scroll", data["seconds"])
+        elif event == "shortlinks":
+            add("shortlinks", data["seconds"])
+
+    leads: List[Dict] = []
+    if batch:
+        started = time.monotonic()
+        leads = await aut.get_real_leads_batch(queries, on_event=on_event)
+        add("query", (time.monotonic() - started) / len(queries))
+    else:
+        for query in queries:
+            started = time.monotonic()
+            leads += await aut.get_real_leads(query, on_event=on_event)
+            add("query", time.monotonic() - started)
+
+    for lead in leads:
+        for stage, ms in lead.get("timings", {}).items():
+            add(f"landing.{stage}", ms / 1000)
+    return {"leads": leads, "samples": samples}
+
+
+def summarize(result: Dict, truth: Dict[str, Dict], queries: List[str], seconds: float, peak_mb: float,
+              server: StandinServer) -> Dict:
+    leads = result["leads"]
+    found = {lead["landing_page"]: lead for lead in leads}
+    emails = sum(1 for url, t in truth.items() if found.get(url, {}).get("email") == t["email"])
+    phones = sum(1 for url, t in truth.items()
+                 if (found.get(url, {}).get("telefono") or "").replace(" ", "") == t["phone"].replace(" ", ""))
+    tiers: Dict[str, int] = {}
+    for lead in leads:
+        tiers[lead.get("tier", "?")] = tiers.get(lead.get("tier", "?"), 0) + 1
+    return {
+        "queries": len(queries),
+        "leads": len(leads),
+        "seconds": round(seconds, 2),
+        "queries_per_min": round(len(queries) / seconds * 60, 2),
+        "leads_per_min": round(len(leads) / seconds * 60, 2),
+        "peak_rss_mb": round(peak_mb, 1),
+        "landing_recall": round(len(set(found) & set(truth)) / len(truth), 3) if truth else 0.0,
+        "email_recall": round(emails / len(truth), 3) if truth else 0.0,
+        "phone_recall": round(phones / len(truth), 3) if truth else 0.0,
+        "tiers": tiers,
+        "requests": dict(server.requests),
+        "stages": {
+            stage: {"count": len(values), "p50": round(percentile(values, 0.5), 3),
+                    "p95": round(percentile(values, 0.95), 3)}
+            for stage, values in sorted(result["samples"].items())
+        },
+    }
+
+
+def print_report(report: Dict) -> None:
+    print(f"\n{report['queries']} query | {report['leads']} lead | {report['seconds']}s")
+    print(f"query/min {report['queries_per_min']} | lead/min {report['leads_per_min']} | "
+          f"picco RSS {report['peak_rss_mb']} MB")
+    print(f"recall landing {report['landing_recall']:.0%} | email {report['email_recall']:.0%} | "
+          f"telefono {report['phone_recall']:.0%} | tier {report['tiers']}")
+    print(f"\n{'fase':<22}{'n':>6}{'p50 s':>10}{'p95 s':>10}")
+    for stage, st in report["stages"].items():
+        print(f"{stage:<22}{st['count']:>6}{st['p50']:>10.3f}{st['p95']:>10.3f}")
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    # Regressione = throughput o recall più bassi, p95 o memoria più alti oltre la tolleranza
+    problems = []
+    for key in ("queries_per_min", "leads_per_min", "landing_recall", "email_recall", "phone_recall"):
+        if report[key] < baseline.get(key, 0) * (1 - tolerance):
+            problems.append(f"{key}: {report[key]} < baseline {baseline[key]}")
+    if report["peak_rss_mb"] > baseline.get("peak_rss_mb", float("inf")) * (1 + tolerance):
+        problems.append(f"peak_rss_mb: {report['peak_rss_mb']} > baseline {baseline['peak_rss_mb']}")
+    for stage, st in report["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        # 50 ms di margine assoluto: le fasi brevi oscillano più della tolleranza relativa
+        if base and st["p95"] > base["p95"] * (1 + tolerance) + 0.05:
+            problems.append(f"{stage} p95: {st['p95']}s > baseline {base['p95']}s")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark offline della pipeline lead")
+    parser.add_argument("--queries", type=int, default=4)
+    parser.add_argument("--ads", type=int, default=60, help="annunci per query")
+    parser.add_argument("--batch", action="store_true", help="usa get_real_leads_batch")
+    parser.add_argument("--cache", action="store_true", help="lascia attiva la cache (run a caldo)")
+    parser.add_argument("--api", choices=("graphql", "html"), default="graphql",
+                        help="Ads Library finta: risultati JSON (discovery da rete) o solo HTML (DOM)")
+    parser.add_argument("--save-baseline", metavar="NOME")
+    parser.add_argument("--compare", metavar="NOME")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--json", action="store_true", help="stampa il report completo in JSON")
+    args = parser.parse_args()
+
+    server = StandinServer(StandinConfig(ads_per_query=args.ads, api=args.api)).start()
+
+    # La config di aut si legge all'import: l'ambiente va preparato prima
+    os.environ["ADS_LIBRARY_URL"] = server.ads_library_url
+    os.environ.setdefault("CACHE_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="leadbench-"), "cache.sqlite"))
+    if not args.cache:
+        os.environ["CACHE_ENABLED"] = "0"
+    import aut
+
+    queries = (QUERIES * (args.queries // len(QUERIES) + 1))[:args.queries]
+    truth = server.expected(queries)
+    try:
+        with MemorySampler(aut.memory_mb) as memory:
+            started = time.monotonic()
+            result = asyncio.run(run_bench(aut, queries, args.batch))
+            seconds = time.monotonic() - started
+    finally:
+        server.stop()
+
+    report = summarize(result, truth, queries, seconds, memory.peak, server)
+    report["config"] = {
+        "batch": args.batch, "ads_per_query": args.ads, "cache": args.cache,
+        "MAX_CONCURRENT_PAGES": aut.MAX_CONCURRENT_PAGES, "SCROLL_MODE": aut.SCROLL_MODE,
+        "READY_MODE": aut.READY_MODE, "HTTP_TIER_ENABLED": aut.HTTP_TIER_ENABLED,
+        "DISCOVERY_SOURCE": aut.DISCOVERY_SOURCE, "api": args.api,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save_baseline}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline salvata in {path}")
+
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json"), encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(report, baseline, args.tolerance)
+        if problems:
+            print(f"\n❌ Regressioni rispetto a '{args.compare}':")
+            for problem in problems:
+                print(f"   {problem}")
+            return 1
+        print(f"\n✅ Nessuna regressione rispetto a '{args.compare}' (tolleranza {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
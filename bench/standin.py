@@ -0,0 +1,211 @@
+import os
+import sys
+import time
+import random
+import zlib
+import threading
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import (ad_card, ads_graphql_response, ads_library_graphql_page, ads_library_page,  # noqa: E402
+                      landing_contacts, landing_html, landing_kind)
+
+# Server locale che sostituisce Ads Library, l.facebook.com/fb.me e siti degli inserzionisti:
+#   /ads/library/?q=...          prima pagina risultati (già nel documento) con scroll infinito
+#   /api/graphql/  (POST q, page) blocchi successivi in JSON, come la Ads Library (api="graphql")
+#   /ads/library/more?q=&page=N  blocchi in HTML, prima pagina già nel documento (api="html")
+#   /fb.me/<codice>              shortlink -> 302 verso la landing
+#   /landing/<n>[/contatti|/chi-siamo]
+# La pipeline ci arriva con ADS_LIBRARY_URL=http://127.0.0.1:<porta>/ads/library/
+# Uso standalone:  python bench/standin.py --port 8900
+
+
+class StandinConfig:
+    def __init__(self, ads_per_query: int = 60, page_size: int = 20, landing_pool: int = 400,
+                 shortlink_every: int = 4, scroll_latency_ms: int = 250, landing_latency_ms: int = 80,
+                 slow_every: int = 11, slow_latency_ms: int = 1500, seed: int = 7, api: str = "graphql"):
+        self.ads_per_query = ads_per_query
+        self.page_size = page_size
+        self.landing_pool = landing_pool        # query diverse condividono parte delle landing
+        self.shortlink_every = shortlink_every
+        self.scroll_latency_ms = scroll_latency_ms
+        self.landing_latency_ms = landing_latency_ms
+        self.slow_every = slow_every            # una landing ogni N risponde lenta (coda p95)
+        self.slow_latency_ms = slow_latency_ms
+        self.seed = seed
+        self.api = api                          # graphql | html
+
+
+class StandinServer:
+    def __init__(self, config: Optional[StandinConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or StandinConfig()
+        self.requests: Dict[str, int] = {"library": 0, "more": 0, "graphql": 0, "shortlink": 0, "landing": 0,
+                                         "subpage": 0}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def ads_library_url(self) -> str:
+        return f"{self.base_url}/ads/library/"
+
+    def start(self) -> "StandinServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    # ---------- dati ----------
+    def query_ads(self, query: str) -> List[Tuple[int, int, bool]]:
+        # (ad_id, landing n, via shortlink) deterministici per query
+        cfg = self.config
+        offset = zlib.crc32(query.encode()) % cfg.landing_pool
+        rng = random.Random(f"{cfg.seed}:{query}")
+        return [
+            (10**15 + rng.getrandbits(40), (offset + i) % cfg.landing_pool,
+             bool(cfg.shortlink_every) and i % cfg.shortlink_every == 0)
+            for i in range(cfg.ads_per_query)
+        ]
+
+    def expected(self, queries: List[str]) -> Dict[str, Dict]:
+        # Verità attesa per landing URL (telefono di "subpage"/"email_only" solo con il crawl contatti)
+        truth = {}
+        for query in queries:
+            for _, n, _ in self.query_ads(query):
+                email, phone = landing_contacts(n)
+                truth[self.landing_url(n)] = {"kind": landing_kind(n), "email": email, "phone": phone}
+        return truth
+
+    def landing_url(self, n: int) -> str:
+        return f"{self.base_url}/landing/{n}"
+
+    def _page_ads(self, query: str, page: int) -> List[Tuple[int, int, bool]]:
+        size = self.config.page_size
+        return self.query_ads(query)[page * size:(page + 1) * size]
+
+    def _link(self, n: int, short: bool) -> str:
+        return f"{self.base_url}/fb.me/{n}" if short else self.landing_url(n)
+
+    def _cards(self, query: str, page: int) -> str:
+        cfg = self.config
+        rng = random.Random(f"{cfg.seed}:{query}:{page}")
+        cards = []
+        for i, (ad_id, n, short) in enumerate(self._page_ads(query, page)):
+            shortlink = self._link(n, short) if short else None
+            cards.append(ad_card(rng, ad_id, self.landing_url(n), depth=rng.randint(8, 18), shortlink=shortlink,
+                                 detail_link=i % 3 == 0, split_id=i % 4 == 1))
+        return ''.join(cards)
+
+    def _graphql(self, query: str, page: int) -> str:
+        ads = [(ad_id, self._link(n, short), f"Azienda {n}") for ad_id, n, short in self._page_ads(query, page)]
+        has_next = (page + 1) * self.config.page_size < self.config.ads_per_query
+        return ads_graphql_response(ads, self._cards(query, page), has_next)
+
+    # ---------- HTTP ----------
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.requests[key] += 1
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: str = "", headers: Optional[Dict[str, str]] = None,
+                      content_type: str = "text/html; charset=utf-8") -> None:
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                cfg = server.config
+                parsed = urlparse(self.path)
+                params = parse_qs(parsed.query)
+                query = params.get("q", [""])[0]
+                parts = [p for p in parsed.path.split("/") if p]
+
+                if parsed.path.rstrip("/") == "/ads/library":
+                    server._count("library")
+                    if cfg.api == "graphql":
+                        has_next = cfg.page_size < cfg.ads_per_query
+                        return self._send(200, ads_library_graphql_page("/api/graphql/", query,
+                                                                        server._cards(query, 0), has_next))
+                    more_url = f"/ads/library/more?q={quote(query)}"
+                    return self._send(200, ads_library_page(server._cards(query, 0), more_url))
+
+                if parsed.path == "/ads/library/more":
+                    server._count("more")
+                    time.sleep(cfg.scroll_latency_ms / 1000)
+                    return self._send(200, server._cards(query, int(params.get("page", ["1"])[0])))
+
+                if len(parts) == 2 and parts[0] == "fb.me" and parts[1].isdigit():
+                    server._count("shortlink")
+                    return self._send(302, "", {"Location": server.landing_url(int(parts[1]))})
+
+                if len(parts) >= 2 and parts[0] == "landing" and parts[1].isdigit():
+                    n = int(parts[1])
+                    subpage = len(parts) > 2
+                    server._count("subpage" if subpage else "landing")
+                    slow = cfg.slow_every and n % cfg.slow_every == 0 and not subpage
+                    time.sleep((cfg.slow_latency_ms if slow else cfg.landing_latency_ms) / 1000)
+                    # Solo /contatti ha tutti i recapiti; /chi-siamo ripete la home
+                    return self._send(200, landing_html(n, cfg.seed, subpage=subpage and parts[2] == "contatti"))
+
+                self._send(404, "not found")
+
+            def do_POST(self):
+                cfg = server.config
+                if urlparse(self.path).path.rstrip("/") != "/api/graphql":
+                    return self._send(404, "not found")
+                length = int(self.headers.get("Content-Length") or 0)
+                params = parse_qs(self.rfile.read(length).decode("utf-8"))
+                server._count("graphql")
+                page = int(params.get("page", ["0"])[0])
+                if page:
+                    time.sleep(cfg.scroll_latency_ms / 1000)
+                body = server._graphql(params.get("q", [""])[0], page)
+                self._send(200, body, content_type="application/json; charset=utf-8")
+
+        return Handler
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Ads Library + landing finte per i benchmark")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--ads", type=int, default=60, help="annunci per query")
+    parser.add_argument("--api", choices=("graphql", "html"), default="graphql",
+                        help="risultati via JSON (come la Ads Library) o blocchi HTML")
+    args = parser.parse_args()
+    server = StandinServer(StandinConfig(ads_per_query=args.ads, api=args.api), port=args.port).start()
+    print(f"Stand-in su {server.base_url}  ->  ADS_LIBRARY_URL={server.ads_library_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
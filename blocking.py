@@ -0,0 +1,178 @@
+import os
+import re
+import logging
+import weakref
+from dataclasses import dataclass, asdict
+from typing import Dict, FrozenSet, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+from metrics import registry
+
+logger = logging.getLogger("render-playwright-scraper")
+
+
+# ---------------- CONFIG ----------------
+def _env_list(name: str, default: str = "") -> List[str]:
+    return [x.strip().lower() for x in re.split(r"[,\s]+", os.getenv(name, default)) if x.strip()]
+
+
+# cdp = blocco dentro Chromium (Network.setBlockedURLs), Python non vede le richieste
+# route = handler Python su ogni richiesta (altri browser o CDP non disponibile)
+BLOCK_MODE = os.getenv("BLOCK_MODE", "cdp")
+BLOCK_RESOURCE_TYPES = frozenset(_env_list("BLOCK_RESOURCE_TYPES", "image,media,font,stylesheet"))
+
+# Tracker, pixel e tag manager: non portano contatti e rallentano le landing
+DEFAULT_BLOCK_DOMAINS = (
+    "google-analytics.com", "googletagmanager.com", "googleadservices.com", "googlesyndication.com",
+    "doubleclick.net", "adservice.google.com", "connect.facebook.net", "analytics.tiktok.com",
+    "snap.licdn.com", "px.ads.linkedin.com", "bat.bing.com", "clarity.ms", "hotjar.com", "hotjar.io",
+    "criteo.com", "criteo.net", "taboola.com", "outbrain.com", "hs-analytics.net", "hs-banner.com",
+    "segment.com", "segment.io", "mixpanel.com", "fullstory.com", "mouseflow.com", "quantserve.com",
+    "scorecardresearch.com", "adnxs.com", "amazon-adsystem.com", "pinimg.com", "ct.pinterest.com",
+    "iubenda.com", "cookiebot.com", "onetrust.com", "cookielaw.org", "youtube.com", "ytimg.com",
+    "vimeocdn.com", "fonts.googleapis.com", "fonts.gstatic.com", "use.typekit.net",
+)
+# Widget che mostrano recapiti (chat, WhatsApp, form, prenotazioni): mai bloccati per dominio
+DEFAULT_ALLOW_DOMAINS = (
+    "wa.me", "api.whatsapp.com", "embed.tawk.to", "tawk.to", "widget.intercom.io", "js.intercomcdn.com",
+    "client.crisp.chat", "static.zdassets.com", "cdn.livechatinc.com", "code.tidio.co", "widget.tidio.co",
+    "assets.calendly.com", "js.hsforms.net", "forms.hubspot.com", "js.hs-scripts.com", "embed.typeform.com",
+)
+BLOCK_DOMAINS = frozenset(DEFAULT_BLOCK_DOMAINS) | frozenset(_env_list("BLOCK_DOMAINS"))
+BLOCK_ALLOW_DOMAINS = frozenset(DEFAULT_ALLOW_DOMAINS) | frozenset(_env_list("BLOCK_ALLOW_DOMAINS"))
+
+# Estensioni con cui i tipi di risorsa si riconoscono dall'URL (il blocco nel browser vede solo quello)
+RESOURCE_EXTENSIONS: Dict[str, tuple] = {
+    "image": ("png", "jpg", "jpeg", "gif", "webp", "avif", "ico", "bmp", "svg"),
+    "media": ("mp4", "webm", "mov", "mp3", "m4a", "ogg", "wav", "m3u8"),
+    "font": ("woff", "woff2", "ttf", "otf", "eot"),
+    "stylesheet": ("css",),
+}
+
+# Le richieste bloccate non arrivano mai: il peso è una media per tipo di risorsa, quindi
+# leadgen_blocked_bytes_estimated_total e bytes_estimated delle lead sono stime, non byte misurati
+BLOCKED_BYTES_ESTIMATE = {"image": 60_000, "media": 500_000, "font": 40_000, "stylesheet": 30_000,
+                          "script": 40_000}
+BLOCKED_BYTES_DEFAULT = 5_000
+
+BLOCKED_REQUESTS = registry.counter("leadgen_blocked_requests_total", "Richieste bloccate per tipo di risorsa")
+BLOCKED_BYTES_ESTIMATED = registry.counter("leadgen_blocked_bytes_estimated_total",
+                                           "Stima dei byte non scaricati (BLOCKED_BYTES_ESTIMATE per tipo)")
+PAGE_BLOCKED = registry.histogram("leadgen_page_blocked_requests", "Richieste bloccate per pagina",
+                                  buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500))
+
+
+# ---------------- POLICY ----------------
+def _suffix_match(host: str, domains: FrozenSet[str]) -> Optional[str]:
+    # Un lookup nel set per ogni suffisso dell'host: costo proporzionale alle etichette, non alla lista
+    labels = host.split(".")
+    for i in range(len(labels) - 1):
+        suffix = ".".join(labels[i:])
+        if suffix in domains:
+            return suffix
+    return None
+
+
+class BlockPolicy:
+    # Policy compilata una volta all'import: set di suffissi di dominio + allow-list + tipi di risorsa.
+    # browser_patterns() la traduce nei glob di Network.setBlockedURLs; i domini bloccati che hanno
+    # un sottodominio in allow-list non sono esprimibili lì e restano a un route Python ristretto,
+    # che copre anche popup e iframe out-of-process (dove setBlockedURLs della pagina non arriva).
+    def __init__(self, block_domains: Iterable[str], allow_domains: Iterable[str],
+                 resource_types: Iterable[str]):
+        self.allow = frozenset(allow_domains)
+        self.resource_types = frozenset(resource_types)
+        # Un dominio in allow-list così com'è annulla il blocco
+        self.block = frozenset(d for d in block_domains if d not in self.allow)
+        self.split = frozenset(d for d in self.block if any(a.endswith("." + d) for a in self.allow))
+
+    def host_blocked(self, host: str) -> bool:
+        host = host.lower()
+        return _suffix_match(host, self.block) is not None and _suffix_match(host, self.allow) is None
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        if resource_type in self.resource_types:
+            return True
+        try:
+            host = urlsplit(url).hostname or ""
+        except ValueError:
+            return False
+        return self.host_blocked(host)
+
+    def browser_patterns(self) -> List[str]:
+        patterns = []
+        for domain in sorted(self.block - self.split):
+            patterns += [f"*://{domain}/*", f"*://*.{domain}/*"]
+        for rtype in sorted(self.resource_types):
+            for ext in RESOURCE_EXTENSIONS.get(rtype, ()):
+                patterns += [f"*.{ext}", f"*.{ext}?*"]
+        return patterns
+
+    def route_pattern(self) -> Optional[re.Pattern]:
+        # Route di contorno in modalità cdp: a Python arrivano solo gli URL che la policy può bloccare
+        # dall'URL (domini e estensioni). Per le pagine con setBlockedURLs Chromium li ferma prima,
+        # quindi restano i domini "split" e le richieste di popup e iframe out-of-process.
+        parts = []
+        if self.block:
+            domains = "|".join(re.escape(d) for d in sorted(self.block))
+            parts.append(rf"^[a-z]+://([^/?#@]*\.)?({domains})(:\d+)?([/?#]|$)")
+        extensions = [ext for rtype in sorted(self.resource_types) for ext in RESOURCE_EXTENSIONS.get(rtype, ())]
+        if extensions:
+            parts.append(rf"^[^?#]*\.({'|'.join(extensions)})([?#]|$)")
+        if not parts:
+            return None
+        return re.compile("|".join(f"(?:{part})" for part in parts), re.IGNORECASE)
+
+    def stats(self) -> Dict:
+        return {"mode": BLOCK_MODE, "domains": len(self.block), "allow": len(self.allow),
+                "resource_types": sorted(self.resource_types), "split_domains": sorted(self.split)}
+
+
+policy = BlockPolicy(BLOCK_DOMAINS, BLOCK_ALLOW_DOMAINS, BLOCK_RESOURCE_TYPES)
+
+
+# ---------------- CONTATORI PER PAGINA ----------------
+@dataclass
+class PageBlockStats:
+    requests: int = 0
+    bytes_estimated: int = 0      # vedi BLOCKED_BYTES_ESTIMATE
+
+
+_page_stats: "weakref.WeakKeyDictionary[object, PageBlockStats]" = weakref.WeakKeyDictionary()
+# Pagine con i contatori già chiusi (rilasciate al pool o chiuse): i loadingFailed tardivi del
+# documento precedente non finiscono sul prossimo uso e una seconda chiusura non osserva nulla
+_closed_pages: "weakref.WeakSet[object]" = weakref.WeakSet()
+
+
+def record_blocked(page: Optional[object], resource_type: str) -> None:
+    resource_type = (resource_type or "other").lower()
+    size = BLOCKED_BYTES_ESTIMATE.get(resource_type, BLOCKED_BYTES_DEFAULT)
+    BLOCKED_REQUESTS.inc(type=resource_type)
+    BLOCKED_BYTES_ESTIMATED.inc(size, type=resource_type)
+    if page is None or page in _closed_pages:
+        return
+    stats = _page_stats.get(page)
+    if stats is None:
+        stats = _page_stats[page] = PageBlockStats()
+    stats.requests += 1
+    stats.bytes_estimated += size
+
+
+def page_block_stats(page: object) -> Dict:
+    stats = _page_stats.get(page)
+    return asdict(stats) if stats is not None else asdict(PageBlockStats())
+
+
+def open_page_stats(page: object) -> None:
+    # Pagina riusata dal pool: contatori da zero per il nuovo uso
+    _closed_pages.discard(page)
+    _page_stats.pop(page, None)
+
+
+def close_page_stats(page: object) -> None:
+    # Una osservazione per uso della pagina, anche se la chiusura arriva da più parti
+    if page in _closed_pages:
+        return
+    _closed_pages.add(page)
+    stats = _page_stats.pop(page, None)
+    PAGE_BLOCKED.observe(stats.requests if stats else 0)
@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+# ---------------- CONFIG ----------------
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "data/cache.sqlite")
+CACHE_MEMORY_ITEMS = int(os.getenv("CACHE_MEMORY_ITEMS", "2000"))
+CACHE_TTL_SUCCESS = int(os.getenv("CACHE_TTL_SUCCESS_S", str(7 * 24 * 3600)))
+CACHE_TTL_ERROR = int(os.getenv("CACHE_TTL_ERROR_S", "3600"))
+# Il livello SQLite scarta le voci scadute solo in lettura: ogni N scritture (e all'apertura)
+# si cancellano, e oltre CACHE_MAX_ROWS si tolgono quelle che scadono prima (0 = nessun tetto)
+CACHE_PURGE_EVERY = int(os.getenv("CACHE_PURGE_EVERY", "500"))
+CACHE_MAX_ROWS = int(os.getenv("CACHE_MAX_ROWS", "200000"))
+
+
+# ---------------- CACHE ----------------
+class PersistentCache:
+    # Due livelli: LRU in memoria davanti a una tabella SQLite, entrambi con scadenza per voce
+    def __init__(self, table: str, path: str = CACHE_DB_PATH, memory_items: int = CACHE_MEMORY_ITEMS,
+                 purge_every: int = CACHE_PURGE_EVERY, max_rows: int = CACHE_MAX_ROWS):
+        self.table = table
+        self.path = path
+        self.memory_items = memory_items
+        self.purge_every = purge_every
+        self.max_rows = max_rows
+        self._memory: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.writes = 0
+        self.purged = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_expires ON {self.table}(expires_at)")
+            self._purge(self._db)
+        return self._db
+
+    def _remember(self, key: str, expires_at: float, value: Dict) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.hits_memory += 1
+                    return entry[1]
+                del self._memory[key]
+
+            row = self._conn().execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                self.misses += 1
+                return None
+            value = json.loads(row[0])
+            self._remember(key, row[1], value)
+            self.hits_disk += 1
+            return value
+
+    def put(self, key: str, value: Dict, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+            db = self._conn()
+            db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            db.commit()
+            self.writes += 1
+            if self.purge_every and self.writes % self.purge_every == 0:
+                self._purge(db)
+
+    def _purge(self, db: sqlite3.Connection) -> int:
+        deleted = db.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),)).rowcount
+        if self.max_rows:
+            excess = db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.max_rows
+            if excess > 0:
+                deleted += db.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY expires_at LIMIT ?)", (excess,)
+                ).rowcount
+        db.commit()
+        self.purged += deleted
+        return deleted
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._purge(self._conn())
+
+    def stats(self) -> Dict:
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "writes": self.writes,
+            "hit_rate": round((self.hits_memory + self.hits_disk) / lookups, 3) if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "purged": self.purged,
+        }
+
+
+# Risultati delle landing (email/telefono/copy) per URL normalizzato
+landing_cache = PersistentCache("landing_results")
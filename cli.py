@@ -0,0 +1,85 @@
+import sys
+import csv
+import json
+import asyncio
+import argparse
+from typing import Dict, List
+
+from aut import COUNTRY, get_real_leads_batch, batch_targets
+from leadstore import CSV_FIELDS, csv_row
+
+# Batch da riga di comando: un solo browser per tutte le query, landing condivise analizzate una volta.
+# Uso:  python cli.py "consulenza fiscale" "corso inglese" -c IT -c ES -o leads.csv
+#       python cli.py -f keywords.txt --format jsonl
+
+
+def read_queries(args: argparse.Namespace) -> List[str]:
+    queries = list(args.queries)
+    if args.file:
+        with (sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")) as f:
+            queries += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return queries
+
+
+def write_leads(leads: List[Dict], out, fmt: str) -> None:
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for lead in leads:
+            writer.writerow(csv_row(lead))
+    else:
+        for lead in leads:
+            out.write(json.dumps(lead, ensure_ascii=False) + "\n")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Lead dalla Meta Ads Library per più query")
+    parser.add_argument("queries", nargs="*", help="query di ricerca")
+    parser.add_argument("-f", "--file", help="file con una query per riga ('-' = stdin)")
+    parser.add_argument("-c", "--country", action="append", dest="countries",
+                        help=f"paese Ads Library, ripetibile (default {COUNTRY})")
+    parser.add_argument("-o", "--output", help="file di output (default stdout)")
+    parser.add_argument("--format", choices=("csv", "jsonl"),
+                        help="formato di output (default dall'estensione, altrimenti jsonl)")
+    parser.add_argument("--no-cache", action="store_true", help="ignora la cache delle landing")
+    parser.add_argument("--incremental", action="store_true",
+                        help="solo annunci e landing non visti nelle run precedenti delle stesse ricerche")
+    parser.add_argument("--deadline", type=float, metavar="SECONDI",
+                        help="scadenza dell'intera run, 0 = nessuna (default RUN_DEADLINE_S)")
+    args = parser.parse_args()
+
+    queries = read_queries(args)
+    targets = batch_targets(queries, args.countries)
+    if not targets:
+        parser.error("nessuna query")
+
+    fmt = args.format or ("csv" if (args.output or "").endswith(".csv") else "jsonl")
+    unchanged = 0
+    partial = False
+
+    def on_event(event: str, data: Dict) -> None:
+        nonlocal unchanged, partial
+        if event == "incremental":
+            unchanged += data["unchanged"]
+        elif event == "summary":
+            partial = data["partial"]
+
+    leads = asyncio.run(get_real_leads_batch(queries, args.countries, on_event=on_event,
+                                             use_cache=not args.no_cache, incremental=args.incremental,
+                                             deadline_s=args.deadline))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as out:
+            write_leads(leads, out, fmt)
+    else:
+        write_leads(leads, sys.stdout, fmt)
+
+    ok = sum(1 for l in leads if l["status"] == "success")
+    print(f"{len(targets)} ricerche | {len(leads)} landing | {ok} con contatti"
+          + (f" | {unchanged} invariate" if args.incremental else "")
+          + (" | parziale (scadenza o discovery fallita)" if partial else ""), file=sys.stderr)
+    return 0 if leads or args.incremental else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import re
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+
+# ---------------- REGEX PRECOMPILATI ----------------
+EMAIL_RE = re.compile(r'\b[a-zA-Z0-9][a-zA-Z0-9._%+-]{0,63}@[a-zA-Z0-9][a-zA-Z0-9.-]{0,253}\.[a-zA-Z]{2,}\b')
+MAILTO_RE = re.compile(r'mailto:([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})', re.IGNORECASE)
+TEL_RE = re.compile(r'tel:([+\d\s\-\(\)]+)', re.IGNORECASE)
+
+PHONE_PATTERNS = [
+    re.compile(r'\+39[\s\-]?\d{2,3}[\s\-]?\d{6,7}'),
+    re.compile(r'0\d{1,3}[\s\-]?\d{6,8}'),
+    re.compile(r'\+\d{1,3}[\s\-]?\(?\d{2,4}\)?[\s\-]?\d{6,10}'),
+    re.compile(r'\(\+39\)[\s\-]?\d{9,10}'),
+]
+
+INVALID_EMAIL_SNIPPETS = [
+    'example.com', 'test.com', 'dummy', 'placeholder',
+    'noreply', 'no-reply', 'youremail', 'your-email',
+    'email@', '@email', 'info@info', 'admin@admin',
+    'sample', 'fake', 'tempmail'
+]
+
+# Regole di validazione compilate una volta sola (prima erano re.* inline ad ogni chiamata)
+_EMAIL_PUNCT_RUN_RE = re.compile(r'[._%+-]{3,}')
+_INVALID_EMAIL_RE = re.compile('|'.join(re.escape(s) for s in INVALID_EMAIL_SNIPPETS))
+_PHONE_STRIP_RE = re.compile(r'[\s\-\(\)\.]')
+_PHONE_SHAPE_RE = re.compile(r'\+?\d{9,15}')
+_PHONE_SAME_DIGIT_RE = re.compile(r'(\d)\1+')
+_PHONE_REPEAT_RE = re.compile(r'(\d{3,})\1')
+_PHONE_SEQUENCES = {'123456789', '987654321', '1234567890'}
+
+# Python `re` è veloce solo quando il pattern inizia con un letterale (ricerca tipo memchr):
+# un'unica alternation che unisce tutti i pattern perde questa ottimizzazione ed è ~2x più
+# lenta delle passate separate. Per questo lo scan è "ancorato": le email partono dalla
+# '@' (str.find) ed EMAIL_RE gira solo su una finestra attorno; i telefoni usano i
+# PHONE_PATTERNS che iniziano già con un letterale ('+39', '0', '+', '(+39)').
+EMAIL_LOCAL_MAX = 64
+EMAIL_DOMAIN_MAX = 320
+MAILTO_PREFIX = "mailto:"
+TEL_RANK = len(PHONE_PATTERNS)      # tel: vale come fallback, come in passato
+SOURCES = ("html", "text", "links")
+
+
+# ---------------- CANDIDATI ----------------
+@dataclass
+class Candidate:
+    kind: str       # email | phone
+    value: str
+    source: str     # mailto | tel | html | text | links
+    rank: int       # priorità del pattern telefono (0 = migliore), 0 per le email
+    position: int
+
+
+def scan_emails(content: str, source: str) -> Iterator[Candidate]:
+    last_end = 0
+    at = content.find('@')
+    while at != -1:
+        if at >= last_end:
+            pos = max(last_end, at - EMAIL_LOCAL_MAX)
+            while True:
+                m = EMAIL_RE.search(content, pos, at + EMAIL_DOMAIN_MAX)
+                if m is None or m.start() > at:
+                    break
+                if m.end() > at:
+                    start = m.start()
+                    is_mailto = content[max(0, start - 7):start].lower() == MAILTO_PREFIX
+                    yield Candidate("email", m.group(), "mailto" if is_mailto else source, 0, start)
+                    last_end = m.end()
+                    break
+                pos = m.end()
+        at = content.find('@', at + 1)
+
+
+def scan_phones(content: str, source: str, rank: int) -> Iterator[Candidate]:
+    if rank == TEL_RANK:
+        for m in TEL_RE.finditer(content):
+            yield Candidate("phone", m.group(1), "tel", rank, m.start(1))
+        return
+    for m in PHONE_PATTERNS[rank].finditer(content):
+        start = m.start()
+        is_tel = content[max(0, start - 4):start].lower() == "tel:"
+        yield Candidate("phone", m.group(), "tel" if is_tel else source, rank, start)
+
+
+def iter_candidates(html: str, text: str, links: str) -> Iterator[Candidate]:
+    # Stesso ordine di priorità del vecchio percorso: email per posizione,
+    # telefoni per pattern e poi per posizione. Nessuna concatenazione da MB.
+    parts = (html, text, links)
+    for content, source in zip(parts, SOURCES):
+        yield from scan_emails(content, source)
+    for rank in range(TEL_RANK + 1):
+        for content, source in zip(parts, SOURCES):
+            yield from scan_phones(content, source, rank)
+
+
+# ---------------- VALIDAZIONE ----------------
+def validate_email(email: str) -> bool:
+    email = email.lower().strip()
+    if _INVALID_EMAIL_RE.search(email):
+        return False
+    if not EMAIL_RE.match(email):
+        return False
+    if _EMAIL_PUNCT_RUN_RE.search(email):
+        return False
+    return True
+
+
+def validate_phone(phone: str) -> bool:
+    clean = _PHONE_STRIP_RE.sub('', phone)
+    if not _PHONE_SHAPE_RE.fullmatch(clean):
+        return False
+    if _PHONE_SAME_DIGIT_RE.fullmatch(clean) or clean in _PHONE_SEQUENCES:
+        return False
+    if _PHONE_REPEAT_RE.search(clean):
+        return False
+    return True
+
+
+# ---------------- ESTRAZIONE ----------------
+def _first_valid(candidates: Iterator[Candidate], validate) -> Optional[Candidate]:
+    rejected = set()
+    for cand in candidates:
+        if cand.value in rejected:
+            continue
+        if validate(cand.value):
+            return cand
+        rejected.add(cand.value)
+    return None
+
+
+def extract_contacts(html: str, text: str, links: str) -> Tuple[Optional[str], Optional[str]]:
+    # Valutazione pigra: ci si ferma al primo candidato valido, nell'ordine di priorità
+    parts = list(zip((html, text, links), SOURCES))
+    email = _first_valid(
+        (c for content, source in parts for c in scan_emails(content, source)),
+        validate_email
+    )
+    phone = _first_valid(
+        (c for rank in range(TEL_RANK + 1) for content, source in parts
+         for c in scan_phones(content, source, rank)),
+        validate_phone
+    )
+    return (email.value if email else None), (phone.value.strip() if phone else None)
+
+
+def extract_candidates(html: str, text: str, links: str) -> List[Candidate]:
+    return list(iter_candidates(html, text, links))
@@ -0,0 +1,156 @@
+import os
+import re
+import asyncio
+from dataclasses import dataclass
+from html import unescape
+from typing import Dict, Optional, Tuple
+from urllib.parse import urljoin
+
+import aiohttp
+
+
+# ---------------- CONFIG ----------------
+HTTP_TIMEOUT = int(os.getenv("HTTP_TIMEOUT_MS", "8000"))
+HTTP_MAX_BYTES = int(os.getenv("HTTP_MAX_BYTES", str(2 * 1024 * 1024)))
+HTTP_MAX_REDIRECTS = int(os.getenv("HTTP_MAX_REDIRECTS", "5"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", "4"))
+HTTP_KEEPALIVE = int(os.getenv("HTTP_KEEPALIVE_S", "30"))
+
+HTTP_HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                   "AppleWebKit/537.36 (KHTML, like Gecko) "
+                   "Chrome/120.0.0.0 Safari/537.36"),
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "it-IT,it;q=0.9,en;q=0.8",
+}
+
+
+# ---------------- REGEX ----------------
+SCRIPT_STYLE_RE = re.compile(r'<(script|style|noscript|template)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+TAG_RE = re.compile(r'<[^>]+>')
+WS_RE = re.compile(r'\s+')
+HREF_RE = re.compile(r'<a\b[^>]*?\bhref\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+
+# Segnali tipici di SPA: contenuto montato da JS in un contenitore vuoto
+SPA_MARKERS = (
+    re.compile(r'<div[^>]+id=["\'](?:root|app|__next|__nuxt)["\'][^>]*>\s*</div>', re.IGNORECASE),
+    re.compile(r'(?:enable|abilita)[^<]{0,40}javascript', re.IGNORECASE),
+)
+MIN_STATIC_TEXT = int(os.getenv("HTTP_MIN_TEXT_CHARS", "400"))
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int
+    html: str
+    text: str
+    links: str
+    truncated: bool
+
+    @property
+    def looks_js_rendered(self) -> bool:
+        if len(self.text) < MIN_STATIC_TEXT:
+            return True
+        return any(m.search(self.html) for m in SPA_MARKERS)
+
+
+def html_to_text(html: str) -> str:
+    text = SCRIPT_STYLE_RE.sub(' ', html)
+    text = TAG_RE.sub(' ', text)
+    return WS_RE.sub(' ', unescape(text)).strip()
+
+
+def html_links(html: str, base_url: str) -> str:
+    return ' '.join(urljoin(base_url, unescape(h)) for h in HREF_RE.findall(html))
+
+
+# ---------------- CLIENT ----------------
+class HttpFetcher:
+    # Sessione aiohttp con keep-alive e limite di connessioni per host, legata al loop che la crea
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.requests = 0
+        self.bytes_read = 0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_SIZE,
+                limit_per_host=HTTP_LIMIT_PER_HOST,
+                keepalive_timeout=HTTP_KEEPALIVE,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=HTTP_HEADERS,
+                timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT / 1000),
+            )
+        return self._session
+
+    async def fetch(self, url: str) -> Optional[FetchResult]:
+        session = self._get_session()
+        self.requests += 1
+        async with session.get(url, allow_redirects=True, max_redirects=HTTP_MAX_REDIRECTS) as resp:
+            ctype = resp.headers.get("Content-Type", "")
+            if resp.status >= 400 or ("html" not in ctype and "text" not in ctype):
+                return None
+
+            # Legge al massimo HTTP_MAX_BYTES: oltre si lavora sul troncato
+            chunks = []
+            size = 0
+            truncated = False
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= HTTP_MAX_BYTES:
+                    truncated = True
+                    break
+            self.bytes_read += size
+
+            raw = b''.join(chunks)[:HTTP_MAX_BYTES]
+            html = raw.decode(resp.charset or "utf-8", errors="replace")
+            final_url = str(resp.url)
+            return FetchResult(
+                url=final_url,
+                status=resp.status,
+                html=html,
+                text=html_to_text(html),
+                links=html_links(html, final_url),
+                truncated=truncated,
+            )
+
+    async def resolve(self, url: str, max_bytes: int = 64 * 1024) -> Tuple[str, int, str]:
+        # Segue i redirect HTTP e legge solo l'inizio del body (per meta refresh / redirect JS)
+        session = self._get_session()
+        self.requests += 1
+        async with session.get(url, allow_redirects=True, max_redirects=HTTP_MAX_REDIRECTS) as resp:
+            raw = await resp.content.read(max_bytes)
+            self.bytes_read += len(raw)
+            return str(resp.url), resp.status, raw.decode(resp.charset or "utf-8", errors="replace")
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stats(self) -> Dict:
+        return {"requests": self.requests, "bytes_read": self.bytes_read}
+
+
+_fetchers: Dict[asyncio.AbstractEventLoop, HttpFetcher] = {}
+
+
+def get_fetcher() -> HttpFetcher:
+    loop = asyncio.get_running_loop()
+    fetcher = _fetchers.get(loop)
+    if fetcher is None:
+        fetcher = _fetchers[loop] = HttpFetcher()
+    return fetcher
+
+
+async def close_fetcher() -> None:
+    fetcher = _fetchers.pop(asyncio.get_running_loop(), None)
+    if fetcher is not None:
+        await fetcher.close()
@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+# ---------------- CONFIG ----------------
+QUEUE_DB_PATH = os.getenv("QUEUE_DB_PATH", "data/queue.sqlite")
+QUEUE_LEASE = float(os.getenv("QUEUE_LEASE_S", "60"))           # senza heartbeat entro N s il job torna in coda
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", "3"))
+QUEUE_RETENTION = int(os.getenv("QUEUE_RETENTION_S", str(24 * 3600)))
+
+
+# ---------------- CODA ----------------
+class JobQueue:
+    # Coda durevole su SQLite (WAL) condivisa tra web e processi worker.
+    # Un job preso da un worker ha un lease rinnovato dagli heartbeat: se il processo
+    # muore il lease scade e il prossimo claim lo riassegna (fino a QUEUE_MAX_ATTEMPTS).
+    def __init__(self, path: str = QUEUE_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._ready = False
+        self._init_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        # Una connessione per thread: web (thread gunicorn) e worker scrivono in parallelo
+        db = getattr(self._local, "db", None)
+        if db is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = self._local.db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._ready:
+                    db.execute(
+                        "CREATE TABLE IF NOT EXISTS jobs ("
+                        "id TEXT PRIMARY KEY, payload TEXT NOT NULL, status TEXT NOT NULL, "
+                        "attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, lease_until REAL, "
+                        "created_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+                        "result TEXT, error TEXT, run INTEGER NOT NULL DEFAULT 0)"
+                    )
+                    db.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs(status, created_at)")
+                    db.execute(
+                        "CREATE TABLE IF NOT EXISTS job_events ("
+                        "job_id TEXT NOT NULL, seq INTEGER NOT NULL, event TEXT NOT NULL, data TEXT NOT NULL, "
+                        "run INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (job_id, seq))"
+                    )
+                    # Code create prima della colonna run
+                    for table in ("jobs", "job_events"):
+                        columns = {row[1] for row in db.execute(f"PRAGMA table_info({table})")}
+                        if "run" not in columns:
+                            db.execute(f"ALTER TABLE {table} ADD COLUMN run INTEGER NOT NULL DEFAULT 0")
+                    self._ready = True
+        return db
+
+    def _append_event(self, db: sqlite3.Connection, job_id: str, event: str, data: Dict) -> None:
+        # Ogni evento porta l'esecuzione (run) in cui è nato: un job rimesso in coda riparte da zero
+        # e i suoi eventi si affiancano a quelli dell'esecuzione interrotta
+        db.execute(
+            "INSERT INTO job_events (job_id, seq, event, data, run) "
+            "SELECT ?, COALESCE(MAX(seq), -1) + 1, ?, ?, (SELECT run FROM jobs WHERE id = ?) "
+            "FROM job_events WHERE job_id = ?",
+            (job_id, event, json.dumps(data), job_id, job_id)
+        )
+
+    # ---------- lato web ----------
+    def enqueue(self, payload: Dict) -> str:
+        job_id = uuid.uuid4().hex
+        self._conn().execute(
+            "INSERT INTO jobs (id, payload, status, created_at) VALUES (?, ?, 'queued', ?)",
+            (job_id, json.dumps(payload), time.time())
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT id, payload, status, attempts, worker, created_at, started_at, finished_at, result, error "
+            "FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0], "payload": json.loads(row[1]), "status": row[2], "attempts": row[3],
+            "worker": row[4], "created_at": row[5], "started_at": row[6], "finished_at": row[7],
+            "result": json.loads(row[8]) if row[8] else None, "error": row[9],
+        }
+
+    def events(self, job_id: str, since: int = 0, event: Optional[str] = None,
+               latest_run: bool = False) -> List[Tuple[int, str, Dict]]:
+        # latest_run: solo gli eventi dell'ultima esecuzione (lead ed esito senza doppioni dei requeue)
+        sql = "SELECT seq, event, data FROM job_events WHERE job_id = ? AND seq >= ?"
+        args: Tuple = (job_id, since)
+        if event is not None:
+            sql += " AND event = ?"
+            args += (event,)
+        if latest_run:
+            sql += " AND run = (SELECT run FROM jobs WHERE id = ?)"
+            args += (job_id,)
+        rows = self._conn().execute(sql + " ORDER BY seq", args).fetchall()
+        return [(seq, ev, json.loads(data)) for seq, ev, data in rows]
+
+    def stream_events(self, job_id: str, since: int = 0) -> List[Tuple[int, str, Dict]]:
+        # Per SSE/NDJSON: la sequenza resta quella scritta (i client riprendono da seq), ma una lead
+        # già emessa da un'esecuzione precedente non si ripete quando il job rimesso in coda la rifà
+        db = self._conn()
+        rows = db.execute(
+            "SELECT seq, event, data, run FROM job_events WHERE job_id = ? AND seq >= ? ORDER BY seq",
+            (job_id, since)
+        ).fetchall()
+        current = db.execute("SELECT run FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if current is None or current[0] <= 1:
+            return [(seq, ev, json.loads(data)) for seq, ev, data, _ in rows]
+
+        first_run: Dict[str, int] = {}
+        for data, run in db.execute(
+            "SELECT data, run FROM job_events WHERE job_id = ? AND event = 'lead' ORDER BY seq", (job_id,)
+        ):
+            first_run.setdefault(json.loads(data)["lead"].get("landing_page"), run)
+        events = []
+        for seq, ev, data, run in rows:
+            data = json.loads(data)
+            if ev == "lead" and first_run.get(data["lead"].get("landing_page"), run) < run:
+                continue
+            events.append((seq, ev, data))
+        return events
+
+    # ---------- lato worker ----------
+    def claim(self, worker: str, lease: float = QUEUE_LEASE) -> Optional[Tuple[str, Dict, int]]:
+        # BEGIN IMMEDIATE: un solo worker alla volta sceglie, niente job presi due volte
+        db = self._conn()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Lease scaduti: il worker è morto o bloccato
+            expired = db.execute(
+                "SELECT id, attempts FROM jobs WHERE status = 'running' AND lease_until < ?", (now,)
+            ).fetchall()
+            for job_id, attempts in expired:
+                if attempts >= QUEUE_MAX_ATTEMPTS:
+                    db.execute("UPDATE jobs SET status = 'error', error = ?, finished_at = ? WHERE id = ?",
+                               ("Troppi tentativi falliti", now, job_id))
+                    self._append_event(db, job_id, "error", {"error": "Troppi tentativi falliti"})
+                else:
+                    db.execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE id = ?", (job_id,))
+                    self._append_event(db, job_id, "stage", {"stage": "requeued", "attempts": attempts})
+
+            row = db.execute(
+                "SELECT id, payload, attempts FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            job_id, payload, attempts = row
+            db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, run = run + 1, "
+                "lease_until = ?, started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (worker, now + lease, now, job_id)
+            )
+            db.execute("COMMIT")
+            return job_id, json.loads(payload), attempts + 1
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def heartbeat(self, job_ids: List[str], worker: str, lease: float = QUEUE_LEASE) -> None:
+        if not job_ids:
+            return
+        until = time.time() + lease
+        self._conn().executemany(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            [(until, job_id, worker) for job_id in job_ids]
+        )
+
+    def push_event(self, job_id: str, event: str, data: Dict) -> None:
+        self._append_event(self._conn(), job_id, event, data)
+
+    def finish(self, job_id: str, worker: str, status: str, leads: Optional[List[Dict]] = None,
+               error: Optional[str] = None, **data) -> bool:
+        # Solo chi ha ancora il lease può chiudere il job (False = riassegnato nel frattempo)
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            updated = db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (status, json.dumps(leads) if leads is not None else None, error, time.time(), job_id, worker)
+            ).rowcount
+            if updated:
+                self._append_event(db, job_id, status, {**data, "error": error} if error else data)
+            db.execute("COMMIT")
+            return bool(updated)
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def release(self, job_id: str, worker: str) -> None:
+        # Shutdown del worker: il job torna in coda senza consumare un tentativo (run invece cresce
+        # al prossimo claim, come per ogni nuova esecuzione)
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            updated = db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, lease_until = NULL, attempts = attempts - 1 "
+                "WHERE id = ? AND worker = ? AND status = 'running'", (job_id, worker)
+            ).rowcount
+            if updated:
+                self._append_event(db, job_id, "stage", {"stage": "requeued", "reason": "shutdown"})
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def purge_finished(self, retention: float = QUEUE_RETENTION) -> int:
+        db = self._conn()
+        cutoff = time.time() - retention
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM job_events WHERE job_id IN "
+                       "(SELECT id FROM jobs WHERE status IN ('done', 'error') AND finished_at < ?)", (cutoff,))
+            deleted = db.execute("DELETE FROM jobs WHERE status IN ('done', 'error') AND finished_at < ?",
+                                 (cutoff,)).rowcount
+            db.execute("COMMIT")
+            return deleted
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def stats(self) -> Dict:
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+job_queue = JobQueue()
@@ -0,0 +1,253 @@
+import os
+import time
+import uuid
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from aut import get_real_leads, get_real_leads_batch, submit_to_pool, run_in_pool, logger
+from jobqueue import job_queue
+
+
+# ---------------- CONFIG ----------------
+JOB_TTL = int(os.getenv("JOB_TTL_S", "3600"))          # quanto resta consultabile un job finito
+MAX_JOBS = int(os.getenv("MAX_JOBS", "200"))
+# inline = scraping nel processo web (browser pool) | queue = solo coda SQLite, lo scraping lo fa worker.py
+WORKER_MODE = os.getenv("WORKER_MODE", "inline")
+QUEUE_POLL = float(os.getenv("QUEUE_POLL_S", "0.5"))
+
+
+# ---------------- JOB ----------------
+class Job:
+    def __init__(self, query: str, use_cache: bool = True, queries: Optional[List[str]] = None,
+                 countries: Optional[List[str]] = None, trace: bool = False, incremental: bool = False,
+                 deadline_s: Optional[float] = None):
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.queries = queries           # job batch: più query (e paesi) in un colpo solo
+        self.countries = countries
+        self.use_cache = use_cache
+        self.trace = trace               # eventi "span" con i tempi di ogni fase
+        self.incremental = incremental   # solo annunci/landing non visti nelle run precedenti
+        self.deadline_s = deadline_s     # scadenza end-to-end, None = RUN_DEADLINE_S
+        self.status = "queued"           # queued | running | done | error
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.leads: List[Dict] = []
+        self.events: List[Tuple[int, str, Dict]] = []
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "error")
+
+    # Chiamato dal loop del pool: deve solo accodare e svegliare i lettori
+    def push(self, event: str, data: Dict) -> None:
+        with self._cond:
+            if event == "lead":
+                self.leads.append(data["lead"])
+            self.events.append((len(self.events), event, data))
+            self._cond.notify_all()
+
+    def finish(self, status: str, leads: Optional[List[Dict]] = None, **data) -> None:
+        with self._cond:
+            if leads is not None:
+                self.leads = leads
+            self.status = status
+            self.finished_at = time.time()
+            self.events.append((len(self.events), status, data))
+            self._cond.notify_all()
+
+    def wait_events(self, since: int, timeout: float = 15.0) -> List[Tuple[int, str, Dict]]:
+        with self._cond:
+            if len(self.events) <= since and not self.finished:
+                self._cond.wait(timeout)
+            return self.events[since:]
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            return {
+                "job_id": self.id,
+                "query": self.query,
+                "queries": self.queries,
+                "countries": self.countries,
+                "status": self.status,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+                "events": len(self.events),
+                "leads": list(self.leads),
+            }
+
+
+# ---------------- JOB IN CODA ----------------
+class JobPending(TimeoutError):
+    # Job in coda non concluso entro il tempo della richiesta sincrona: prosegue, si segue da job_id
+    def __init__(self, job_id: str, timeout: float):
+        super().__init__(f"Job {job_id} non completato in {timeout}s")
+        self.job_id = job_id
+
+
+class QueuedJob:
+    # Vista su un job della coda SQLite con la stessa interfaccia di Job per le route
+    def __init__(self, job_id: str):
+        self.id = job_id
+
+    @property
+    def status(self) -> str:
+        row = job_queue.get(self.id)
+        return row["status"] if row else "error"
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "error")
+
+    def wait_events(self, since: int, timeout: float = 15.0) -> List[Tuple[int, str, Dict]]:
+        # Il worker è un altro processo: niente Condition, si interroga la coda
+        deadline = time.monotonic() + timeout
+        while True:
+            events = job_queue.stream_events(self.id, since)
+            if events or self.finished or time.monotonic() >= deadline:
+                return events
+            time.sleep(QUEUE_POLL)
+
+    def result(self, timeout: Optional[float] = None) -> List[Dict]:
+        deadline = time.monotonic() + timeout if timeout else None
+        while not self.finished:
+            if deadline and time.monotonic() >= deadline:
+                raise TimeoutError(f"Job {self.id} non completato in {timeout}s")
+            time.sleep(QUEUE_POLL)
+        return job_queue.get(self.id)["result"] or []
+
+    def snapshot(self) -> Dict:
+        row = job_queue.get(self.id) or {}
+        payload = row.get("payload", {})
+        leads = row.get("result")
+        if leads is None:
+            # Job ancora in corso: le lead dell'esecuzione attuale (non quelle di una interrotta)
+            leads = [data["lead"] for _, _, data in job_queue.events(self.id, event="lead", latest_run=True)]
+        return {
+            "job_id": self.id,
+            "query": payload.get("query"),
+            "queries": payload.get("queries"),
+            "countries": payload.get("countries"),
+            "status": row.get("status", "error"),
+            "attempts": row.get("attempts", 0),
+            "created_at": row.get("created_at"),
+            "finished_at": row.get("finished_at"),
+            "events": len(job_queue.events(self.id)),
+            "leads": leads,
+        }
+
+
+# ---------------- ESITO ----------------
+class RunOutcome:
+    # Raccoglie dagli eventi della run l'esito da restituire insieme alle lead
+    def __init__(self):
+        self.unchanged = 0
+        self.partial = False
+        self.stages: Dict = {}
+
+    def on_event(self, event: str, data: Dict) -> None:
+        if event == "incremental":
+            self.unchanged += data["unchanged"]
+        elif event == "summary":
+            self.partial = data["partial"]
+            self.stages = data["stages"]
+
+    def summary(self, incremental: bool = False) -> Dict:
+        result = {"partial": self.partial, "stages": self.stages}
+        if incremental:
+            result["unchanged"] = self.unchanged
+        return result
+
+
+# ---------------- REGISTRY ----------------
+_jobs: Dict[str, Job] = {}
+_jobs_lock = threading.Lock()
+
+
+def _prune() -> None:
+    now = time.time()
+    expired = [j.id for j in _jobs.values() if j.finished and now - j.finished_at > JOB_TTL]
+    for job_id in expired:
+        del _jobs[job_id]
+    # Oltre il limite si eliminano i job finiti più vecchi
+    if len(_jobs) > MAX_JOBS:
+        done = sorted((j for j in _jobs.values() if j.finished), key=lambda j: j.finished_at)
+        for job in done[:len(_jobs) - MAX_JOBS]:
+            del _jobs[job.id]
+
+
+async def run_job(job: Job) -> None:
+    job.status = "running"
+    job.push("stage", {"stage": "started"})
+    outcome = RunOutcome()
+
+    def on_event(event: str, data: Dict) -> None:
+        outcome.on_event(event, data)
+        job.push(event, data)
+
+    try:
+        options = dict(on_event=on_event, use_cache=job.use_cache, trace=job.trace, incremental=job.incremental,
+                       deadline_s=job.deadline_s)
+        if job.queries:
+            leads = await get_real_leads_batch(job.queries, job.countries, **options)
+        else:
+            leads = await get_real_leads(job.query, **options)
+        ok = sum(1 for l in leads if l["status"] == "success")
+        # Nel batch le attribuzioni (matches) sono complete solo a fine job
+        job.finish("done", leads=leads if job.queries else None, total=len(leads), ok=ok,
+                   **outcome.summary(job.incremental))
+    except Exception as e:
+        logger.error(f"❌ Job {job.id} fallito: {e}")
+        job.finish("error", error=str(e))
+
+
+def submit_job(query: str, use_cache: bool = True, queries: Optional[List[str]] = None,
+               countries: Optional[List[str]] = None, trace: bool = False, incremental: bool = False,
+               deadline_s: Optional[float] = None):
+    if WORKER_MODE == "queue":
+        job_id = job_queue.enqueue({"query": query, "use_cache": use_cache, "queries": queries,
+                                    "countries": countries, "trace": trace, "incremental": incremental,
+                                    "deadline_s": deadline_s})
+        logger.info(f"📥 Job {job_id} in coda: {query}")
+        return QueuedJob(job_id)
+
+    job = Job(query, use_cache, queries, countries, trace, incremental, deadline_s)
+    with _jobs_lock:
+        _prune()
+        _jobs[job.id] = job
+    submit_to_pool(run_job(job))
+    logger.info(f"📥 Job {job.id} accodato: {query}")
+    return job
+
+
+def get_job(job_id: str):
+    if WORKER_MODE == "queue":
+        return QueuedJob(job_id) if job_queue.get(job_id) else None
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def run_leads(query: str, use_cache: bool = True, queries: Optional[List[str]] = None,
+              countries: Optional[List[str]] = None, timeout: Optional[float] = None,
+              incremental: bool = False, deadline_s: Optional[float] = None) -> Tuple[List[Dict], Dict]:
+    # Esecuzione sincrona per /add_leads: nel processo web oppure tramite la coda dei worker.
+    # Ritorna (lead, esito): partial e stages sempre, unchanged solo in modalità incrementale.
+    # In coda timeout limita l'attesa (attesa in coda compresa): scaduto, JobPending con l'id del job.
+    outcome = RunOutcome()
+    if WORKER_MODE == "queue":
+        job = submit_job(query, use_cache, queries, countries, incremental=incremental, deadline_s=deadline_s)
+        try:
+            leads = job.result(timeout)
+        except TimeoutError:
+            raise JobPending(job.id, timeout)
+        for _, event, data in job_queue.events(job.id, latest_run=True):
+            outcome.on_event(event, data)
+        return leads, outcome.summary(incremental)
+
+    options = dict(on_event=outcome.on_event, use_cache=use_cache, incremental=incremental, deadline_s=deadline_s)
+    if queries:
+        leads = run_in_pool(get_real_leads_batch(queries, countries, **options), timeout)
+    else:
+        leads = run_in_pool(get_real_leads(query, **options), timeout)
+    return leads, outcome.summary(incremental)
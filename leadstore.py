@@ -0,0 +1,280 @@
+import io
+import os
+import re
+import csv
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+
+# ---------------- CONFIG ----------------
+LEAD_STORE_ENABLED = os.getenv("LEAD_STORE_ENABLED", "1") == "1"
+LEAD_DB_PATH = os.getenv("LEAD_DB_PATH", "data/leads.sqlite")
+LEADS_PAGE_SIZE = int(os.getenv("LEADS_PAGE_SIZE", "100"))
+LEADS_PAGE_MAX = int(os.getenv("LEADS_PAGE_MAX", "1000"))
+EXPORT_BATCH = 500          # righe lette per query durante l'export: memoria costante
+
+CSV_FIELDS = ["landing_page", "ad_link", "email", "telefono", "copy_valutazione", "copy_score",
+              "status", "tier", "cached", "queries", "countries"]
+
+AD_ID_RE = re.compile(r'[?&]id=(\d+)')
+PHONE_KEY_DIGITS = 9
+
+
+def lead_domain(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def phone_key(phone: Optional[str]) -> Optional[str]:
+    # Ultime 9 cifre: lo stesso numero con o senza prefisso internazionale dà la stessa chiave
+    digits = re.sub(r'\D', '', phone or "")
+    return digits[-PHONE_KEY_DIGITS:] or None
+
+
+def csv_row(lead: Dict) -> Dict:
+    row = {k: lead.get(k) for k in CSV_FIELDS}
+    row["queries"] = " | ".join(dict.fromkeys(m["query"] for m in lead.get("matches", [])))
+    row["countries"] = " | ".join(dict.fromkeys(m["country"] for m in lead.get("matches", [])))
+    return row
+
+
+# ---------------- STORE ----------------
+class LeadStore:
+    # Archivio SQLite (WAL) delle lead: una riga per landing, aggiornata a ogni nuova analisi.
+    # Indici su dominio, email, telefono e Ad ID; le query/paesi che l'hanno trovata stanno
+    # in lead_matches. La paginazione è a cursore sull'id (keyset): costo costante per pagina.
+    def __init__(self, path: str = LEAD_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._ready = False
+        self._init_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        # Una connessione per thread, come la coda: web e worker scrivono in parallelo
+        db = getattr(self._local, "db", None)
+        if db is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = self._local.db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._ready:
+                    db.execute(
+                        "CREATE TABLE IF NOT EXISTS leads ("
+                        "id INTEGER PRIMARY KEY AUTOINCREMENT, landing_page TEXT NOT NULL UNIQUE, "
+                        "domain TEXT NOT NULL, ad_link TEXT, ad_id TEXT, email TEXT, telefono TEXT, "
+                        "phone_key TEXT, copy_valutazione TEXT, copy_score REAL, status TEXT NOT NULL, "
+                        "tier TEXT, scans INTEGER NOT NULL DEFAULT 1, first_seen REAL NOT NULL, "
+                        "updated_at REAL NOT NULL, data TEXT NOT NULL)"
+                    )
+                    for column in ("domain", "email", "phone_key", "ad_id", "updated_at"):
+                        db.execute(f"CREATE INDEX IF NOT EXISTS leads_{column} ON leads({column})")
+                    db.execute(
+                        "CREATE TABLE IF NOT EXISTS lead_matches ("
+                        "lead_id INTEGER NOT NULL, query TEXT NOT NULL, country TEXT NOT NULL, "
+                        "seen_at REAL NOT NULL, PRIMARY KEY (lead_id, query, country))"
+                    )
+                    db.execute("CREATE INDEX IF NOT EXISTS lead_matches_query ON lead_matches(query, country)")
+                    # Modalità incrementale: annunci (kind=ad) e landing (kind=landing) già analizzati per ricerca
+                    db.execute(
+                        "CREATE TABLE IF NOT EXISTS seen ("
+                        "query TEXT NOT NULL, country TEXT NOT NULL, kind TEXT NOT NULL, key TEXT NOT NULL, "
+                        "first_seen REAL NOT NULL, last_seen REAL NOT NULL, PRIMARY KEY (query, country, kind, key))"
+                    )
+                    self._ready = True
+        return db
+
+    # ---------- scrittura ----------
+    def upsert_many(self, leads: List[Dict], match: Optional[Dict[str, str]] = None) -> int:
+        # Ri-analisi della stessa landing: aggiorna la riga, ma un esito peggiore non cancella
+        # i recapiti già trovati. `match` vale per le lead senza `matches` (run a query singola).
+        leads = [l for l in leads if l.get("status") != "cancelled"]
+        if not leads:
+            return 0
+        db = self._conn()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for lead in leads:
+                ad_link = lead.get("ad_link")
+                ad_id = AD_ID_RE.search(ad_link or "")
+                row = db.execute(
+                    "INSERT INTO leads (landing_page, domain, ad_link, ad_id, email, telefono, phone_key, "
+                    "copy_valutazione, copy_score, status, tier, first_seen, updated_at, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(landing_page) DO UPDATE SET "
+                    "ad_link = COALESCE(NULLIF(excluded.ad_link, 'Non disponibile'), leads.ad_link), "
+                    "ad_id = COALESCE(excluded.ad_id, leads.ad_id), "
+                    "email = COALESCE(excluded.email, leads.email), "
+                    "telefono = COALESCE(excluded.telefono, leads.telefono), "
+                    "phone_key = COALESCE(excluded.phone_key, leads.phone_key), "
+                    "copy_valutazione = COALESCE(excluded.copy_valutazione, leads.copy_valutazione), "
+                    "copy_score = COALESCE(excluded.copy_score, leads.copy_score), "
+                    "status = CASE WHEN excluded.status = 'success' OR leads.status != 'success' "
+                    "THEN excluded.status ELSE leads.status END, "
+                    "tier = excluded.tier, scans = leads.scans + 1, updated_at = excluded.updated_at, "
+                    "data = excluded.data "
+                    "RETURNING id",
+                    (lead["landing_page"], lead_domain(lead["landing_page"]), ad_link,
+                     ad_id.group(1) if ad_id else None, (lead.get("email") or "").lower() or None,
+                     lead.get("telefono"),
+                     phone_key(lead.get("telefono")), lead.get("copy_valutazione"), lead.get("copy_score"),
+                     lead.get("status", "error"), lead.get("tier"), now, now,
+                     json.dumps({k: v for k, v in lead.items() if k != "matches"}))
+                ).fetchone()
+                matches = lead.get("matches") or ([match] if match else [])
+                db.executemany(
+                    "INSERT INTO lead_matches (lead_id, query, country, seen_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(lead_id, query, country) DO UPDATE SET seen_at = excluded.seen_at",
+                    [(row[0], m["query"], m["country"], now) for m in matches]
+                )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return len(leads)
+
+    # ---------- visti (incrementale) ----------
+    @staticmethod
+    def _search_key(query: str, country: str) -> Tuple[str, str]:
+        return " ".join(query.lower().split()), country.upper()
+
+    def seen(self, query: str, country: str) -> Tuple[Set[str], Set[str]]:
+        # (Ad ID, landing URL) già analizzati con successo per la ricerca
+        rows = self._conn().execute(
+            "SELECT kind, key FROM seen WHERE query = ? AND country = ?", self._search_key(query, country)
+        ).fetchall()
+        return {k for kind, k in rows if kind == "ad"}, {k for kind, k in rows if kind == "landing"}
+
+    def mark_seen(self, query: str, country: str, leads: Iterable[Dict]) -> int:
+        # Solo le lead riuscite: timeout ed errori vanno ritentati alla prossima run
+        search = self._search_key(query, country)
+        now = time.time()
+        rows = []
+        for lead in leads:
+            if lead.get("status") != "success":
+                continue
+            rows.append((*search, "landing", lead["landing_page"], now, now))
+            ad_id = AD_ID_RE.search(lead.get("ad_link") or "")
+            if ad_id:
+                rows.append((*search, "ad", ad_id.group(1), now, now))
+        if not rows:
+            return 0
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "INSERT INTO seen (query, country, kind, key, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(query, country, kind, key) DO UPDATE SET last_seen = excluded.last_seen", rows
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    # ---------- lettura ----------
+    @staticmethod
+    def _where(filters: Dict[str, Optional[str]]) -> Tuple[str, List]:
+        clauses, args = [], []
+        if filters.get("domain"):
+            clauses.append("domain = ?")
+            args.append(lead_domain("http://" + filters["domain"].strip().lower()))
+        if filters.get("email"):
+            clauses.append("email = ?")
+            args.append(filters["email"].strip().lower())
+        if filters.get("phone"):
+            clauses.append("phone_key = ?")
+            args.append(phone_key(filters["phone"]))
+        if filters.get("ad_id"):
+            clauses.append("ad_id = ?")
+            args.append(filters["ad_id"].strip())
+        if filters.get("status"):
+            clauses.append("status = ?")
+            args.append(filters["status"])
+        if filters.get("query"):
+            clauses.append("id IN (SELECT lead_id FROM lead_matches WHERE query = ?)")
+            args.append(filters["query"])
+        if filters.get("country"):
+            clauses.append("id IN (SELECT lead_id FROM lead_matches WHERE country = ?)")
+            args.append(filters["country"].upper())
+        return (" AND ".join(clauses) or "1"), args
+
+    def _matches(self, db: sqlite3.Connection, ids: List[int]) -> Dict[int, List[Dict[str, str]]]:
+        if not ids:
+            return {}
+        found: Dict[int, List[Dict[str, str]]] = {}
+        rows = db.execute(
+            f"SELECT lead_id, query, country FROM lead_matches WHERE lead_id IN ({','.join('?' * len(ids))}) "
+            "ORDER BY seen_at", ids
+        ).fetchall()
+        for lead_id, query, country in rows:
+            found.setdefault(lead_id, []).append({"query": query, "country": country})
+        return found
+
+    def page(self, cursor: int = 0, limit: int = LEADS_PAGE_SIZE, **filters) -> Dict:
+        # Pagina di lead con id > cursor; next_cursor = None quando non ce ne sono altre
+        limit = max(1, min(limit, LEADS_PAGE_MAX))
+        where, args = self._where(filters)
+        db = self._conn()
+        rows = db.execute(
+            "SELECT id, data, email, telefono, copy_valutazione, copy_score, status, tier, ad_link, "
+            f"scans, first_seen, updated_at FROM leads WHERE id > ? AND {where} ORDER BY id LIMIT ?",
+            [cursor, *args, limit + 1]
+        ).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        matches = self._matches(db, [r[0] for r in rows])
+        leads = [self._lead(r, matches.get(r[0], [])) for r in rows]
+        return {"leads": leads, "next_cursor": rows[-1][0] if more else None}
+
+    @staticmethod
+    def _lead(row: Tuple, matches: List[Dict[str, str]]) -> Dict:
+        (lead_id, data, email, telefono, copy_valutazione, copy_score, status, tier, ad_link,
+         scans, first_seen, updated_at) = row
+        # I campi aggregati dall'upsert hanno la precedenza sull'ultima analisi salvata in data
+        return {**json.loads(data), "id": lead_id, "email": email, "telefono": telefono,
+                "copy_valutazione": copy_valutazione, "copy_score": copy_score, "status": status,
+                "tier": tier, "ad_link": ad_link, "scans": scans, "first_seen": first_seen,
+                "updated_at": updated_at, "matches": matches}
+
+    def iter_leads(self, batch: int = EXPORT_BATCH, **filters) -> Iterator[Dict]:
+        cursor = 0
+        while True:
+            result = self.page(cursor, batch, **filters)
+            yield from result["leads"]
+            if result["next_cursor"] is None:
+                return
+            cursor = result["next_cursor"]
+
+    def export(self, fmt: str = "csv", **filters) -> Iterator[str]:
+        # Una riga alla volta: la memoria non dipende dal numero di lead esportate
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            for lead in self.iter_leads(**filters):
+                writer.writerow(csv_row(lead))
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for lead in self.iter_leads(**filters):
+                yield json.dumps(lead, ensure_ascii=False) + "\n"
+
+    def stats(self) -> Dict:
+        db = self._conn()
+        total, with_email, with_phone = db.execute(
+            "SELECT COUNT(*), COUNT(email), COUNT(phone_key) FROM leads"
+        ).fetchone()
+        return {"leads": total, "with_email": with_email, "with_phone": with_phone,
+                "domains": db.execute("SELECT COUNT(DISTINCT domain) FROM leads").fetchone()[0]}
+
+
+lead_store = LeadStore()
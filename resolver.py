@@ -0,0 +1,120 @@
+import os
+import re
+import asyncio
+import logging
+from dataclasses import dataclass, asdict
+from html import unescape
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import urljoin, urlparse
+
+from cache import PersistentCache, CACHE_TTL_ERROR
+from fetcher import get_fetcher
+
+logger = logging.getLogger("render-playwright-scraper")
+
+
+# ---------------- CONFIG ----------------
+SHORTLINK_CONCURRENCY = int(os.getenv("SHORTLINK_CONCURRENCY", "8"))
+SHORTLINK_TTL = int(os.getenv("SHORTLINK_TTL_S", str(30 * 24 * 3600)))
+SHORTLINK_MAX_HOPS = int(os.getenv("SHORTLINK_MAX_HOPS", "3"))
+
+META_REFRESH_RE = re.compile(
+    r'<meta[^>]+http-equiv=["\']?refresh["\']?[^>]*content=["\'][^"\']*?url=([^"\'>]+)', re.IGNORECASE
+)
+# Redirect fatti da JavaScript: serve il browser per sapere dove portano
+JS_REDIRECT_RE = re.compile(r'(?:window\.|document\.)?location(?:\.href)?\s*=|location\.replace\(', re.IGNORECASE)
+JS_SHIM_MAX_BYTES = 4096
+INTERSTITIAL_HOSTS = ("facebook.com", "fb.me", "fb.com")
+
+# Shortlink -> URL finale, persistente tra le run (stesso DB della cache landing)
+shortlink_cache = PersistentCache("shortlinks")
+
+
+@dataclass
+class ResolverStats:
+    links: int = 0
+    cache_hits: int = 0
+    http: int = 0
+    browser: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+
+
+BrowserFallback = Callable[[str], Awaitable[Optional[str]]]
+
+
+class ShortlinkResolver:
+    # Risolve in parallelo (max SHORTLINK_CONCURRENCY) via HTTP; il browser solo per i redirect JS
+    def __init__(self, browser_fallback: Optional[BrowserFallback] = None, use_cache: bool = True):
+        self.browser_fallback = browser_fallback
+        self.use_cache = use_cache
+        self.stats = ResolverStats()
+        self._semaphore = asyncio.Semaphore(SHORTLINK_CONCURRENCY)
+
+    async def _resolve_http(self, link: str) -> Optional[str]:
+        url = link
+        for _ in range(SHORTLINK_MAX_HOPS):
+            final_url, status, head = await get_fetcher().resolve(url)
+            if status >= 400:
+                return None
+            refresh = META_REFRESH_RE.search(head)
+            if refresh:
+                url = urljoin(final_url, unescape(refresh.group(1).strip()))
+                continue
+            host = urlparse(final_url).netloc.lower()
+            if any(host == h or host.endswith("." + h) for h in INTERSTITIAL_HOSTS):
+                # l.php si decodifica da solo; qualsiasi altra pagina Facebook è una pagina ponte
+                return final_url if "l.php" in final_url else None
+            if len(head) < JS_SHIM_MAX_BYTES and JS_REDIRECT_RE.search(head):
+                return None     # pagina minimale che redirige via JS: serve il browser
+            return final_url
+        return None
+
+    async def _cache_get(self, link: str) -> Optional[Dict]:
+        # Come per la cache landing: un errore SQLite vale come miss, l'I/O gira fuori dal loop
+        try:
+            return await asyncio.to_thread(shortlink_cache.get, link)
+        except Exception as e:
+            logger.warning(f"⚠️ Cache shortlink non leggibile, proseguo senza: {e}")
+            return None
+
+    async def _cache_put(self, link: str, url: Optional[str]) -> None:
+        try:
+            await asyncio.to_thread(shortlink_cache.put, link, {"url": url}, SHORTLINK_TTL if url else CACHE_TTL_ERROR)
+        except Exception as e:
+            logger.warning(f"⚠️ Scrittura cache shortlink saltata: {e}")
+
+    async def resolve(self, link: str) -> Optional[str]:
+        if self.use_cache:
+            cached = await self._cache_get(link)
+            if cached is not None:
+                self.stats.cache_hits += 1
+                return cached["url"]
+
+        async with self._semaphore:
+            url = None
+            try:
+                url = await self._resolve_http(link)
+                if url:
+                    self.stats.http += 1
+            except Exception:
+                url = None
+            if url is None and self.browser_fallback is not None:
+                url = await self.browser_fallback(link)
+                if url:
+                    self.stats.browser += 1
+
+        if url is None:
+            self.stats.failed += 1
+        if self.use_cache:
+            await self._cache_put(link, url)
+        return url
+
+
+# Totali cumulati tra le run (esposti in /healthz)
+SHORTLINK_STATS: Dict[str, float] = {k: 0 for k in asdict(ResolverStats())}
+
+
+def record_resolver_stats(stats: ResolverStats) -> None:
+    for key, value in asdict(stats).items():
+        SHORTLINK_STATS[key] += value
@@ -0,0 +1,313 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Deque, Dict, Optional
+from urllib.parse import urlparse
+
+
+# ---------------- CONFIG ----------------
+ADAPTIVE_CONCURRENCY = os.getenv("ADAPTIVE_CONCURRENCY", "1") == "1"
+SCHED_MIN_PAGES = int(os.getenv("SCHED_MIN_PAGES", "1"))
+SCHED_MAX_PAGES = int(os.getenv("SCHED_MAX_PAGES", "8"))
+SCHED_TARGET_LATENCY = float(os.getenv("SCHED_TARGET_LATENCY_S", "15"))     # oltre: troppe pagine insieme
+SCHED_MAX_TIMEOUT_RATE = float(os.getenv("SCHED_MAX_TIMEOUT_RATE", "0.25"))
+SCHED_MEMORY_CEILING_MB = int(os.getenv("SCHED_MEMORY_CEILING_MB", "1200"))  # sotto BROWSER_MAX_RSS_MB
+SCHED_DECREASE_FACTOR = float(os.getenv("SCHED_DECREASE_FACTOR", "0.5"))
+SCHED_COOLDOWN = float(os.getenv("SCHED_COOLDOWN_S", "5"))                  # al massimo un taglio ogni N s
+SCHED_WINDOW = int(os.getenv("SCHED_WINDOW", "20"))                         # esiti per il tasso di timeout
+SCHED_MEMORY_INTERVAL = float(os.getenv("SCHED_MEMORY_INTERVAL_S", "2"))
+
+HOST_MAX_CONCURRENCY = int(os.getenv("HOST_MAX_CONCURRENCY", "2"))          # 0 = nessun limite
+HOST_MAX_RATE = float(os.getenv("HOST_MAX_RATE", "1"))                      # richieste/s per host, 0 = nessun limite
+HOST_TABLE_MAX = 1024
+
+logger = logging.getLogger("render-playwright-scraper")
+
+
+def process_rss_mb() -> float:
+    # RSS del processo Python (solo Linux, altrove 0)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+# ---------------- LIMITE ADATTIVO ----------------
+class AdaptiveLimiter:
+    # AIMD sulle pagine in volo: +1 per ogni "giro" di completamenti a pieno carico,
+    # x SCHED_DECREASE_FACTOR quando salgono latenza, tasso di timeout o memoria.
+    def __init__(self, initial: int, minimum: int = SCHED_MIN_PAGES, maximum: int = SCHED_MAX_PAGES,
+                 memory_probe: Optional[Callable[[], float]] = None):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.memory_probe = memory_probe
+        self.in_flight = 0
+        self.latency = 0.0                  # media mobile esponenziale, secondi
+        self.rss_mb = 0.0
+        self.increases = 0
+        self.decreases = 0
+        self.last_reason = ""
+        self._outcomes: Deque[bool] = deque(maxlen=SCHED_WINDOW)
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        self._rss_at = 0.0
+
+    @property
+    def timeout_rate(self) -> float:
+        return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Posto già assegnato ma mai usato: si restituisce
+                self.in_flight -= 1
+                self._wake()
+            else:
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self, latency: Optional[float] = None, timed_out: bool = False) -> None:
+        # latency None = esito da non misurare (es. annullato)
+        self.in_flight -= 1
+        if latency is not None:
+            self._observe(latency, timed_out)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self.in_flight += 1
+                fut.set_result(None)
+
+    def _memory(self) -> float:
+        now = time.monotonic()
+        if self.memory_probe is not None and now - self._rss_at >= SCHED_MEMORY_INTERVAL:
+            self.rss_mb = self.memory_probe()
+            self._rss_at = now
+        return self.rss_mb
+
+    def _observe(self, latency: float, timed_out: bool) -> None:
+        self._outcomes.append(timed_out)
+        if not timed_out:
+            self.latency = latency if not self.latency else 0.8 * self.latency + 0.2 * latency
+
+        rss = self._memory()
+        if SCHED_MEMORY_CEILING_MB and rss > SCHED_MEMORY_CEILING_MB:
+            self._decrease(f"memoria {rss:.0f} MB")
+        elif len(self._outcomes) >= min(5, SCHED_WINDOW) and self.timeout_rate > SCHED_MAX_TIMEOUT_RATE:
+            self._decrease(f"timeout {self.timeout_rate:.0%}")
+        elif self.latency > SCHED_TARGET_LATENCY:
+            self._decrease(f"latenza {self.latency:.1f}s")
+        elif self.waiting or self.in_flight + 1 >= int(self.limit):
+            # Si cresce solo se il limite era davvero il collo di bottiglia, e con margine di memoria
+            if not SCHED_MEMORY_CEILING_MB or rss < SCHED_MEMORY_CEILING_MB * 0.85:
+                self._increase()
+
+    def _increase(self) -> None:
+        before = int(self.limit)
+        self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+        if int(self.limit) > before:
+            self.increases += 1
+            self.last_reason = "carico"
+            logger.debug(f"📈 Concorrenza pagine {before} -> {int(self.limit)}")
+
+    def _decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < SCHED_COOLDOWN:
+            return
+        before = int(self.limit)
+        self.limit = max(float(self.minimum), self.limit * SCHED_DECREASE_FACTOR)
+        self._last_decrease = now
+        # Finestra nuova: i timeout di prima non devono causare altri tagli
+        self._outcomes.clear()
+        if int(self.limit) < before:
+            self.decreases += 1
+            self.last_reason = reason
+            logger.info(f"📉 Concorrenza pagine {before} -> {int(self.limit)} ({reason})")
+
+    def stats(self) -> Dict:
+        return {
+            "limit": int(self.limit),
+            "min": self.minimum,
+            "max": self.maximum,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "latency_s": round(self.latency, 2),
+            "timeout_rate": round(self.timeout_rate, 3),
+            "rss_mb": round(self.rss_mb, 1),
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "last_reason": self.last_reason,
+        }
+
+
+# ---------------- LIMITI PER HOST ----------------
+class _HostState:
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+        self.next_slot = 0.0
+        self.users = 0
+
+
+class HostLimiter:
+    # Più landing sullo stesso dominio: al massimo HOST_MAX_CONCURRENCY insieme e HOST_MAX_RATE al secondo
+    def __init__(self, concurrency: int = HOST_MAX_CONCURRENCY, rate: float = HOST_MAX_RATE):
+        self.concurrency = concurrency
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self.waits = 0          # richieste che hanno trovato l'host già al limite di concorrenza
+        self.delayed = 0        # richieste rallentate dal limite di rate
+        self._hosts: Dict[str, _HostState] = {}
+
+    @staticmethod
+    def host_key(url: str) -> str:
+        host = (urlparse(url).hostname or "").lower()
+        return host[4:] if host.startswith("www.") else host
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for host in [h for h, s in self._hosts.items() if not s.users and s.next_slot <= now]:
+            del self._hosts[host]
+
+    async def acquire(self, host: str) -> None:
+        state = self._hosts.get(host)
+        if state is None:
+            if len(self._hosts) >= HOST_TABLE_MAX:
+                self._prune()
+            state = self._hosts[host] = _HostState(self.concurrency)
+        state.users += 1
+        try:
+            if state.semaphore is not None:
+                if state.semaphore.locked():
+                    self.waits += 1
+                await state.semaphore.acquire()
+            if self.interval:
+                try:
+                    now = time.monotonic()
+                    start = max(now, state.next_slot)
+                    state.next_slot = start + self.interval
+                    if start > now:
+                        self.delayed += 1
+                        await asyncio.sleep(start - now)
+                except BaseException:
+                    if state.semaphore is not None:
+                        state.semaphore.release()
+                    raise
+        except BaseException:
+            state.users -= 1
+            raise
+
+    def release(self, host: str) -> None:
+        state = self._hosts.get(host)
+        if state is None:
+            return
+        if state.semaphore is not None:
+            state.semaphore.release()
+        state.users -= 1
+        if not state.users and state.next_slot <= time.monotonic():
+            del self._hosts[host]
+
+    def stats(self) -> Dict:
+        return {
+            "max_per_host": self.concurrency,
+            "max_rate_per_host": round(1 / self.interval, 2) if self.interval else 0,
+            "hosts": len(self._hosts),
+            "busy_hosts": sum(1 for s in self._hosts.values() if s.users),
+            "waits": self.waits,
+            "delayed": self.delayed,
+        }
+
+
+# ---------------- SCHEDULER ----------------
+@dataclass
+class SlotOutcome:
+    timed_out: bool = False
+    measured: bool = True       # False = non conta per latenza e timeout (es. shutdown)
+
+
+class Scheduler:
+    def __init__(self, initial: int, memory_probe: Optional[Callable[[], float]] = None):
+        if ADAPTIVE_CONCURRENCY:
+            self.pages = AdaptiveLimiter(initial, memory_probe=memory_probe)
+        else:
+            # Vecchio comportamento: limite fisso
+            self.pages = AdaptiveLimiter(initial, minimum=initial, maximum=initial, memory_probe=memory_probe)
+        self.hosts = HostLimiter()
+
+    @property
+    def max_pages(self) -> int:
+        return self.pages.maximum
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[SlotOutcome]:
+        # Prima l'host, poi il posto globale: chi aspetta un dominio non occupa capacità
+        host = HostLimiter.host_key(url)
+        await self.hosts.acquire(host)
+        try:
+            await self.pages.acquire()
+            outcome = SlotOutcome()
+            started = time.monotonic()
+            try:
+                yield outcome
+            except BaseException:
+                outcome.measured = False
+                raise
+            finally:
+                latency = time.monotonic() - started if outcome.measured else None
+                self.pages.release(latency, outcome.timed_out)
+        finally:
+            self.hosts.release(host)
+
+    def stats(self) -> Dict:
+        return {**self.pages.stats(), "hosts": self.hosts.stats()}
+
+
+# Uno per event loop, come il fetcher HTTP: i limiti valgono per tutte le run sul loop
+_schedulers: Dict[asyncio.AbstractEventLoop, Scheduler] = {}
+
+
+def get_scheduler(initial: int, memory_probe: Optional[Callable[[], float]] = None) -> Scheduler:
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        scheduler = _schedulers[loop] = Scheduler(initial, memory_probe)
+    return scheduler
+
+
+def drop_scheduler() -> None:
+    _schedulers.pop(asyncio.get_running_loop(), None)
+
+
+def scheduler_stats(loop: Optional[asyncio.AbstractEventLoop]) -> Optional[Dict]:
+    scheduler = _schedulers.get(loop) if loop is not None else None
+    return scheduler.stats() if scheduler is not None else None
+
+
+def scheduler_gauges(loop: Optional[asyncio.AbstractEventLoop]) -> Optional[Dict[str, int]]:
+    # Solo gli interi del limite adattivo: si leggono da un altro thread (scrape di /metrics) senza
+    # passare dal loop, a differenza di stats() che scorre la tabella degli host mentre il loop la modifica
+    scheduler = _schedulers.get(loop) if loop is not None else None
+    if scheduler is None:
+        return None
+    pages = scheduler.pages
+    return {"in_flight": pages.in_flight, "waiting": pages.waiting, "limit": int(pages.limit)}
@@ -0,0 +1,161 @@
+import os
+import re
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# ---------------- CONFIG ----------------
+LEXICON_PATH = os.getenv("LEXICON_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicon.json"))
+MATCH_MODES = ("word", "prefix")
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+# ---------------- LESSICO ----------------
+@dataclass(frozen=True)
+class Term:
+    text: str
+    tokens: Tuple[str, ...]
+    group: str
+    weight: float
+    match: str       # word = parola intera | prefix = la parola inizia col termine (es. "scopri" -> "scoprite")
+
+
+@dataclass
+class CopyScore:
+    label: str
+    score: float
+    counts: Dict[str, int]
+    matches: List[str] = field(default_factory=list)
+
+
+class CopyScorer:
+    # Il lessico viene compilato una volta in un indice per primo token: lo scoring
+    # tokenizza il testo in un'unica passata e fa lookup O(1) per parola, quindi il
+    # costo non cresce col numero di termini (a differenza di un `in` per keyword).
+    def __init__(self, terms: Iterable[Term]):
+        self.terms = list(terms)
+        self._exact: Dict[str, List[Term]] = {}
+        self._prefix: Dict[str, List[Term]] = {}
+        for term in self.terms:
+            index = self._prefix if term.match == "prefix" else self._exact
+            index.setdefault(term.tokens[0], []).append(term)
+        self._prefix_lengths = sorted({len(k) for k in self._prefix})
+        self.groups = sorted({t.group for t in self.terms})
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "CopyScorer":
+        default_match = config.get("match", "word")
+        terms = []
+        for group, spec in config.get("groups", {}).items():
+            group_weight = float(spec.get("weight", 1))
+            for raw in spec.get("terms", []):
+                if isinstance(raw, str):
+                    raw = {"term": raw}
+                text = raw["term"].lower().strip()
+                tokens = tuple(TOKEN_RE.findall(text))
+                match = raw.get("match", spec.get("match", default_match))
+                if not tokens:
+                    continue
+                if match not in MATCH_MODES:
+                    raise ValueError(f"Modalità di match non valida per '{text}': {match}")
+                terms.append(Term(text, tokens, group, float(raw.get("weight", group_weight)), match))
+        return cls(terms)
+
+    @classmethod
+    def from_file(cls, path: str = LEXICON_PATH) -> "CopyScorer":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_config(json.load(f))
+
+    def _candidates(self, token: str) -> Iterable[Term]:
+        exact = self._exact.get(token)
+        if exact:
+            yield from exact
+        for length in self._prefix_lengths:
+            if length > len(token):
+                break
+            hits = self._prefix.get(token[:length])
+            if hits:
+                yield from hits
+
+    @staticmethod
+    def _tail_matches(term: Term, tokens: List[str], i: int) -> bool:
+        if i + len(term.tokens) > len(tokens):
+            return False
+        for offset, part in enumerate(term.tokens[1:], start=1):
+            token = tokens[i + offset]
+            if not (token.startswith(part) if term.match == "prefix" else token == part):
+                return False
+        return True
+
+    def find_terms(self, text: str) -> List[Term]:
+        tokens = TOKEN_RE.findall(text.lower())
+        found: Dict[str, Term] = {}
+        multi_starts = set()
+        # I termini di una parola dipendono solo dalle parole distinte del testo
+        for token in set(tokens):
+            for term in self._candidates(token):
+                if len(term.tokens) == 1:
+                    found.setdefault(term.text, term)
+                else:
+                    multi_starts.add(token)
+        # Solo le frasi richiedono di guardare le posizioni
+        if multi_starts:
+            for i, token in enumerate(tokens):
+                if token not in multi_starts:
+                    continue
+                for term in self._candidates(token):
+                    if len(term.tokens) > 1 and term.text not in found and self._tail_matches(term, tokens, i):
+                        found[term.text] = term
+        return list(found.values())
+
+    def score(self, text: str) -> CopyScore:
+        # Ogni termine conta una volta sola per pagina, come nel conteggio originale
+        found = self.find_terms(text)
+        counts = {group: 0 for group in self.groups}
+        total = 0.0
+        for term in found:
+            counts[term.group] = counts.get(term.group, 0) + 1
+            total += term.weight
+        return CopyScore(label=copy_label(counts), score=round(total, 2), counts=counts,
+                         matches=sorted(t.text for t in found))
+
+    def score_many(self, texts: Iterable[str]) -> List[CopyScore]:
+        return [self.score(text) for text in texts]
+
+
+# ---------------- ETICHETTE ----------------
+def copy_label(counts: Dict[str, int]) -> str:
+    strong_count = counts.get("strong", 0)
+    medium_count = counts.get("medium", 0)
+    weak_count = counts.get("weak", 0)
+
+    if strong_count >= 3:
+        return "Copy molto interessante (alto incentivo)"
+    elif strong_count >= 2 or (strong_count >= 1 and medium_count >= 2):
+        return "Copy molto interessante"
+    elif strong_count >= 1 or medium_count >= 2:
+        return "Copy interessante"
+    elif medium_count >= 1 or weak_count >= 2:
+        return "Copy discreto"
+    return "Copy standard"
+
+
+# Compilato al primo uso (in pratica all'avvio del worker) e poi riusato
+_scorer: Optional[CopyScorer] = None
+
+
+def get_scorer() -> CopyScorer:
+    global _scorer
+    if _scorer is None:
+        _scorer = CopyScorer.from_file()
+    return _scorer
+
+
+def score_copy(text: str) -> CopyScore:
+    return get_scorer().score(text)
+
+
+def score_many(texts: Iterable[str]) -> List[CopyScore]:
+    return get_scorer().score_many(texts)
@@ -1,14 +1,96 @@
 #---------- LIBRARYS ----------
 
-from flask import Flask, send_file, request, jsonify, redirect, render_template
-from aut import get_real_leads
-import asyncio
+from flask import Flask, Response, send_file, request, jsonify, redirect, render_template, stream_with_context
+from aut import (start_browser_pool, pool_health, scheduler_health, logger, RUN_DEADLINE,
+                 TIER_STATS, DISCOVERY_STATS, STAGE_STATS, LANDING_STATS)
+from jobs import submit_job, get_job, run_leads, JobPending, WORKER_MODE
+from jobqueue import job_queue
+from cache import landing_cache
+from scoring import get_scorer
+from resolver import SHORTLINK_STATS
+from metrics import registry, CONTENT_TYPE
+from blocking import policy as block_policy
+from leadstore import lead_store, LEADS_PAGE_SIZE
+import json
+import os
 
 
 #---------- VARIABLES ----------
 
 app = Flask(__name__)
 
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "100"))
+# Tetto alla scadenza delle richieste sincrone: sotto il --timeout di gunicorn (600 s)
+SYNC_DEADLINE_MAX = float(os.getenv("SYNC_DEADLINE_MAX_S", "570"))
+
+# Lessico del copy compilato una volta all'avvio (errori di config emergono subito)
+get_scorer()
+
+# Il pool di browser parte al boot del worker e resta vivo tra le richieste.
+# In modalità queue il web non apre browser: accoda e legge i risultati di worker.py
+if WORKER_MODE == "inline" and os.getenv("BROWSER_POOL_ENABLED", "1") == "1":
+    try:
+        start_browser_pool()
+    except Exception as e:
+        logger.error(f"❌ Avvio browser pool fallito, uso browser per richiesta: {e}")
+
+# In modalità queue le metriche di scraping le espongono i worker (WORKER_METRICS_PORT): qui la coda
+if WORKER_MODE == "queue":
+    registry.gauge("leadgen_queue_jobs", "Job nella coda SQLite per stato",
+                   lambda: {("status", status): count for status, count in job_queue.stats().items()})
+
+
+#---------- HELPERS ----------
+
+# Liste dal JSON: array di stringhe oppure stringa separata da virgole/a capo
+def parse_list(value):
+    if isinstance(value, str):
+        value = value.replace("\n", ",").split(",")
+    return [v.strip() for v in (value or []) if isinstance(v, str) and v.strip()]
+
+
+# deadline_s dal JSON: secondi > 0, None se assente (vale RUN_DEADLINE_S); ValueError se non valido
+def parse_deadline(data, cap=None):
+    value = data.get("deadline_s")
+    if value is None:
+        return None if cap is None else min(RUN_DEADLINE or cap, cap)
+    deadline = float(value)
+    if not deadline > 0:
+        raise ValueError(deadline)
+    return deadline if cap is None else min(deadline, cap)
+
+
+# In modalità incrementale anche "nessuna lead nuova" è una risposta valida.
+# partial/stages: la run è scaduta o una discovery è fallita, le lead sono quelle raccolte
+def leads_response(leads, outcome, incremental):
+    extra = {"partial": outcome["partial"], "stages": outcome["stages"]}
+    if incremental:
+        return jsonify({"message": leads, "unchanged": outcome["unchanged"], **extra})
+    if len(leads) > 0:
+        return jsonify({"message": leads, **extra})
+    return jsonify({"error": "Mi dispiace ma non ho trovato nulla", **extra})
+
+
+def job_accepted(job_id):
+    return jsonify({
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}",
+        "events_url": f"/jobs/{job_id}/events"
+    }), 202
+
+
+# Richiesta sincrona. In coda l'attesa ha il tetto SYNC_DEADLINE_MAX (attesa in coda compresa):
+# se il job non finisce in tempo si risponde 202 con il job, che prosegue sul worker.
+# Inline la run è già limitata dalla sua deadline.
+def sync_leads(query, incremental, **options):
+    timeout = SYNC_DEADLINE_MAX if WORKER_MODE == "queue" else None
+    try:
+        leads, outcome = run_leads(query, incremental=incremental, timeout=timeout, **options)
+    except JobPending as e:
+        logger.info(f"⏳ Job {e.job_id} oltre il tempo della richiesta: risposta 202")
+        return job_accepted(e.job_id)
+    return leads_response(leads, outcome, incremental)
+
 
 #---------- GET PAGE ----------
 
@@ -23,12 +105,148 @@ def get_index():
 def add_leads():
     data = request.json
     query = data.get("query")
-    leads = asyncio.run(get_real_leads(query))
+    use_cache = not data.get("no_cache", False)
+    incremental = bool(data.get("incremental", False))
+    try:
+        deadline_s = parse_deadline(data, SYNC_DEADLINE_MAX)
+    except (TypeError, ValueError):
+        return jsonify({"error": "deadline_s deve essere un numero di secondi > 0"}), 400
+    return sync_leads(query, incremental, use_cache=use_cache, deadline_s=deadline_s)
 
-    if len(leads) > 0:
-        return jsonify({"message": leads})
-    else:
-        return jsonify({"error": "Mi dispiace ma non ho trovato nulla"})
+
+@app.route("/add_leads_batch", methods=["POST"])
+def add_leads_batch():
+    data = request.json or {}
+    queries = parse_list(data.get("queries"))
+    if not queries:
+        return jsonify({"error": "Nessuna query"}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({"error": f"Massimo {MAX_BATCH_QUERIES} query per batch"}), 400
+
+    countries = parse_list(data.get("countries")) or None
+    use_cache = not data.get("no_cache", False)
+    incremental = bool(data.get("incremental", False))
+    try:
+        deadline_s = parse_deadline(data, SYNC_DEADLINE_MAX)
+    except (TypeError, ValueError):
+        return jsonify({"error": "deadline_s deve essere un numero di secondi > 0"}), 400
+    return sync_leads(", ".join(queries), incremental, use_cache=use_cache, queries=queries, countries=countries,
+                      deadline_s=deadline_s)
+
+
+#---------- JOBS ----------
+
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    data = request.json or {}
+    query = (data.get("query") or "").strip()
+    queries = parse_list(data.get("queries"))
+    if not query and not queries:
+        return jsonify({"error": "Query mancante"}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({"error": f"Massimo {MAX_BATCH_QUERIES} query per batch"}), 400
+    try:
+        deadline_s = parse_deadline(data)
+    except (TypeError, ValueError):
+        return jsonify({"error": "deadline_s deve essere un numero di secondi > 0"}), 400
+
+    job = submit_job(query or ", ".join(queries), use_cache=not data.get("no_cache", False),
+                     queries=queries or None, countries=parse_list(data.get("countries")) or None,
+                     trace=bool(data.get("trace", False)), incremental=bool(data.get("incremental", False)),
+                     deadline_s=deadline_s)
+    return job_accepted(job.id)
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job non trovato"}), 404
+    return jsonify(job.snapshot())
+
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job non trovato"}), 404
+
+    # Ripresa dopo riconnessione: EventSource manda Last-Event-ID, i client NDJSON ?since=
+    since = request.headers.get("Last-Event-ID", request.args.get("since", "-1"))
+    start = int(since) + 1 if since.lstrip("-").isdigit() else 0
+    ndjson = request.args.get("format") == "ndjson"
+
+    def generate():
+        cursor = start
+        while True:
+            # finished letto prima: se era già finito, gli eventi letti dopo sono tutti
+            finished = job.finished
+            events = job.wait_events(cursor)
+            for seq, event, data in events:
+                if ndjson:
+                    yield json.dumps({"id": seq, "event": event, **data}) + "\n"
+                else:
+                    yield f"id: {seq}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+                cursor = seq + 1
+            if not events and not ndjson:
+                yield ": keep-alive\n\n"
+            if finished and not events:
+                return
+
+    mimetype = "application/x-ndjson" if ndjson else "text/event-stream"
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+#---------- LEADS ----------
+
+LEAD_FILTERS = ("domain", "email", "phone", "ad_id", "status", "query", "country")
+
+
+def lead_filters():
+    return {key: request.args.get(key) for key in LEAD_FILTERS if request.args.get(key)}
+
+
+@app.route("/leads", methods=["GET"])
+def list_leads():
+    # Paginazione a cursore: next_cursor della risposta va passato come ?cursor= alla successiva
+    try:
+        cursor = int(request.args.get("cursor", "0"))
+        limit = int(request.args.get("limit", str(LEADS_PAGE_SIZE)))
+    except ValueError:
+        return jsonify({"error": "cursor e limit devono essere interi"}), 400
+    return jsonify(lead_store.page(cursor, limit, **lead_filters()))
+
+
+@app.route("/leads/export", methods=["GET"])
+def export_leads():
+    fmt = request.args.get("format", "csv")
+    if fmt not in ("csv", "jsonl"):
+        return jsonify({"error": "Formato non supportato (csv | jsonl)"}), 400
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return Response(stream_with_context(lead_store.export(fmt, **lead_filters())), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename=leads.{fmt}",
+                             "X-Accel-Buffering": "no"})
+
+
+#---------- HEALTH ----------
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    if WORKER_MODE == "queue":
+        # Browser e statistiche di scraping vivono nei processi worker
+        return jsonify({"mode": "queue", "queue": job_queue.stats(), "landing_cache": landing_cache.stats(),
+                        "leads": lead_store.stats()})
+    return jsonify({**pool_health(), "landing_cache": landing_cache.stats(), "tiers": TIER_STATS,
+                    "discovery": DISCOVERY_STATS, "shortlinks": SHORTLINK_STATS,
+                    "stages": STAGE_STATS, "landing": LANDING_STATS,
+                    "scheduler": scheduler_health(), "blocking": block_policy.stats(),
+                    "leads": lead_store.stats()})
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(registry.render(), content_type=CONTENT_TYPE)
 
 
 #---------- START SERVER ----------
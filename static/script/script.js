@@ -20,7 +20,26 @@ search.addEventListener("click", function() {
         </div>
     `;
 
-    fetch("/add_leads", {
+    let leadCount = 0;
+    let landingTotal = 0;
+
+    function finish(message) {
+        search.disabled = false;
+        search.classList.remove('loading');
+        if (leadCount === 0) {
+            output.innerHTML = `<div class="empty-state">${message || 'Mi dispiace ma non ho trovato nulla'}</div>`;
+        } else {
+            const loading = output.querySelector('.loading-state');
+            if (loading) loading.remove();
+        }
+    }
+
+    function setProgress(text) {
+        const p = output.querySelector('.loading-state p');
+        if (p) p.textContent = text;
+    }
+
+    fetch("/jobs", {
         method: "POST",
         headers: {
             "Content-Type": "application/json"
@@ -28,65 +47,53 @@ search.addEventListener("click", function() {
         body: JSON.stringify({ "query": query.value })
     })
     .then(response => response.json())
-    .then(data => {
-        // Reset button
-        search.disabled = false;
-        search.classList.remove('loading');
+    .then(job => {
+        if (job.error) {
+            finish(job.error);
+            return;
+        }
 
-        if (data.error) {
-            output.innerHTML = `<div class="empty-state">${data.error}</div>`;
-        } else {
-            // Clear container
-            output.innerHTML = '';
+        // I lead arrivano uno alla volta appena la landing è stata analizzata
+        const events = new EventSource(job.events_url);
 
-            // Create cards
-            data.message.forEach((lead, i) => {
-                const card = document.createElement('div');
-                card.className = 'lead-card';
-                
-                // Determina classe badge
-                let badgeClass = '';
-                if (lead.copy_valutazione && lead.copy_valutazione.includes('molto interessante')) {
-                    badgeClass = 'very-interesting';
-                } else if (lead.copy_valutazione && lead.copy_valutazione.includes('interessante')) {
-                    badgeClass = 'interesting';
-                }
-                
-                // Check contatti
-                const hasEmail = lead.email && lead.email !== 'Non trovata';
-                const hasPhone = lead.telefono && lead.telefono !== 'Non trovato';
-                
-                card.innerHTML = `
-                    <h3>Lead #${i + 1}</h3>
-                    <div class="lead-info">
-                        <div class="lead-info-item">
-                            <strong>📢 Link Ads</strong>
-                            ${lead.ad_link && lead.ad_link !== 'Non disponibile' 
-                                ? `<a href="${lead.ad_link}" target="_blank" class="ad-link">${lead.ad_link}</a>`
-                                : '<span class="not-found">Non disponibile</span>'
-                            }
-                        </div>
-                        <div class="lead-info-item">
-                            <strong>🌐 Landing page</strong>
-                            <a href="${lead.landing_page}" target="_blank">${lead.landing_page}</a>
-                        </div>
-                        <div class="lead-info-item">
-                            <strong>📧 Email</strong>
-                            <span class="${hasEmail ? '' : 'not-found'}">${lead.email || 'Non trovata'}</span>
-                        </div>
-                        <div class="lead-info-item">
-                            <strong>📞 Telefono</strong>
-                            <span class="${hasPhone ? '' : 'not-found'}">${lead.telefono || 'Non trovato'}</span>
-                        </div>
-                        <div class="lead-info-item">
-                            <strong>✍️ Valutazione copy</strong>
-                            <span class="copy-badge ${badgeClass}">${lead.copy_valutazione || 'N/A'}</span>
-                        </div>
-                    </div>
-                `;
-                output.appendChild(card);
-            });
-        }
+        events.addEventListener('scroll', e => {
+            const d = JSON.parse(e.data);
+            setProgress(`Scroll annunci ${d.step}/${d.total}`);
+        });
+        events.addEventListener('extraction', e => {
+            const d = JSON.parse(e.data);
+            setProgress(`Trovati ${d.links} link negli annunci`);
+        });
+        events.addEventListener('shortlink', () => setProgress('Risoluzione link abbreviati...'));
+        events.addEventListener('stage', e => {
+            const d = JSON.parse(e.data);
+            // Con la pipeline i lead arrivano già durante lo scroll: qui la discovery è finita
+            if (d.stage === 'scraping') {
+                landingTotal = d.total;
+                setProgress(`Analisi landing ${leadCount}/${landingTotal}...`);
+            }
+        });
+        events.addEventListener('lead', e => {
+            const lead = JSON.parse(e.data).lead;
+            if (leadCount === 0) {
+                output.querySelectorAll('.empty-state, .error-state').forEach(el => el.remove());
+            }
+            leadCount++;
+            const loading = output.querySelector('.loading-state');
+            output.insertBefore(createCard(lead, leadCount), loading);
+            if (landingTotal) setProgress(`Analisi landing ${leadCount}/${landingTotal}...`);
+        });
+        events.addEventListener('done', () => {
+            events.close();
+            finish();
+        });
+        events.addEventListener('error', e => {
+            // Errore del job (evento con dati) oppure connessione persa: EventSource riprova da solo
+            if (e.data) {
+                events.close();
+                finish(`❌ Errore: ${JSON.parse(e.data).error}`);
+            }
+        });
     })
     .catch(err => {
         search.disabled = false;
@@ -95,6 +102,53 @@ search.addEventListener("click", function() {
     });
 });
 
+function createCard(lead, n) {
+    const card = document.createElement('div');
+    card.className = 'lead-card';
+
+    // Determina classe badge
+    let badgeClass = '';
+    if (lead.copy_valutazione && lead.copy_valutazione.includes('molto interessante')) {
+        badgeClass = 'very-interesting';
+    } else if (lead.copy_valutazione && lead.copy_valutazione.includes('interessante')) {
+        badgeClass = 'interesting';
+    }
+
+    // Check contatti
+    const hasEmail = lead.email && lead.email !== 'Non trovata';
+    const hasPhone = lead.telefono && lead.telefono !== 'Non trovato';
+
+    card.innerHTML = `
+        <h3>Lead #${n}</h3>
+        <div class="lead-info">
+            <div class="lead-info-item">
+                <strong>📢 Link Ads</strong>
+                ${lead.ad_link && lead.ad_link !== 'Non disponibile' 
+                    ? `<a href="${lead.ad_link}" target="_blank" class="ad-link">${lead.ad_link}</a>`
+                    : '<span class="not-found">Non disponibile</span>'
+                }
+            </div>
+            <div class="lead-info-item">
+                <strong>🌐 Landing page</strong>
+                <a href="${lead.landing_page}" target="_blank">${lead.landing_page}</a>
+            </div>
+            <div class="lead-info-item">
+                <strong>📧 Email</strong>
+                <span class="${hasEmail ? '' : 'not-found'}">${lead.email || 'Non trovata'}</span>
+            </div>
+            <div class="lead-info-item">
+                <strong>📞 Telefono</strong>
+                <span class="${hasPhone ? '' : 'not-found'}">${lead.telefono || 'Non trovato'}</span>
+            </div>
+            <div class="lead-info-item">
+                <strong>✍️ Valutazione copy</strong>
+                <span class="copy-badge ${badgeClass}">${lead.copy_valutazione || 'N/A'}</span>
+            </div>
+        </div>
+    `;
+    return card;
+}
+
 // Enter key support
 query.addEventListener('keypress', function(e) {
     if (e.key === 'Enter' && !search.disabled) {
@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# I moduli leggono la config dall'ambiente all'import: database in una cartella temporanea
+# e nessun browser pool (i test coprono solo le parti in Python puro, niente Chromium)
+_data_dir = tempfile.mkdtemp(prefix="leadgen-tests-")
+os.environ.setdefault("BROWSER_POOL_ENABLED", "0")
+os.environ.setdefault("WORKER_MODE", "inline")
+os.environ.setdefault("CACHE_DB_PATH", os.path.join(_data_dir, "cache.sqlite"))
+os.environ.setdefault("LEAD_DB_PATH", os.path.join(_data_dir, "leads.sqlite"))
+os.environ.setdefault("QUEUE_DB_PATH", os.path.join(_data_dir, "queue.sqlite"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,67 @@
+import json
+import os
+
+import pytest
+
+from adsnetwork import AdsCollector, iter_json_documents, parse_ads, replay
+
+AD_URL_BASE = "https://www.facebook.com/ads/library/"
+# Due risposte GraphQL della Ads Library nel formato di ADS_CAPTURE_DIR: la prima con il
+# prefisso "for (;;);" e un secondo documento @defer, la seconda con un annuncio già visto
+CAPTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "ads_graphql_capture.jsonl")
+
+
+@pytest.fixture
+def bodies():
+    with open(CAPTURE, encoding="utf-8") as f:
+        return [json.loads(line)["body"] for line in f if line.strip()]
+
+
+def test_prefix_and_multiple_documents(bodies):
+    docs = list(iter_json_documents(bodies[0]))
+    assert len(docs) == 2
+    assert docs[1]["label"].endswith("$defer$results")
+
+
+def test_parse_ads_links_and_cards(bodies):
+    items = parse_ads(bodies[0], AD_URL_BASE)
+    assert [(i["ad_id"], i["landing"]) for i in items] == [
+        ("1184733290017541", "https://www.scuolainglese.it/corso-gratis?utm_source=fb"),
+        # Carosello: un link per card, senza ripetizioni
+        ("912330045126778", "https://palestrafit.it/prova"),
+        ("912330045126778", "https://palestrafit.it/abbonamenti"),
+        ("770021884413902", "https://studiorossi.it/igiene-dentale"),
+    ]
+    assert items[0]["ad_url"] == AD_URL_BASE + "?id=1184733290017541"
+    assert items[0]["page_name"] == "Scuola Inglese Milano"
+
+
+def test_collector_dedupes_across_responses(bodies):
+    seen = []
+    collector = AdsCollector(AD_URL_BASE, on_items=seen.extend)
+    assert collector.feed(bodies[0]) == 4
+    assert collector.feed(bodies[1]) == 1
+    assert collector.feed(bodies[1]) == 0
+    assert collector.responses == 3
+    assert len(collector.ads) == 4
+    assert seen[-1] == {"landing": "https://yogastudio.it/", "ad_url": AD_URL_BASE + "?id=655401239987120",
+                        "ad_id": "655401239987120", "page_name": "Yoga Studio"}
+
+
+def test_replay_matches_live_parsing():
+    collector = replay([CAPTURE])
+    assert len(collector.items) == 5
+    assert len(collector.ads) == 4
+
+
+def test_truncated_document_is_skipped(bodies):
+    # Risposta interrotta a metà del secondo documento: resta il primo
+    body = bodies[0][:len(bodies[0]) - 40]
+    assert len(list(iter_json_documents(body))) == 1
+    assert {i["ad_id"] for i in parse_ads(body, AD_URL_BASE)} == {"1184733290017541", "912330045126778"}
+
+
+@pytest.mark.parametrize("body", ["", "for (;;);", "<html>Errore</html>", "for (;;);{\"data\": [", "null"])
+def test_malformed_bodies(body):
+    assert parse_ads(body, AD_URL_BASE) == []
+    assert AdsCollector(AD_URL_BASE).feed(body) == 0
@@ -0,0 +1,41 @@
+import sqlite3
+import time
+
+from cache import PersistentCache
+
+
+def keys(path, table):
+    return sorted(key for (key,) in sqlite3.connect(path).execute(f"SELECT key FROM {table}"))
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = PersistentCache("landing", path, memory_items=1)
+    cache.put("a", {"email": "info@a.it"}, 60)
+    cache.put("b", {"email": None}, 60)
+    assert cache.get("b") == {"email": None}
+    # "a" è uscita dall'LRU ma resta su disco
+    assert cache.get("a") == {"email": "info@a.it"}
+    assert cache.get("c") is None
+    stats = cache.stats()
+    assert (stats["hits_memory"], stats["hits_disk"], stats["misses"]) == (1, 1, 1)
+
+
+def test_expired_entries_are_purged(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = PersistentCache("landing", path, purge_every=3, max_rows=0)
+    cache.put("old", {}, 0.01)
+    time.sleep(0.02)
+    assert cache.get("old") is None
+    cache.put("a", {}, 60)
+    assert keys(path, "landing") == ["a", "old"]
+    cache.put("b", {}, 60)          # terza scrittura: pulizia
+    assert keys(path, "landing") == ["a", "b"]
+
+
+def test_row_cap_drops_earliest_expiry(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = PersistentCache("landing", path, purge_every=4, max_rows=2)
+    for i, ttl in enumerate((300, 100, 400, 200)):
+        cache.put(f"k{i}", {}, ttl)
+    assert keys(path, "landing") == ["k0", "k2"]
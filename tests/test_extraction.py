@@ -0,0 +1,40 @@
+from extraction import extract_candidates, extract_contacts, validate_email, validate_phone
+
+
+def test_email_validation():
+    assert validate_email("info@studio-rossi.it")
+    assert not validate_email("noreply@studio-rossi.it")
+    assert not validate_email("nome@example.com")
+    assert not validate_email("a...b@studio.it")
+
+
+def test_phone_validation():
+    assert validate_phone("+39 333 1234567")
+    assert validate_phone("02 12345678")
+    assert not validate_phone("333")
+    assert not validate_phone("1111111111")
+    assert not validate_phone("123456789")
+
+
+def test_first_valid_contacts_in_priority_order():
+    html = '<a href="mailto:noreply@sito.it">x</a> <p>scrivi a info@sito.it</p>'
+    text = "Chiamaci allo 02 1234 5678 oppure +39 333 1234567"
+    email, phone = extract_contacts(html, text, "")
+    assert email == "info@sito.it"
+    # +39 è il pattern con priorità più alta anche se compare dopo
+    assert phone == "+39 333 1234567"
+
+
+def test_tel_link_is_fallback():
+    email, phone = extract_contacts("", "", "tel:+393331234567")
+    assert email is None
+    assert phone == "+393331234567"
+
+
+def test_candidates_report_source():
+    candidates = extract_candidates('<a href="mailto:info@sito.it">', "", "")
+    assert [(c.kind, c.value, c.source) for c in candidates] == [("email", "info@sito.it", "mailto")]
+
+
+def test_nothing_found():
+    assert extract_contacts("<p>nessun recapito</p>", "nessun recapito", "") == (None, None)
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+import jobqueue
+from jobqueue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "queue.sqlite"))
+
+
+def lead_event(landing):
+    return {"lead": {"landing_page": landing}}
+
+
+def test_claim_in_order_and_once(queue):
+    first = queue.enqueue({"query": "a"})
+    second = queue.enqueue({"query": "b"})
+    assert queue.claim("w1") == (first, {"query": "a"}, 1)
+    assert queue.claim("w2") == (second, {"query": "b"}, 1)
+    assert queue.claim("w3") is None
+    assert queue.stats() == {"running": 2}
+
+
+def test_expired_lease_is_requeued(queue):
+    job_id = queue.enqueue({"query": "a"})
+    queue.claim("w1", lease=0)
+    time.sleep(0.01)
+    assert queue.claim("w2") == (job_id, {"query": "a"}, 2)
+    assert queue.get(job_id)["worker"] == "w2"
+    # Il vecchio worker non può più chiudere il job
+    assert not queue.finish(job_id, "w1", "done", leads=[])
+    assert queue.finish(job_id, "w2", "done", leads=[{"landing_page": "x"}], total=1)
+    assert queue.get(job_id)["result"] == [{"landing_page": "x"}]
+
+
+def test_too_many_attempts(queue, monkeypatch):
+    monkeypatch.setattr(jobqueue, "QUEUE_MAX_ATTEMPTS", 1)
+    job_id = queue.enqueue({"query": "a"})
+    queue.claim("w1", lease=0)
+    time.sleep(0.01)
+    assert queue.claim("w2") is None
+    assert queue.get(job_id)["status"] == "error"
+    assert queue.events(job_id)[-1][1] == "error"
+
+
+def test_release_does_not_use_an_attempt(queue):
+    job_id = queue.enqueue({"query": "a"})
+    queue.claim("w1")
+    queue.release(job_id, "w1")
+    assert queue.get(job_id)["status"] == "queued"
+    assert queue.claim("w2") == (job_id, {"query": "a"}, 1)
+
+
+def test_requeued_run_does_not_repeat_events(queue):
+    job_id = queue.enqueue({"query": "a"})
+    queue.claim("w1", lease=0)
+    queue.push_event(job_id, "lead", lead_event("https://a.it/"))
+    queue.push_event(job_id, "incremental", {"unchanged": 3})
+    time.sleep(0.01)
+    queue.claim("w2")
+    queue.push_event(job_id, "lead", lead_event("https://a.it/"))
+    queue.push_event(job_id, "lead", lead_event("https://b.it/"))
+    queue.push_event(job_id, "incremental", {"unchanged": 1})
+
+    latest = queue.events(job_id, latest_run=True)
+    assert [(ev, data) for _, ev, data in latest] == [
+        ("lead", lead_event("https://a.it/")), ("lead", lead_event("https://b.it/")),
+        ("incremental", {"unchanged": 1}),
+    ]
+    # Lo stream tiene la sequenza ma non ripete la lead già emessa dalla prima esecuzione
+    streamed = [data["lead"]["landing_page"] for _, ev, data in queue.stream_events(job_id) if ev == "lead"]
+    assert streamed == ["https://a.it/", "https://b.it/"]
+    assert [seq for seq, _, _ in queue.stream_events(job_id, since=2)] == [2, 4, 5]
@@ -0,0 +1,73 @@
+import pytest
+
+from leadstore import LeadStore, lead_domain, phone_key
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LeadStore(str(tmp_path / "leads.sqlite"))
+
+
+def lead(landing, status="success", **fields):
+    return {"landing_page": landing, "ad_link": "https://www.facebook.com/ads/library/?id=123",
+            "email": None, "telefono": None, "copy_valutazione": None, "status": status, **fields}
+
+
+def test_keys():
+    assert lead_domain("https://www.Esempio.it/promo") == "esempio.it"
+    assert phone_key("+39 333 123 4567") == phone_key("333-1234567") == "331234567"
+    assert phone_key(None) is None
+
+
+def test_upsert_keeps_contacts_on_worse_result(store):
+    store.upsert_many([lead("https://esempio.it/a", email="Info@Esempio.it", telefono="+39 333 1234567")],
+                      match={"query": "corso", "country": "IT"})
+    store.upsert_many([lead("https://esempio.it/a", status="timeout")], match={"query": "corso", "country": "IT"})
+
+    (saved,) = store.page()["leads"]
+    assert saved["email"] == "info@esempio.it"
+    assert saved["telefono"] == "+39 333 1234567"
+    assert saved["status"] == "success"
+    assert saved["scans"] == 2
+    assert saved["matches"] == [{"query": "corso", "country": "IT"}]
+
+
+def test_upsert_skips_cancelled(store):
+    assert store.upsert_many([lead("https://esempio.it/a", status="cancelled")]) == 0
+    assert store.stats()["leads"] == 0
+
+
+def test_keyset_pagination_and_filters(store):
+    store.upsert_many([lead(f"https://sito{i}.it/", email=f"info@sito{i}.it") for i in range(5)],
+                      match={"query": "corso", "country": "IT"})
+    store.upsert_many([lead("https://altro.it/", status="error")], match={"query": "webinar", "country": "ES"})
+
+    first = store.page(limit=2)
+    second = store.page(first["next_cursor"], limit=2)
+    last = store.page(second["next_cursor"], limit=2)
+    pages = first["leads"] + second["leads"] + last["leads"]
+    assert [l["landing_page"] for l in pages] == [f"https://sito{i}.it/" for i in range(5)] + ["https://altro.it/"]
+    assert last["next_cursor"] is None
+
+    assert [l["landing_page"] for l in store.page(domain="www.sito3.it")["leads"]] == ["https://sito3.it/"]
+    assert [l["landing_page"] for l in store.page(country="es")["leads"]] == ["https://altro.it/"]
+    assert len(list(store.iter_leads(batch=2, query="corso"))) == 5
+
+
+def test_seen_only_successful_leads(store):
+    leads = [lead("https://esempio.it/a"), lead("https://esempio.it/b", status="timeout",
+                                                ad_link="https://www.facebook.com/ads/library/?id=456")]
+    assert store.mark_seen("Corso  Inglese", "it", leads) == 2
+    # Stessa ricerca a meno di maiuscole e spazi
+    ads, landings = store.seen("corso inglese", "IT")
+    assert ads == {"123"}
+    assert landings == {"https://esempio.it/a"}
+    assert store.seen("corso inglese", "ES") == (set(), set())
+
+
+def test_export_csv(store):
+    store.upsert_many([lead("https://esempio.it/a", email="info@esempio.it")],
+                      match={"query": "corso", "country": "IT"})
+    lines = "".join(store.export("csv")).splitlines()
+    assert lines[0].startswith("landing_page,ad_link,email")
+    assert "info@esempio.it" in lines[1] and lines[1].endswith("corso,IT")
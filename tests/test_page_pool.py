@@ -0,0 +1,16 @@
+import pytest
+
+from aut import cookie_domains
+
+
+@pytest.mark.parametrize("host, domains", [
+    ("www.esempio.it", ["www.esempio.it", "esempio.it"]),
+    ("Esempio.it.", ["esempio.it"]),
+    ("www.shop.co.uk", ["www.shop.co.uk", "shop.co.uk"]),
+    ("negozio.com.br", ["negozio.com.br"]),
+    ("a.b.com.au", ["a.b.com.au", "b.com.au"]),
+    ("192.168.1.10", ["192.168.1.10"]),
+    ("localhost", ["localhost"]),
+])
+def test_cookie_domains_stop_before_public_suffix(host, domains):
+    assert cookie_domains(host) == domains
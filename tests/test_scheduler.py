@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+import scheduler
+from scheduler import AdaptiveLimiter, HostLimiter
+
+
+@pytest.fixture(autouse=True)
+def no_cooldown(monkeypatch):
+    monkeypatch.setattr(scheduler, "SCHED_COOLDOWN", 0)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_limit_clamped_to_bounds():
+    assert AdaptiveLimiter(50, minimum=2, maximum=6).limit == 6
+    assert AdaptiveLimiter(0, minimum=2, maximum=6).limit == 2
+
+
+def test_additive_increase_only_at_full_load():
+    limiter = AdaptiveLimiter(2, minimum=1, maximum=4)
+
+    async def cycle(pages: int):
+        for _ in range(pages):
+            await limiter.acquire()
+        for _ in range(pages):
+            limiter.release(latency=0.1)
+
+    # Una pagina su due: il limite non era il collo di bottiglia
+    run(cycle(1))
+    assert int(limiter.limit) == 2
+    for _ in range(10):
+        run(cycle(int(limiter.limit)))
+    assert int(limiter.limit) == 4
+    assert limiter.increases == 2
+
+
+def test_multiplicative_decrease_on_latency():
+    limiter = AdaptiveLimiter(8, minimum=1, maximum=8)
+    run(limiter.acquire())
+    limiter.release(latency=scheduler.SCHED_TARGET_LATENCY * 2)
+    assert int(limiter.limit) == 4
+    assert limiter.decreases == 1
+    assert "latenza" in limiter.last_reason
+
+
+def test_decrease_on_timeout_rate_and_floor():
+    limiter = AdaptiveLimiter(4, minimum=2, maximum=8)
+
+    async def timeouts(n: int):
+        for _ in range(n):
+            await limiter.acquire()
+            limiter.release(latency=1, timed_out=True)
+
+    run(timeouts(5))
+    assert int(limiter.limit) == 2
+    # Finestra azzerata dopo il taglio, e comunque mai sotto il minimo
+    run(timeouts(5))
+    assert int(limiter.limit) == 2
+
+
+def test_decrease_on_memory_ceiling(monkeypatch):
+    monkeypatch.setattr(scheduler, "SCHED_MEMORY_CEILING_MB", 100)
+    limiter = AdaptiveLimiter(6, minimum=1, maximum=8, memory_probe=lambda: 150.0)
+    run(limiter.acquire())
+    limiter.release(latency=0.1)
+    assert int(limiter.limit) == 3
+    assert "memoria" in limiter.last_reason
+
+
+def test_waiters_wake_in_order():
+    async def main():
+        limiter = AdaptiveLimiter(1, minimum=1, maximum=1)
+        order = []
+
+        async def worker(i: int):
+            await limiter.acquire()
+            order.append(i)
+            await asyncio.sleep(0)
+            limiter.release()
+
+        await asyncio.gather(*[worker(i) for i in range(3)])
+        return order, limiter.in_flight
+
+    assert run(main()) == ([0, 1, 2], 0)
+
+
+def test_cancelled_waiter_gives_back_its_slot():
+    async def main():
+        limiter = AdaptiveLimiter(1, minimum=1, maximum=1)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release()           # il posto passa al waiter...
+        waiter.cancel()             # ...che viene annullato prima di usarlo
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return limiter.in_flight, limiter.waiting
+
+    assert run(main()) == (0, 0)
+
+
+def test_host_key_ignores_www():
+    assert HostLimiter.host_key("https://WWW.Esempio.it/a") == "esempio.it"
+
+
+def test_host_concurrency_limit():
+    async def main():
+        hosts = HostLimiter(concurrency=1, rate=0)
+        active, peak = 0, 0
+
+        async def visit():
+            nonlocal active, peak
+            await hosts.acquire("esempio.it")
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            hosts.release("esempio.it")
+
+        await asyncio.gather(*[visit() for _ in range(3)])
+        return peak, hosts.waits, hosts.stats()["hosts"]
+
+    assert run(main()) == (1, 2, 0)
+
+
+def test_gauges_readable_without_the_loop():
+    async def main():
+        await scheduler.get_scheduler(3).pages.acquire()
+        return asyncio.get_running_loop()
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(main())
+        assert scheduler.scheduler_gauges(loop) == {"in_flight": 1, "waiting": 0, "limit": 3}
+    finally:
+        scheduler._schedulers.pop(loop, None)
+        loop.close()
+    assert scheduler.scheduler_gauges(None) is None
@@ -0,0 +1,50 @@
+import pytest
+
+from scoring import CopyScorer, copy_label, get_scorer
+
+CONFIG = {
+    "match": "prefix",
+    "groups": {
+        "strong": {"weight": 3, "terms": ["gratis", {"term": "free", "match": "word"}, "lezione di prova"]},
+        "medium": {"weight": 2, "terms": ["corso", "webinar"]},
+        "weak": {"weight": 1, "terms": ["scopri"]},
+    },
+}
+
+
+@pytest.fixture
+def scorer():
+    return CopyScorer.from_config(CONFIG)
+
+
+def test_prefix_and_word_matches(scorer):
+    result = scorer.score("Scoprite il corso GRATIS! Freedom non conta")
+    assert result.matches == ["corso", "gratis", "scopri"]
+    assert result.counts == {"medium": 1, "strong": 1, "weak": 1}
+    assert result.score == 6
+
+
+def test_phrases_need_consecutive_tokens(scorer):
+    assert scorer.score("Prenota una lezione di prova").matches == ["lezione di prova"]
+    assert scorer.score("lezione gratuita di prova").matches == []
+
+
+def test_each_term_counts_once(scorer):
+    assert scorer.score("gratis gratis gratis").score == 3
+
+
+def test_invalid_match_mode():
+    with pytest.raises(ValueError):
+        CopyScorer.from_config({"groups": {"strong": {"terms": [{"term": "x", "match": "regex"}]}}})
+
+
+def test_labels():
+    assert copy_label({"strong": 3}) == "Copy molto interessante (alto incentivo)"
+    assert copy_label({"strong": 1, "medium": 2}) == "Copy molto interessante"
+    assert copy_label({"medium": 2}) == "Copy interessante"
+    assert copy_label({"weak": 2}) == "Copy discreto"
+    assert copy_label({}) == "Copy standard"
+
+
+def test_shipped_lexicon_loads():
+    assert get_scorer().score("Webinar gratuito").label == "Copy interessante"
@@ -0,0 +1,34 @@
+import pytest
+
+import server
+from server import parse_deadline, parse_list
+
+
+def test_parse_deadline_values():
+    assert parse_deadline({"deadline_s": "30"}) == 30.0
+    assert parse_deadline({"deadline_s": 900}, cap=570) == 570
+
+
+def test_parse_deadline_default(monkeypatch):
+    monkeypatch.setattr(server, "RUN_DEADLINE", 0)
+    assert parse_deadline({}) is None
+    assert parse_deadline({}, cap=570) == 570
+    monkeypatch.setattr(server, "RUN_DEADLINE", 120)
+    assert parse_deadline({}, cap=570) == 120
+
+
+@pytest.mark.parametrize("value", [0, -5, "abc", "nan", [1]])
+def test_parse_deadline_rejects(value):
+    with pytest.raises((TypeError, ValueError)):
+        parse_deadline({"deadline_s": value})
+
+
+def test_invalid_deadline_is_400():
+    response = server.app.test_client().post("/add_leads", json={"query": "corso", "deadline_s": -1})
+    assert response.status_code == 400
+
+
+def test_parse_list():
+    assert parse_list("corso, webinar\nyoga,,") == ["corso", "webinar", "yoga"]
+    assert parse_list(["corso", " ", 3]) == ["corso"]
+    assert parse_list(None) == []
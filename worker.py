@@ -0,0 +1,205 @@
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from aut import start_browser_pool, stop_browser_pool, submit_to_pool, logger
+from jobs import run_job
+from jobqueue import job_queue
+from metrics import registry, CONTENT_TYPE
+
+# Processi scraper che consumano la coda SQLite (WORKER_MODE=queue sul web).
+# Ogni processo ha il suo browser pool e il suo event loop: si scala con i core.
+# Uso:  python worker.py [--processes N]
+
+
+# ---------------- CONFIG ----------------
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", str(os.cpu_count() or 1)))
+WORKER_JOBS = int(os.getenv("WORKER_JOBS", "2"))                    # job contemporanei per processo
+WORKER_POLL = float(os.getenv("WORKER_POLL_S", "1"))
+WORKER_HEARTBEAT = float(os.getenv("WORKER_HEARTBEAT_S", "15"))     # molto sotto QUEUE_LEASE_S
+WORKER_SHUTDOWN_GRACE = float(os.getenv("WORKER_SHUTDOWN_GRACE_S", "30"))
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))   # 0 = niente /metrics; processo i su porta+i
+QUEUE_PURGE_INTERVAL = 3600
+
+_stopping = threading.Event()
+
+
+# ---------------- JOB ----------------
+class QueueJobHandle:
+    # Un job della coda con l'interfaccia che run_job si aspetta da Job (push/finish)
+    def __init__(self, job_id: str, payload: Dict, worker: str):
+        self.id = job_id
+        self.worker = worker
+        self.query = payload.get("query")
+        self.queries: Optional[List[str]] = payload.get("queries")
+        self.countries: Optional[List[str]] = payload.get("countries")
+        self.use_cache = payload.get("use_cache", True)
+        self.trace = payload.get("trace", False)
+        self.incremental = payload.get("incremental", False)
+        self.deadline_s = payload.get("deadline_s")
+        self.status = "running"
+        self.leads: List[Dict] = []
+
+    def push(self, event: str, data: Dict) -> None:
+        if event == "lead":
+            self.leads.append(data["lead"])
+        job_queue.push_event(self.id, event, data)
+
+    def finish(self, status: str, leads: Optional[List[Dict]] = None, **data) -> None:
+        if _stopping.is_set():
+            # Interrotto dallo shutdown: torna in coda per un altro worker
+            job_queue.release(self.id, self.worker)
+            logger.info(f"↩️ Job {self.id} rimesso in coda (shutdown)")
+            return
+        if not job_queue.finish(self.id, self.worker, status, leads if leads is not None else self.leads, **data):
+            logger.warning(f"⚠️ Job {self.id} riassegnato a un altro worker: risultato scartato")
+
+
+# ---------------- METRICHE ----------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve_metrics(port: int) -> ThreadingHTTPServer:
+    httpd = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics", daemon=True).start()
+    return httpd
+
+
+# ---------------- PROCESSO WORKER ----------------
+def _stop(signum, frame, previous=None):
+    _stopping.set()
+    if callable(previous):
+        previous(signum, frame)
+
+
+def run_worker(index: int) -> None:
+    # Lo shutdown di aut (drain del pool) resta in catena dopo il nostro flag
+    previous = signal.getsignal(signal.SIGTERM)
+    signal.signal(signal.SIGTERM, lambda s, f: _stop(s, f, previous))
+    signal.signal(signal.SIGINT, lambda s, f: _stop(s, f, previous))
+
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    start_browser_pool()
+    if WORKER_METRICS_PORT:
+        serve_metrics(WORKER_METRICS_PORT + index)
+        logger.info(f"📈 Metriche worker {index} su :{WORKER_METRICS_PORT + index}/metrics")
+    logger.info(f"👷 Worker {index} pronto ({worker}, {WORKER_JOBS} job alla volta)")
+
+    running: Dict[str, Future] = {}
+    last_beat = 0.0
+    try:
+        while not _stopping.is_set():
+            for job_id, fut in list(running.items()):
+                if fut.done():
+                    del running[job_id]
+
+            now = time.monotonic()
+            if running and now - last_beat >= WORKER_HEARTBEAT:
+                job_queue.heartbeat(list(running), worker)
+                last_beat = now
+
+            claimed = job_queue.claim(worker) if len(running) < WORKER_JOBS else None
+            if claimed is None:
+                _stopping.wait(WORKER_POLL)
+                continue
+
+            job_id, payload, attempt = claimed
+            logger.info(f"▶️ Job {job_id} (tentativo {attempt}): {payload.get('query')}")
+            running[job_id] = submit_to_pool(run_job(QueueJobHandle(job_id, payload, worker)))
+    finally:
+        # I job in corso vedono lo shutdown e si chiudono: qui si attende che rilascino il lease
+        deadline = time.monotonic() + WORKER_SHUTDOWN_GRACE
+        for fut in running.values():
+            try:
+                fut.result(max(0.1, deadline - time.monotonic()))
+            except Exception:
+                pass
+        stop_browser_pool()
+        logger.info(f"👋 Worker {index} chiuso")
+
+
+# ---------------- SUPERVISORE ----------------
+def supervise(processes: int) -> None:
+    # Avvia N processi e rimpiazza quelli che muoiono; i loro job tornano in coda alla scadenza del lease
+    ctx = mp.get_context("spawn")
+    procs: Dict[int, mp.Process] = {}
+    started_at: Dict[int, float] = {}
+    failures: Dict[int, int] = {}
+
+    def start(index: int) -> None:
+        proc = ctx.Process(target=run_worker, args=(index,), name=f"scraper-{index}")
+        proc.start()
+        procs[index] = proc
+        started_at[index] = time.monotonic()
+
+    def stop_all(signum, frame):
+        _stopping.set()
+        for proc in procs.values():
+            if proc.is_alive():
+                proc.terminate()
+
+    signal.signal(signal.SIGTERM, stop_all)
+    signal.signal(signal.SIGINT, stop_all)
+
+    for index in range(processes):
+        start(index)
+    logger.info(f"🚀 {processes} processi scraper avviati")
+
+    last_purge = 0.0
+    while procs:
+        _stopping.wait(1)
+        if not _stopping.is_set() and time.monotonic() - last_purge > QUEUE_PURGE_INTERVAL:
+            job_queue.purge_finished()
+            last_purge = time.monotonic()
+        for index, proc in list(procs.items()):
+            if proc.is_alive():
+                continue
+            proc.join()
+            del procs[index]
+            if _stopping.is_set():
+                continue
+            # Backoff solo per i crash ravvicinati
+            if time.monotonic() - started_at[index] > 60:
+                failures[index] = 0
+            failures[index] = failures.get(index, 0) + 1
+            backoff = min(30, 2 ** failures[index])
+            logger.warning(f"💥 Worker {index} uscito (exit {proc.exitcode}), riavvio tra {backoff}s")
+            time.sleep(backoff)
+            start(index)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Processi scraper per la coda lead")
+    parser.add_argument("--processes", type=int, default=WORKER_PROCESSES)
+    args = parser.parse_args()
+    if args.processes <= 1:
+        run_worker(0)
+    else:
+        supervise(args.processes)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())